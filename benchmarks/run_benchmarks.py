@@ -0,0 +1,368 @@
+"""Benchmarks of the agent pipeline with a performance regression gate.
+
+Each stage is timed on synthetic projects of increasing size and the best
+of ``--repeat`` runs is recorded. Results are compared with a JSON baseline;
+the run fails (exit code 1) when a stage got slower than the baseline by
+more than ``--threshold`` (relative) and ``--min-delta`` (absolute seconds).
+
+Usage:
+    python -m benchmarks.run_benchmarks                    # compare with the baseline
+    python -m benchmarks.run_benchmarks --update-baseline  # record a new baseline
+    python -m benchmarks.run_benchmarks --sizes 100 1000 --stages parsing analyze_failures
+
+Baselines are machine specific: record them on the machine that runs the gate.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+
+from src.agent import Agent
+from src.code_analyzer import CodeAnalyzer
+from src.debugger import Debugger
+from src.executor import Executor
+from src.llm_interface import LLMInterface
+from src.pytest_stream import ResultParser
+from src.test_runner import TestRunner
+from src.warm_pool import WarmPool
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_SIZES = [100, 1000, 10000]
+STAGES = ["spawn", "parsing", "analyze_file", "analyze_failures", "end_to_end"]
+TESTS_PER_MODULE = 100
+FAILURE_RATE = 10  # One test in FAILURE_RATE fails
+
+# Failure templates: several distinct errors, each repeated with volatile details
+FAILURE_TEMPLATES = [
+    "assert {i} == {j}",
+    "raise ValueError(f'bad input {i} at {{hex(id(object()))}}')",
+    "raise KeyError('missing_{k}')",
+    "raise RuntimeError('timeout after {i}.5s')",
+    "open('/tmp/bench_{i}/missing.txt')",
+]
+
+
+class StubLLM:
+    """A local OpenAI-compatible chat completions server answering instantly."""
+
+    def __init__(self):
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                stub.requests += 1
+                data = json.dumps({"choices": [{"message": {"content": "Stub analysis."}}]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def make_test_project(root: str, n_tests: int) -> str:
+    """Writes a project with n_tests tests (one in FAILURE_RATE failing); returns its tests directory."""
+    tests_dir = os.path.join(root, "tests")
+    os.makedirs(tests_dir, exist_ok=True)
+    for module in range(0, n_tests, TESTS_PER_MODULE):
+        lines = []
+        for i in range(module, min(module + TESTS_PER_MODULE, n_tests)):
+            if i % FAILURE_RATE == FAILURE_RATE - 1:
+                template = FAILURE_TEMPLATES[(i // FAILURE_RATE) % len(FAILURE_TEMPLATES)]
+                body = template.format(i=i, j=i + 1, k=i % 7)
+            else:
+                body = f"assert {i} + 1 == {i + 1}"
+            lines.append(f"def test_case_{i}():\n    {body}\n")
+        with open(os.path.join(tests_dir, f"test_mod{module // TESTS_PER_MODULE}.py"), "w") as f:
+            f.write("\n\n".join(lines))
+    return tests_dir
+
+
+def make_module(path: str, n_lines: int):
+    """Writes a syntactically rich Python module of about n_lines lines."""
+    chunks, lines, index = [], 0, 0
+    while lines < n_lines:
+        chunk = (
+            f"@staticmethod\n"
+            f"def helper_{index}(value, *args, **kwargs):\n"
+            f"    \"\"\"Helper number {index}.\"\"\"\n"
+            f"    total = 0\n"
+            f"    for item in range(value):\n"
+            f"        if item % 3 == 0 and item > {index % 10}:\n"
+            f"            total += item\n"
+            f"        elif item % 5:\n"
+            f"            total -= kwargs.get('step', 1)\n"
+            f"    return [x * 2 for x in args if x] or total\n"
+            f"\n\n"
+            f"class Model{index}:\n"
+            f"    limit: int = {index}\n"
+            f"\n"
+            f"    def method(self, other):\n"
+            f"        try:\n"
+            f"            return {{'key': other, 'limit': self.limit}}\n"
+            f"        except Exception as error:\n"
+            f"            raise ValueError(str(error))\n"
+            f"\n\n"
+        )
+        chunks.append(chunk)
+        lines += chunk.count("\n")
+        index += 1
+    with open(path, "w") as f:
+        f.write("".join(chunks))
+
+
+def make_results(n_tests: int) -> dict:
+    """Builds run_pytest style results with one test in FAILURE_RATE failed."""
+    rng = random.Random(n_tests)
+    tests = []
+    for i in range(n_tests):
+        nodeid = f"tests/test_mod{i // TESTS_PER_MODULE}.py::test_case_{i}"
+        if i % FAILURE_RATE == FAILURE_RATE - 1:
+            kind = (i // FAILURE_RATE) % len(FAILURE_TEMPLATES)
+            message = [
+                f"assert {i} == {i + 1}",
+                f"ValueError: bad input {i} at 0x{rng.getrandbits(48):x}",
+                f"KeyError: 'missing_{i % 7}'",
+                f"RuntimeError: timeout after {i}.5s",
+                f"FileNotFoundError: [Errno 2] No such file or directory: '/tmp/bench_{i}/missing.txt'",
+            ][kind]
+            call = {"duration": 0.001, "outcome": "failed",
+                    "crash": {"path": f"/project/tests/test_mod{i // TESTS_PER_MODULE}.py",
+                              "lineno": 4 * (i % TESTS_PER_MODULE) + 2, "message": message},
+                    "longrepr": f"def test_case_{i}():\n>   ...\nE   {message}\n" * 20}
+            outcome = "failed"
+        else:
+            call = {"duration": 0.0005, "outcome": "passed"}
+            outcome = "passed"
+        tests.append({"nodeid": nodeid, "outcome": outcome,
+                      "setup": {"duration": 0.0001, "outcome": "passed"}, "call": call,
+                      "teardown": {"duration": 0.0001, "outcome": "passed"}})
+    return {"summary": {"total": n_tests}, "tests": tests, "exitcode": 1}
+
+
+def timed(function: Callable[[], object], repeat: int) -> List[float]:
+    """Runs a function repeat times (its output discarded) and returns the durations."""
+    samples = []
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            function()
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_spawn(workdir: str, repeat: int) -> Dict[str, List[float]]:
+    """Executor overhead of running a trivial Python script, cold and from a warm interpreter."""
+    script = os.path.join(workdir, "noop.py")
+    with open(script, "w") as f:
+        f.write("pass\n")
+    results = {"executor_spawn": timed(lambda: Executor().run_python_script(script), repeat * 3)}
+    pool = WarmPool()
+    try:
+        warm = Executor(warm_pool=pool)
+        timed(lambda: warm.run_python_script(script), 1)  # Start the server outside the measurement
+        results["executor_spawn_warm"] = timed(lambda: warm.run_python_script(script), repeat * 3)
+    finally:
+        pool.close()
+    return results
+
+
+def bench_parsing(sizes: List[int], repeat: int) -> Dict[str, List[float]]:
+    """Parsing the streamed plugin records of a run into results."""
+    results = {}
+    for size in sizes:
+        lines = [json.dumps({"type": "collection", "collected": size}) + "\n"]
+        lines += [json.dumps({"type": "test", **test}) + "\n" for test in make_results(size)["tests"]]
+        lines.append(json.dumps({"type": "session", "exitcode": 1, "duration": 1.0}) + "\n")
+
+        def parse():
+            parser = ResultParser()
+            tests = [record for record in map(parser.feed, lines) if record is not None]
+            assert len(tests) == size and parser.finished
+
+        results[f"report_parsing/{size}"] = timed(parse, repeat)
+    return results
+
+
+def bench_analyze_file(workdir: str, module_lines: int, repeat: int) -> Dict[str, List[float]]:
+    """CodeAnalyzer.analyze_file on a large module, uncached and cached."""
+    path = os.path.join(workdir, f"module_{module_lines}.py")
+    make_module(path, module_lines)
+    analyzer = CodeAnalyzer()
+    analyzer.analyze_file(path)
+    return {
+        f"analyze_file/{module_lines}_lines": timed(lambda: CodeAnalyzer().analyze_file(path), repeat),
+        f"analyze_file/{module_lines}_lines_cached": timed(lambda: analyzer.analyze_file(path), repeat),
+    }
+
+
+def bench_analyze_failures(sizes: List[int], repeat: int) -> Dict[str, List[float]]:
+    """TestRunner.analyze_failures against a local stub LLM (no response cache)."""
+    stub = StubLLM()
+    results = {}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            runner = TestRunner(Executor(), llm=LLMInterface(api_key="benchmark", base_url=stub.url))
+        for size in sizes:
+            test_results = make_results(size)
+            results[f"analyze_failures/{size}"] = timed(lambda: runner.analyze_failures(test_results), repeat)
+        runner.cleanup()
+    finally:
+        stub.close()
+    return results
+
+
+def bench_end_to_end(workdir: str, sizes: List[int], repeat: int) -> Dict[str, List[float]]:
+    """Agent.run_tests on generated projects (pytest run, streaming, summary)."""
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        executor = Executor()
+        test_runner = TestRunner(executor)
+        agent = Agent(debugger=Debugger(executor, CodeAnalyzer()), test_runner=test_runner)
+    for size in sizes:
+        tests_dir = make_test_project(os.path.join(workdir, f"project_{size}"), size)
+
+        def run():
+            summary = agent.run_tests(tests_dir)["summary"]
+            assert summary["total"] == size, summary
+
+        results[f"agent_run_tests/{size}"] = timed(run, repeat)
+    test_runner.cleanup()
+    return results
+
+
+def run_benchmarks(sizes: List[int], module_lines: int = 10000, repeat: int = 3,
+                   stages: Optional[List[str]] = None) -> dict:
+    """Runs the selected stages and returns the results document.
+
+    Args:
+        sizes: Numbers of tests of the synthetic projects and result sets
+        module_lines: Size of the module given to analyze_file
+        repeat: Runs per measurement; the fastest is recorded
+        stages: Stages to run (default: all of STAGES)
+
+    Returns:
+        ``{"meta": {...}, "stages": {name: {"seconds": best, "samples": [...]}}}``
+    """
+    stages = stages or STAGES
+    samples: Dict[str, List[float]] = {}
+    with tempfile.TemporaryDirectory(prefix="ai_agent_bench_") as workdir:
+        if "spawn" in stages:
+            samples.update(bench_spawn(workdir, repeat))
+        if "parsing" in stages:
+            samples.update(bench_parsing(sizes, repeat))
+        if "analyze_file" in stages:
+            samples.update(bench_analyze_file(workdir, module_lines, repeat))
+        if "analyze_failures" in stages:
+            samples.update(bench_analyze_failures(sizes, repeat))
+        if "end_to_end" in stages:
+            samples.update(bench_end_to_end(workdir, sizes, repeat))
+    return {
+        "meta": {
+            "created": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": repeat,
+        },
+        "stages": {name: {"seconds": min(values), "samples": values} for name, values in samples.items()},
+    }
+
+
+def compare_to_baseline(results: dict, baseline: dict, threshold: float = 0.2,
+                        min_delta: float = 0.005) -> List[dict]:
+    """Compares results with a baseline and returns the regressed stages.
+
+    A stage regresses when it is slower than its baseline by more than
+    ``threshold`` (relative) and ``min_delta`` seconds (absolute, so that
+    noise on sub-millisecond stages does not fail the gate). Stages missing
+    from either side are ignored.
+    """
+    regressions = []
+    for name, stage in results["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if not base:
+            continue
+        current, previous = stage["seconds"], base["seconds"]
+        if current > previous * (1 + threshold) and current - previous > min_delta:
+            regressions.append({"stage": name, "baseline": previous, "current": current,
+                                "change": current / previous - 1 if previous else float("inf")})
+    return regressions
+
+
+def print_report(results: dict, baseline: Optional[dict]):
+    base_stages = (baseline or {}).get("stages", {})
+    print(f"{'stage':40} {'seconds':>10} {'baseline':>10} {'change':>8}")
+    for name, stage in results["stages"].items():
+        base = base_stages.get(name)
+        if base and base["seconds"]:
+            change = f"{stage['seconds'] / base['seconds'] - 1:+.0%}"
+            print(f"{name:40} {stage['seconds']:10.4f} {base['seconds']:10.4f} {change:>8}")
+        else:
+            print(f"{name:40} {stage['seconds']:10.4f} {'-':>10} {'-':>8}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the agent pipeline and gate performance regressions.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Numbers of tests of the synthetic projects.")
+    parser.add_argument("--module-lines", type=int, default=10000, help="Lines of the module given to analyze_file.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement; the fastest is recorded.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, help="Stages to run (default: all).")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="JSON baseline to compare with (written if missing).")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results as the new baseline instead of comparing.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative slowdown per stage (0.2 = 20%%).")
+    parser.add_argument("--min-delta", type=float, default=0.005, help="Slowdowns below this many seconds never fail the gate.")
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.sizes, module_lines=args.module_lines, repeat=args.repeat, stages=args.stages)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    if baseline is None:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    regressions = compare_to_baseline(results, baseline, args.threshold, args.min_delta)
+    for regression in regressions:
+        print(f"REGRESSION {regression['stage']}: {regression['baseline']:.4f}s -> "
+              f"{regression['current']:.4f}s ({regression['change']:+.0%})")
+    if regressions:
+        return 1
+    print(f"No stage regressed by more than {args.threshold:.0%}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
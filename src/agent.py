@@ -1,4 +1,18 @@
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+from collections.abc import Mapping
+from typing import Optional
+from . import telemetry
 from .debugger import Debugger
+from .distributed import RUN_TIMEOUT_SECONDS
+from .file_watcher import create_watcher, debounced_changes
+from .impact_analyzer import ImpactAnalyzer
+from .scheduler import JobScheduler, serve_jsonl, serve_socket
+from .test_results import to_dict
 from .test_runner import TestRunner
 # We might need CodeAnalyzer and Executor if Agent interacts directly,
 # but for now, they are dependencies of Debugger/TestRunner.
@@ -13,43 +27,178 @@ class Agent:
         self.test_runner = test_runner
         print("Agent initialized with Debugger and TestRunner.")
 
-    def run(self):
-        """Run the main agent loop or task. Placeholder implementation."""
-        print("Agent is running... Waiting for tasks.")
-        # TODO: Implement the main loop, potentially reading tasks from a queue or user input.
-        # Example task handling (replace with actual logic):
-        # task = self.get_next_task()
-        # if task.type == 'debug':
-        #     self.debug_code(task.file_path)
-        # elif task.type == 'test':
-        #     self.run_tests(task.target)
-
-    def debug_code(self, file_path: str):
-        """Triggers the debugging process for a given file."""
+    def run(self, jobs_file: str = None, serve_address: str = None, results_file: str = None):
+        """Runs the agent as a job service.
+
+        Jobs are JSON objects such as ``{"type": "test", "target": "tests", "priority": 5}``
+        or ``{"type": "debug", "file_path": "script.py"}``. They are read from a
+        JSONL file and/or a Unix socket and executed by a JobScheduler; every
+        result is delivered as one JSON line (to results_file or stdout for
+        file jobs, back on the connection for socket jobs). The progress
+        output of the jobs goes to stderr, so stdout only carries results.
+
+        Args:
+            jobs_file: Optional JSONL file of jobs to run
+            serve_address: Optional Unix socket path to accept jobs on
+            results_file: Optional JSONL file receiving the results of file jobs
+        """
+        if not jobs_file and not serve_address:
+            print("Agent is running... Waiting for tasks.")
+            print("No job source configured (jobs file or serve address); nothing to do.")
+            return
+        results_stream = sys.stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            asyncio.run(self._serve(jobs_file, serve_address, results_file, results_stream))
+
+    def create_scheduler(self) -> JobScheduler:
+        """Creates a JobScheduler for the agent's job types using the agent config."""
+        handlers = {
+            "debug": lambda job: self.debug_code(job["file_path"]),
+            "test": lambda job: to_dict(self.run_tests(job.get("target", "."), changed_files=job.get("changed_files"))),
+        }
+        return JobScheduler(
+            handlers,
+            concurrency=self.config.get("job_concurrency", {"debug": 4, "test": 2}),
+            max_queued=self.config.get("max_queued_jobs", 100),
+        )
+
+    async def _serve(self, jobs_file: str = None, serve_address: str = None, results_file: str = None,
+                     results_stream=None):
+        async with self.create_scheduler() as scheduler:
+            tasks = []
+            if jobs_file:
+                output = open(results_file, 'a') if results_file else None
+
+                async def write_result(result: dict):
+                    line = json.dumps(result, default=str)
+                    if output:
+                        output.write(line + "\n")
+                        output.flush()
+                    else:
+                        print(line, file=results_stream or sys.stdout, flush=True)
+
+                async def run_file_jobs():
+                    try:
+                        await serve_jsonl(scheduler, jobs_file, write_result)
+                    finally:
+                        if output:
+                            output.close()
+                    print(f"Finished jobs from {jobs_file}: {scheduler.stats}")
+
+                tasks.append(asyncio.create_task(run_file_jobs()))
+            if serve_address:
+                tasks.append(asyncio.create_task(serve_socket(scheduler, serve_address)))
+            await asyncio.gather(*tasks)
+
+    def debug_code(self, file_path: str) -> dict:
+        """Triggers the debugging process for a given file and returns its outcome."""
         print(f"\n--- Agent Task: Debug Code --- ")
         print(f"File to debug: {file_path}")
-        self.debugger.debug_file(file_path)
+        with telemetry.span("agent.debug_code", file=file_path) as stage:
+            result = self.debugger.debug_file(file_path)
+            stage.set_attribute("status", result.get("status"))
         print("------------------------------\n")
+        return result
 
-    def run_tests(self, target: str):
-        """Triggers the test running process for a given target."""
+    def run_tests(self, target: str, changed_files: list[str] = None) -> dict:
+        """Triggers the test running process for a given target and returns the results.
+
+        If changed_files is given, only the tests affected by those files are run.
+        """
         print(f"\n--- Agent Task: Run Tests --- ")
         print(f"Target for tests: {target}")
-        test_results = self.test_runner.run_pytest(target=target)
+        workers = self.config.get("test_workers", 1)
+        fail_fast = self.config.get("test_fail_fast", False)
+        with telemetry.span("agent.run_tests", target=target, workers=workers):
+            if changed_files:
+                test_results = self.test_runner.run_affected_tests(changed_files, target=target, workers=workers,
+                                                                   fail_fast=fail_fast)
+            elif self.config.get("test_coordinator") or self.config.get("test_local_workers"):
+                test_results = self.test_runner.run_pytest_distributed(
+                    target=target, address=self.config.get("test_coordinator"),
+                    local_workers=self.config.get("test_local_workers", 0), fail_fast=fail_fast,
+                    timeout=self.config.get("test_distributed_timeout", RUN_TIMEOUT_SECONDS))
+            else:
+                test_results = self.test_runner.run_pytest(target=target, workers=workers, fail_fast=fail_fast)
         # TODO: Process test_results (e.g., report summary, use LLM for failures)
         print("Test Results Summary:")
-        if isinstance(test_results, dict) and 'summary' in test_results:
-            print(f"  Passed: {test_results['summary'].get('passed', 0)}")
-            print(f"  Failed: {test_results['summary'].get('failed', 0)}")
-            print(f"  Errors: {test_results['summary'].get('error', 0)}") # Note: key might be 'errors'
-            print(f"  Skipped: {test_results['summary'].get('skipped', 0)}")
-            print(f"  Total: {test_results['summary'].get('total', 0)}")
-        elif isinstance(test_results, dict) and 'error' in test_results:
+        if isinstance(test_results, Mapping) and 'error' in test_results:
             print(f"  Error running tests: {test_results['error']}")
+        elif isinstance(test_results, Mapping) and 'summary' in test_results:
+            summary = test_results['summary']  # TestResults keeps the counts: no test record is loaded
+            print(f"  Passed: {summary.get('passed', 0)}")
+            print(f"  Failed: {summary.get('failed', 0)}")
+            print(f"  Errors: {summary.get('error', 0)}") # Note: key might be 'errors'
+            print(f"  Skipped: {summary.get('skipped', 0)}")
+            print(f"  Total: {summary.get('total', 0)}")
         else:
             print("  Could not parse test summary from results.")
             print(f"Raw results: {test_results}")
         print("---------------------------\n")
+        return test_results
+
+    def watch(self, target: Optional[str] = None, debug_file: Optional[str] = None, root: Optional[str] = None,
+              debounce: float = 0.1, watcher=None, max_iterations: Optional[int] = None):
+        """Re-runs tests (or the debug target) whenever project files change, until interrupted.
+
+        Everything stays in this process between iterations, so the AST cache,
+        the incremental project index, the impact data and the warm
+        interpreters are reused. After a full initial run, each burst of saves
+        re-runs only the tests affected by the changed files, or the debug
+        target if it imports one of them.
+
+        Args:
+            target: The pytest target to re-run (ignored if debug_file is given)
+            debug_file: A script to re-debug instead of running tests
+            root: The directory to watch (default: the current directory)
+            debounce: Seconds without further changes before a burst is handled
+            watcher: Optional watcher to use instead of create_watcher(root)
+            max_iterations: Stop after this many change bursts (default: run until Ctrl-C)
+        """
+        root = os.path.abspath(root or os.getcwd())
+        watcher = watcher or create_watcher(root)
+        if self.test_runner.impact is None:
+            self.test_runner.impact = ImpactAnalyzer(self.debugger.analyzer)
+        impact = self.test_runner.impact
+        print(f"Watching {root} for changes ({watcher.kind}); press Ctrl-C to stop.")
+        self._watch_iteration(target, debug_file, None)
+        try:
+            for iteration, changes in enumerate(debounced_changes(watcher, debounce), start=1):
+                started = time.monotonic()
+                for path in changes:
+                    self.debugger.analyzer.cache.invalidate(path)
+                names = ", ".join(sorted(os.path.relpath(path, root) for path in changes))
+                print(f"\n[watch] Changed: {names}")
+                if root in changes:  # Events were lost; nothing can be skipped
+                    changes = None
+                elif debug_file and not impact.affects(changes, debug_file, root):
+                    print(f"[watch] {debug_file} does not depend on the changes; nothing to re-run.")
+                    changes = ()
+                if changes != ():
+                    with telemetry.span("agent.watch_iteration", files=len(changes or ())):
+                        self._watch_iteration(target, debug_file, changes)
+                telemetry.observe("ai_agent_watch_latency_seconds", time.monotonic() - started)
+                print(f"[watch] Done in {time.monotonic() - started:.2f}s; waiting for changes...")
+                self._prewarm(root)
+                if max_iterations is not None and iteration >= max_iterations:
+                    break
+        except KeyboardInterrupt:
+            print("\nStopped watching.")
+        finally:
+            watcher.close()
+
+    def _watch_iteration(self, target: Optional[str], debug_file: Optional[str], changes):
+        """Runs one watch-mode iteration: the debug target, or the tests affected by changes (all if None)."""
+        if debug_file:
+            self.debug_code(debug_file)
+        else:
+            self.run_tests(target or ".", changed_files=sorted(changes) if changes else None)
+
+    def _prewarm(self, root: str):
+        """Restarts a stale warm interpreter while idle instead of on the next edit's critical path."""
+        warm_pool = getattr(self.test_runner.executor, "warm_pool", None)
+        if warm_pool is not None:
+            warm_pool.server(root)
 
     # Add more methods as needed for specific agent capabilities
     # e.g., process_input, generate_response, learn, etc. 
\ No newline at end of file
@@ -0,0 +1,204 @@
+import ast
+import hashlib
+import os
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+# Line range (first line including decorators, last line), both 1-based and inclusive
+LineRange = Tuple[int, int]
+
+
+def default_cache_dir() -> str:
+    """The per-user directory of the on-disk tier ($XDG_CACHE_HOME/ai_agent/ast_cache or ~/.cache/...).
+
+    Entries are pickles, and loading a pickle can run code, so they are kept
+    outside the project being debugged: a checked-out repository cannot
+    plant cache entries.
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "ai_agent", "ast_cache")
+
+
+@dataclass
+class ParsedFile:
+    """A parsed Python file together with its precomputed symbol index.
+
+    The AST is shared between all users of the cache and must not be mutated.
+    """
+    path: str
+    content_hash: str
+    tree: ast.Module
+    symbols: Dict[str, LineRange]
+    names: Dict[str, List[str]]
+    lines: List[str]
+
+    def snippet(self, start: int, end: int) -> str:
+        """Returns the source lines start..end (1-based, inclusive)."""
+        return "".join(self.lines[max(start - 1, 0):end])
+
+
+class AstCache:
+    """Content-addressed cache of parsed ASTs and symbol indexes.
+
+    Lookups first compare the file's (mtime, size) with the last time it was
+    seen, so an unchanged file is neither read nor hashed. Otherwise the file
+    is hashed and the parse is looked up by content hash, first in an
+    in-memory LRU tier and then in an optional on-disk tier of pickles.
+
+    The on-disk tier is only used if its directory belongs to the current
+    user and nobody else can write to it (see default_cache_dir()).
+    """
+
+    def __init__(self, max_entries: int = 512, cache_dir: Optional[str] = None):
+        """Initializes the cache.
+
+        Args:
+            max_entries: Number of parsed files kept in memory (LRU eviction)
+            cache_dir: Optional directory for the persistent on-disk tier (created with mode 0700)
+        """
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._stat_keys: Dict[str, Tuple[int, int, str]] = {}
+        self._lock = threading.Lock()
+        if cache_dir and not private_directory(cache_dir):
+            print(f"Warning: AST cache directory {cache_dir} is not private to this user; on-disk tier disabled")
+            self.cache_dir = None
+
+    def get(self, file_path: str) -> ParsedFile:
+        """Returns the parsed file, parsing it only if its content is not cached.
+
+        Raises:
+            FileNotFoundError: If the file does not exist
+            SyntaxError: If the file cannot be parsed (failures are not cached)
+        """
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+
+        with self._lock:
+            known = self._stat_keys.get(path)
+            if known and known[:2] == (stat.st_mtime_ns, stat.st_size):
+                entry = self._lookup_memory(known[2])
+                if entry:
+                    self.hits += 1
+                    return ParsedFile(path, known[2], *entry)
+
+        with open(path, 'rb') as f:
+            source = f.read()
+        content_hash = hashlib.sha256(source).hexdigest()
+
+        with self._lock:
+            entry = self._lookup_memory(content_hash)
+        if entry is None:
+            entry = self._load_disk(content_hash)
+            if entry is None:
+                with self._lock:
+                    self.misses += 1
+                entry = parse_source(source, path)
+                self._store_disk(content_hash, entry)
+            else:
+                with self._lock:
+                    self.hits += 1
+        else:
+            with self._lock:
+                self.hits += 1
+
+        with self._lock:
+            self._entries[content_hash] = entry
+            self._entries.move_to_end(content_hash)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._stat_keys[path] = (stat.st_mtime_ns, stat.st_size, content_hash)
+        return ParsedFile(path, content_hash, *entry)
+
+    def invalidate(self, file_path: Optional[str] = None):
+        """Forgets the stat key of one file (or of all files) so the next get re-checks content."""
+        with self._lock:
+            if file_path is None:
+                self._stat_keys.clear()
+            else:
+                self._stat_keys.pop(os.path.abspath(file_path), None)
+
+    def _lookup_memory(self, content_hash: str) -> Optional[tuple]:
+        entry = self._entries.get(content_hash)
+        if entry is not None:
+            self._entries.move_to_end(content_hash)
+        return entry
+
+    def _disk_path(self, content_hash: str) -> str:
+        # ASTs differ between Python versions, so they are cached per version
+        version = f"py{sys.version_info[0]}{sys.version_info[1]}"
+        return os.path.join(self.cache_dir, content_hash[:2], f"{content_hash}-{version}.pickle")
+
+    def _load_disk(self, content_hash: str) -> Optional[tuple]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._disk_path(content_hash), 'rb') as f:
+                return pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return None
+
+    def _store_disk(self, content_hash: str, entry: tuple):
+        if not self.cache_dir:
+            return
+        disk_path = self._disk_path(content_hash)
+        try:
+            os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            tmp_path = f"{disk_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, disk_path)  # Atomic, so concurrent readers never see partial files
+        except OSError as e:
+            print(f"Warning: could not write AST cache entry {disk_path}: {e}")
+
+
+def private_directory(path: str) -> bool:
+    """Creates the directory if needed; True if it belongs to this user and only they can write to it."""
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        stat = os.stat(path)
+    except OSError:
+        return False
+    if not hasattr(os, "getuid"):
+        return True  # No POSIX ownership (Windows)
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
+
+
+def parse_source(source: bytes, path: str = "<unknown>") -> tuple:
+    """Parses source code and builds the cache entry (tree, symbols, names, lines)."""
+    tree = ast.parse(source, filename=path)
+    symbols = build_symbol_index(tree)
+    names: Dict[str, List[str]] = {}
+    for qualname in symbols:
+        names.setdefault(qualname.rpartition(".")[2], []).append(qualname)
+    lines = source.decode("utf-8", errors="replace").splitlines(keepends=True)
+    return tree, symbols, names, lines
+
+
+def build_symbol_index(tree: ast.AST) -> Dict[str, LineRange]:
+    """Maps the qualname of every function, class and method to its line range.
+
+    Nested definitions are named after their parents, e.g. ``Class.method``
+    or ``outer.inner``. Ranges include decorators.
+    """
+    symbols: Dict[str, LineRange] = {}
+
+    def visit(node: ast.AST, prefix: str):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                qualname = f"{prefix}{child.name}"
+                start = min([child.lineno] + [d.lineno for d in child.decorator_list])
+                symbols[qualname] = (start, child.end_lineno or child.lineno)
+                visit(child, qualname + ".")
+            else:
+                visit(child, prefix)
+
+    visit(tree, "")
+    return symbols
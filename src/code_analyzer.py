@@ -1,17 +1,45 @@
 import ast
+import bisect
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Set
+
+from . import telemetry
+from .ast_cache import AstCache, LineRange, ParsedFile
+from .project_index import FileSummary, ProjectIndex, collect_imports, summarize_file
+
+# Directories that never contain project sources worth analyzing
+SKIP_DIRS = {".git", ".hg", ".svn", "__pycache__", ".tox", ".nox", ".venv", "venv",
+             ".mypy_cache", ".pytest_cache", ".ruff_cache", "build", "dist", "node_modules"}
+# Fewer changed files than this are analyzed in-process (a pool costs more than it saves)
+PARALLEL_MIN_FILES = 64
 
 class CodeAnalyzer:
     """Analyzes Python source code."""
 
-    def __init__(self):
-        pass
+    def __init__(self, cache: Optional[AstCache] = None):
+        """Initializes the analyzer.
+
+        Args:
+            cache: Optional AstCache shared with other analyzers (e.g. with an
+                on-disk tier); an in-memory cache is created if not given
+        """
+        self.cache = cache or AstCache()
+        self._projects: Dict[str, ProjectIndex] = {}  # Last analyze_project result per root
 
     def analyze_file(self, file_path: str) -> ast.AST:
-        """Reads a Python file and returns its Abstract Syntax Tree (AST)."""
+        """Reads a Python file and returns its Abstract Syntax Tree (AST).
+
+        The tree comes from the AST cache and is shared, so it must not be modified.
+        """
+        return self.parse_file(file_path).tree
+
+    def parse_file(self, file_path: str) -> ParsedFile:
+        """Returns the cached parse (AST, symbol index and source lines) of a Python file."""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                code = f.read()
-            return ast.parse(code)
+            return self.cache.get(file_path)
         except FileNotFoundError:
             print(f"Error: File not found at {file_path}")
             raise
@@ -22,5 +50,258 @@ class CodeAnalyzer:
             print(f"An unexpected error occurred while analyzing {file_path}: {e}")
             raise
 
+    def get_symbols(self, file_path: str) -> Dict[str, LineRange]:
+        """Returns the qualnames of all functions, classes and methods mapped to their line ranges."""
+        return self.parse_file(file_path).symbols
+
+    def get_code_context(self, file_path: str, nodeid: str) -> Optional[str]:
+        """Returns the source of the code a pytest node ID refers to.
+
+        If the node ID points into ``file_path`` itself the test function is
+        returned. Otherwise ``file_path`` is taken to be the module under
+        test and the tested symbol is guessed from the test name
+        (``test_parse_args`` -> ``parse_args``, ``TestParser`` -> ``Parser``).
+
+        Args:
+            file_path: The Python file to take the context from
+            nodeid: The pytest node ID, e.g. ``tests/test_x.py::TestParser::test_parse[1]``
+
+        Returns:
+            The source of the matching symbol, or None if no symbol matches
+        """
+        qualname = self.find_tested_symbol(file_path, nodeid)
+        if qualname is None:
+            return None
+        parsed = self.parse_file(file_path)
+        start, end = parsed.symbols[qualname]
+        return parsed.snippet(start, end)
+
+    def find_tested_symbol(self, file_path: str, nodeid: str) -> Optional[str]:
+        """Returns the qualname of the symbol in file_path a pytest node ID refers to (see get_code_context)."""
+        try:
+            parsed = self.parse_file(file_path)
+        except (OSError, SyntaxError, ValueError):
+            return None
+
+        node_path, _, node_name = nodeid.partition("::")
+        parts = [re.sub(r"\[.*\]$", "", part) for part in node_name.split("::") if part]
+        if not parts:
+            return None
+
+        candidates = []
+        if os.path.abspath(node_path) == parsed.path or parsed.path.endswith(os.sep + os.path.normpath(node_path)):
+            candidates.append(".".join(parts))
+        for part in reversed(parts):
+            stripped = re.sub(r"^(test_?|Test)", "", part)
+            if stripped:
+                candidates.extend([stripped, stripped[:1].lower() + stripped[1:]])
+
+        for candidate in candidates:
+            if candidate in parsed.symbols:
+                return candidate
+            if parsed.names.get(candidate):
+                return parsed.names[candidate][0]
+        return None
+
+    def locate_line(self, file_path: str, lineno: int, max_lines: int = 80) -> Optional[dict]:
+        """Returns the smallest function, class or top-level statement enclosing a line.
+
+        Uses the cached symbol index, so locating many traceback frames in the
+        same file parses it once.
+
+        Args:
+            file_path: The Python file
+            lineno: The 1-based line number (e.g. of a traceback frame)
+            max_lines: Longer enclosing code is cut to this many lines around ``lineno``
+
+        Returns:
+            ``{"path", "lineno", "symbol", "start", "end", "snippet"}`` where
+            symbol is the qualname (None at module level) and start/end are
+            the snippet's line range; None if the file cannot be parsed or the
+            line lies outside any statement
+        """
+        try:
+            parsed = self.parse_file(file_path)
+        except (OSError, SyntaxError, ValueError):
+            return None
+
+        symbol, span = None, None
+        for qualname, (start, end) in parsed.symbols.items():
+            if start <= lineno <= end and (span is None or end - start < span[1] - span[0]):
+                symbol, span = qualname, (start, end)
+        if span is None:
+            starts = [node.lineno for node in parsed.tree.body]
+            position = bisect.bisect_right(starts, lineno) - 1
+            if position < 0:
+                return None
+            node = parsed.tree.body[position]
+            start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+            span = (start, node.end_lineno or node.lineno)
+            if lineno > span[1]:
+                return None
+
+        start, end = span
+        if end - start + 1 > max_lines:
+            start = max(start, min(lineno - max_lines // 2, end - max_lines + 1))
+            end = start + max_lines - 1
+        return {"path": parsed.path, "lineno": lineno, "symbol": symbol,
+                "start": start, "end": end, "snippet": parsed.snippet(start, end)}
+
+    def find_imports(self, file_path: str, module_name: Optional[str] = None) -> List[str]:
+        """Returns the absolute names of all modules imported by a Python file.
+
+        Relative imports are resolved against ``module_name`` (the dotted name
+        of the file itself); for ``from pkg import name`` both ``pkg`` and
+        ``pkg.name`` are returned since ``name`` may be a submodule.
+
+        Args:
+            file_path: Path to the Python file
+            module_name: Dotted module name of the file, needed for relative imports
+
+        Returns:
+            The imported module names, in source order and without duplicates
+        """
+        tree = self.analyze_file(file_path)
+        return collect_imports(tree, module_name, os.path.basename(file_path) == "__init__.py")
+
+    def build_import_graph(self, root: str) -> Dict[str, Set[str]]:
+        """Builds the project-internal import graph of every Python file under root.
+
+        Module names are derived from paths relative to ``root`` (and to
+        ``root/src`` for src-layout projects). Imports of modules outside the
+        project are ignored. Importing ``a.b`` also counts as importing the
+        package ``a/__init__.py``.
+
+        Args:
+            root: The project root directory
+
+        Returns:
+            A mapping of absolute file path to the set of absolute file paths it imports
+        """
+        files = self.find_python_files(root)
+        modules = self._module_names(root, files)
+
+        own_names: Dict[str, str] = {}
+        for module_name, file_path in modules.items():
+            own_names.setdefault(file_path, module_name)
+
+        graph: Dict[str, Set[str]] = {file_path: set() for file_path in files}
+        for file_path, module_name in own_names.items():
+            edges = graph[file_path]
+            try:
+                imported = self.find_imports(file_path, module_name)
+            except (SyntaxError, ValueError, OSError):
+                continue  # Unparsable files simply have no outgoing edges
+            for name in imported:
+                parts = name.split(".")
+                for end in range(1, len(parts) + 1):
+                    target = modules.get(".".join(parts[:end]))
+                    if target and target != file_path:
+                        edges.add(target)
+        return graph
+
+    def find_python_files(self, root: str) -> List[str]:
+        """Returns the absolute paths of all Python files under root, skipping tool/VCS dirs."""
+        found = []
+        for dirpath, dirnames, filenames in os.walk(os.path.abspath(root)):
+            dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS and not d.endswith(".egg-info"))
+            found.extend(os.path.join(dirpath, name) for name in sorted(filenames) if name.endswith(".py"))
+        return found
+
+    def _module_names(self, root: str, files: List[str]) -> Dict[str, str]:
+        """Maps dotted module names to file paths for files under root (and root/src)."""
+        root = os.path.abspath(root)
+        modules: Dict[str, str] = {}
+        for base in (root, os.path.join(root, "src")):
+            for file_path in files:
+                if not file_path.startswith(base + os.sep):
+                    continue
+                rel = os.path.relpath(file_path, base)[:-len(".py")]
+                parts = rel.split(os.sep)
+                if parts[-1] == "__init__":
+                    parts = parts[:-1]
+                if parts and all(part.isidentifier() for part in parts):
+                    modules.setdefault(".".join(parts), file_path)
+        return modules
+
+    def analyze_project(self, root: str, workers: Optional[int] = None,
+                        index_path: Optional[str] = None) -> ProjectIndex:
+        """Analyzes every Python file under root in parallel and returns a ProjectIndex.
+
+        Files are read, hashed and summarized (symbols, imports, per-function
+        cyclomatic complexity, syntax errors) in a process pool. The index of
+        the previous call for the same root (kept in memory, or loaded from
+        index_path) is reused: files whose (mtime, size) is unchanged are not
+        read at all, and files whose content hash is unchanged are not parsed.
+
+        Args:
+            root: The project root directory
+            workers: Number of worker processes (default os.cpu_count(); 1 analyzes in-process)
+            index_path: Optional JSON file the index is loaded from and saved to
+
+        Returns:
+            The up-to-date ProjectIndex; its ``stats`` count reused and parsed files
+        """
+        started = time.monotonic()
+        root = os.path.abspath(root)
+        files = self.find_python_files(root)
+        modules = self._module_names(root, files)
+        own_names: Dict[str, str] = {}
+        for module_name, file_path in modules.items():
+            own_names.setdefault(file_path, module_name)
+
+        previous = self._projects.get(root) or (ProjectIndex.load(index_path, root) if index_path else None)
+        previous_files = previous.files if previous else {}
+
+        summaries: Dict[str, FileSummary] = {}
+        tasks = []
+        for file_path in files:
+            known = previous_files.get(file_path)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            if known and (known.mtime_ns, known.size) == (stat.st_mtime_ns, stat.st_size):
+                summaries[file_path] = known
+            else:
+                tasks.append((file_path, own_names.get(file_path), known.content_hash if known else None))
+
+        parsed = 0
+        workers = workers or os.cpu_count() or 1
+        with telemetry.span("code_analyzer.analyze_project", files=len(files), changed=len(tasks)):
+            if workers == 1 or len(tasks) < PARALLEL_MIN_FILES:
+                results = map(summarize_file, tasks)
+                self._collect_summaries(results, previous_files, summaries)
+            else:
+                chunksize = max(1, len(tasks) // (workers * 8))
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    results = pool.map(summarize_file, tasks, chunksize=chunksize)
+                    self._collect_summaries(results, previous_files, summaries)
+            parsed = sum(1 for task in tasks if summaries.get(task[0]) is not previous_files.get(task[0]))
+
+        index = ProjectIndex(root, summaries, modules)
+        index.stats = {
+            "files": len(summaries),
+            "reused": len(summaries) - parsed,
+            "parsed": parsed,
+            "syntax_errors": sum(1 for summary in summaries.values() if summary.syntax_error),
+            "seconds": round(time.monotonic() - started, 3),
+        }
+        self._projects[root] = index
+        if index_path:
+            index.save(index_path)
+        return index
+
+    def _collect_summaries(self, results, previous_files: Dict[str, FileSummary],
+                           summaries: Dict[str, FileSummary]):
+        """Stores worker results; unchanged content keeps its previous summary with the new stat."""
+        for file_path, summary, mtime_ns, size, content_hash in results:
+            if summary is not None:
+                summaries[file_path] = summary
+            elif content_hash:
+                known = previous_files[file_path]
+                known.mtime_ns, known.size = mtime_ns, size
+                summaries[file_path] = known
+
     # TODO: Add methods for more specific analysis
     # e.g., find_function_definitions, check_complexity, etc. 
\ No newline at end of file
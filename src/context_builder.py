@@ -0,0 +1,399 @@
+import ast
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from .ast_cache import ParsedFile
+from .code_analyzer import CodeAnalyzer
+
+# Default token budget of a code context
+DEFAULT_MAX_TOKENS = 3000
+
+# Words, numbers, line breaks with their indentation, and runs of other characters
+_TOKEN_RE = re.compile(r"[A-Za-z]+|\d+|\n[ \t]*|[^\sA-Za-z\d]+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimates the number of LLM tokens in text without a model tokenizer.
+
+    Approximates BPE vocabularies on source code: one token per line break
+    (with its indentation), per started 6 letters of a word, per started 3
+    digits of a number and per started 2 characters of punctuation (such as
+    ``->`` or ``):``). Spaces between words are free. The estimate errs on
+    the high side, so a budget holds.
+    """
+    count = 0
+    for piece in _TOKEN_RE.findall(text):
+        first = piece[0]
+        if first.isalpha():
+            count += (len(piece) + 5) // 6
+        elif first.isdigit():
+            count += (len(piece) + 2) // 3
+        elif first == "\n":
+            count += 1
+        else:
+            count += (len(piece) + 1) // 2
+    return count
+
+
+def trim_to_tokens(text: str, max_tokens: int, keep: str = "head", focus_line: Optional[int] = None) -> str:
+    """Cuts text to whole lines fitting max_tokens (estimated), marking what was left out.
+
+    Args:
+        text: The text to trim
+        max_tokens: The token budget
+        keep: "head" keeps the first lines, "tail" the last ones (e.g. of a traceback)
+        focus_line: Instead keep the lines around this 1-based line number
+
+    Returns:
+        The text unchanged if it fits, otherwise the kept lines with an
+        ``# ... N lines omitted`` marker where lines were dropped
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    lines = text.splitlines(keepends=True)
+    costs = [estimate_tokens(line) for line in lines]
+    marker_cost = 8
+    budget = max_tokens - 2 * marker_cost
+
+    if focus_line is not None:
+        first = last = min(max(focus_line - 1, 0), len(lines) - 1)
+        used = costs[first]
+        # Grow alternately after and before the focus line
+        while True:
+            grew = False
+            if last + 1 < len(lines) and used + costs[last + 1] <= budget:
+                last += 1
+                used += costs[last]
+                grew = True
+            if first > 0 and used + costs[first - 1] <= budget:
+                first -= 1
+                used += costs[first]
+                grew = True
+            if not grew:
+                break
+    elif keep == "tail":
+        first, last, used = len(lines), len(lines) - 1, 0
+        while first > 0 and used + costs[first - 1] <= budget:
+            first -= 1
+            used += costs[first]
+    else:
+        first, last, used = 0, -1, 0
+        while last + 1 < len(lines) and used + costs[last + 1] <= budget:
+            last += 1
+            used += costs[last]
+
+    parts = []
+    if first > 0:
+        parts.append(f"# ... {first} lines omitted\n")
+    parts.extend(lines[first:last + 1])
+    if last < len(lines) - 1:
+        if parts and not parts[-1].endswith("\n"):
+            parts.append("\n")
+        parts.append(f"# ... {len(lines) - 1 - last} lines omitted\n")
+    return "".join(parts)
+
+
+class ContextBuilder:
+    """Builds compact, token-budgeted code contexts for LLM prompts from cached ASTs.
+
+    Instead of whole files, a context holds the code that matters: the
+    target function in full, then the signatures and docstrings of the
+    functions, methods and classes it uses (also from project modules it
+    imports), and the import statements it relies on. Items are added by
+    priority until the token budget is used up.
+    """
+
+    def __init__(self, analyzer: CodeAnalyzer, max_tokens: int = DEFAULT_MAX_TOKENS, root: Optional[str] = None):
+        """Initializes the builder.
+
+        Args:
+            analyzer: CodeAnalyzer whose AST cache provides parsed files
+            max_tokens: Default token budget of a context (estimated with estimate_tokens)
+            root: Project root imported modules are resolved against (default: the current directory)
+        """
+        self.analyzer = analyzer
+        self.max_tokens = max_tokens
+        self.root = os.path.abspath(root or os.getcwd())
+
+    def for_symbol(self, file_path: str, qualname: str, focus_line: Optional[int] = None,
+                   max_tokens: Optional[int] = None) -> Optional[str]:
+        """Returns the context of a function, method or class.
+
+        Args:
+            file_path: The file defining the symbol
+            qualname: The symbol's qualname, e.g. ``Parser.parse``
+            focus_line: Line to keep if the symbol itself must be cut (e.g. the failing line)
+            max_tokens: Token budget (default: the builder's)
+
+        Returns:
+            The context, or None if the file cannot be parsed or has no such symbol
+        """
+        parsed = self._parse(file_path)
+        node = _find_node(parsed.tree, qualname) if parsed else None
+        if node is None:
+            return None
+        start, end = parsed.symbols[qualname]
+        return self._assemble(parsed, node, qualname, parsed.snippet(start, end), start, focus_line,
+                              max_tokens or self.max_tokens)
+
+    def for_line(self, file_path: str, lineno: int, max_tokens: Optional[int] = None) -> Optional[str]:
+        """Returns the context of the smallest function, class or top-level statement containing a line."""
+        location = self.analyzer.locate_line(file_path, lineno, max_lines=10**9)
+        if location is None:
+            return None
+        if location["symbol"]:
+            return self.for_symbol(file_path, location["symbol"], focus_line=lineno, max_tokens=max_tokens)
+        parsed = self._parse(file_path)
+        node = next((stmt for stmt in parsed.tree.body if stmt.lineno <= lineno <= (stmt.end_lineno or stmt.lineno)), None)
+        if node is None:
+            return None
+        return self._assemble(parsed, node, None, location["snippet"], location["start"], lineno,
+                              max_tokens or self.max_tokens)
+
+    def for_module(self, file_path: str, max_tokens: Optional[int] = None) -> Optional[str]:
+        """Returns a budgeted view of a whole module (e.g. to generate tests for it).
+
+        The module's imports and an outline of every function, class and
+        method (signature and docstring) come first; then, in source order
+        with public code first, outlines are replaced by full definitions
+        while the budget allows. A module that fits the budget is returned
+        unchanged.
+        """
+        parsed = self._parse(file_path)
+        if parsed is None:
+            return None
+        budget = max_tokens or self.max_tokens
+        source = "".join(parsed.lines)
+        if estimate_tokens(source) <= budget:
+            return source
+
+        # Pieces in source order: [text, tokens, full text or None, priority]
+        pieces: List[list] = []
+        for stmt in parsed.tree.body:
+            if isinstance(stmt, (ast.Import, ast.ImportFrom)) or _is_docstring(stmt) or _is_simple_assignment(stmt):
+                text = _statement_source(parsed, stmt)
+                pieces.append([text, estimate_tokens(text), None, 0])
+            elif isinstance(stmt, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                pieces.append(_outline_piece(parsed, stmt, stmt.name, separator="\n"))
+            elif isinstance(stmt, ast.ClassDef):
+                header = "\n" + _class_header(parsed, stmt)
+                pieces.append([header, estimate_tokens(header), None, 0])
+                for child in stmt.body:
+                    if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                        pieces.append(_outline_piece(parsed, child, child.name))
+
+        used = sum(piece[1] for piece in pieces)
+        for piece in sorted((p for p in pieces if p[2] is not None), key=lambda p: p[3]):
+            full_tokens = estimate_tokens(piece[2])
+            if used - piece[1] + full_tokens <= budget:
+                used += full_tokens - piece[1]
+                piece[0], piece[1] = piece[2], full_tokens
+        outline = "".join(piece[0] if piece[0].endswith("\n") else piece[0] + "\n" for piece in pieces)
+        return trim_to_tokens(outline, budget)
+
+    def _parse(self, file_path: str) -> Optional[ParsedFile]:
+        try:
+            return self.analyzer.parse_file(file_path)
+        except (OSError, SyntaxError, ValueError):
+            return None
+
+    def _assemble(self, parsed: ParsedFile, node: ast.AST, qualname: Optional[str], target: str,
+                  target_start: int, focus_line: Optional[int], budget: int) -> str:
+        """Joins the target with as many of its dependencies as the budget allows."""
+        header = f"# {os.path.relpath(parsed.path, self.root)}\n"
+        target_budget = max(budget - estimate_tokens(header), budget // 2)
+        target = trim_to_tokens(target, target_budget,
+                                focus_line=focus_line - target_start + 1 if focus_line else None)
+        remaining = budget - estimate_tokens(header) - estimate_tokens(target)
+
+        imports, dependencies = self._dependencies(parsed, node, qualname)
+        chosen_imports, chosen = [], []
+        for text in imports:
+            cost = estimate_tokens(text)
+            if cost <= remaining:
+                chosen_imports.append(text)
+                remaining -= cost
+        for text in dependencies:
+            cost = estimate_tokens(text) + 1
+            if cost <= remaining:
+                chosen.append(text)
+                remaining -= cost
+
+        parts = [header]
+        if chosen_imports:
+            parts.append("".join(chosen_imports) + "\n")
+        parts.extend(text + "\n" for text in chosen)
+        parts.append(target)
+        return "".join(parts)
+
+    def _dependencies(self, parsed: ParsedFile, node: ast.AST,
+                      qualname: Optional[str]) -> Tuple[List[str], List[str]]:
+        """Returns the import statements and dependency outlines a node uses, in order of first use."""
+        bindings = _import_bindings(parsed.tree)
+        owner = _find_node(parsed.tree, qualname.rpartition(".")[0]) if qualname and "." in qualname else None
+        owner_name = qualname.rpartition(".")[0] if isinstance(owner, ast.ClassDef) else None
+
+        imports: Dict[int, str] = {}  # Source by line, to keep the file's import order
+        dependencies: Dict[Tuple[str, str], str] = {}
+
+        def add_local(name: str):
+            target = _find_node(parsed.tree, name)
+            if target is not None and target is not node and (parsed.path, name) not in dependencies:
+                dependencies[(parsed.path, name)] = _outline(parsed, target)
+
+        def add_imported(statement: ast.AST, module: Optional[str], attribute: Optional[str]):
+            imports.setdefault(statement.lineno, _statement_source(parsed, statement))
+            if not attribute:
+                return
+            other = self._resolve_module(parsed.path, module, getattr(statement, "level", 0))
+            if other is None and "." in attribute:  # ``from pkg import mod`` then ``mod.func``
+                module, _, attribute = f"{module or ''}.{attribute}".lstrip(".").rpartition(".")
+                other = self._resolve_module(parsed.path, module, getattr(statement, "level", 0))
+            target = _find_node(other.tree, attribute) if other else None
+            if target is not None and (other.path, attribute) not in dependencies:
+                relative = os.path.relpath(other.path, self.root)
+                dependencies[(other.path, attribute)] = f"# {relative}\n" + _outline(other, target)
+
+        for reference in _references(node):
+            if isinstance(reference, ast.Name):
+                name = reference.id
+                if name in bindings:
+                    statement, module, attribute = bindings[name]
+                    add_imported(statement, module, attribute)
+                elif name in parsed.symbols:
+                    add_local(name)
+            else:  # ast.Attribute on a Name
+                base = reference.value.id
+                if base in ("self", "cls") and owner_name:
+                    add_local(f"{owner_name}.{reference.attr}")
+                elif base in bindings:
+                    statement, module, attribute = bindings[base]
+                    if attribute is None:  # ``import mod`` then ``mod.func``
+                        add_imported(statement, module, reference.attr)
+                    else:  # A class attribute or, if it names a submodule, a function in it
+                        add_imported(statement, module, attribute)
+                        add_imported(statement, None, f"{module or ''}.{attribute}.{reference.attr}".lstrip("."))
+        return [imports[line] for line in sorted(imports)], list(dependencies.values())
+
+    def _resolve_module(self, file_path: str, module: Optional[str], level: int) -> Optional[ParsedFile]:
+        """Returns the parsed project file of an imported module, or None if it is not project code."""
+        parts = module.split(".") if module else []
+        if level:
+            base = os.path.dirname(file_path)
+            for _ in range(level - 1):
+                base = os.path.dirname(base)
+            bases = [base]
+        else:
+            bases = [self.root, os.path.join(self.root, "src"), os.path.dirname(file_path)]
+        for base in bases:
+            path = os.path.join(base, *parts)
+            for candidate in (path + ".py", os.path.join(path, "__init__.py")):
+                if parts and os.path.isfile(candidate):
+                    return self._parse(candidate)
+        return None
+
+
+def _find_node(tree: ast.AST, qualname: str) -> Optional[ast.AST]:
+    """Returns the function or class definition with a qualname (``Class.method``)."""
+    node = tree
+    for part in qualname.split("."):
+        for child in getattr(node, "body", []):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and child.name == part:
+                node = child
+                break
+        else:
+            return None
+    return node if node is not tree else None
+
+
+def _references(node: ast.AST) -> List[ast.AST]:
+    """Returns the names and ``name.attribute`` accesses a node reads, in source order."""
+    found = []
+    for child in ast.walk(node):
+        if isinstance(child, ast.Attribute) and isinstance(child.value, ast.Name):
+            found.append(child)
+        elif isinstance(child, ast.Name) and isinstance(child.ctx, ast.Load):
+            found.append(child)
+    found.sort(key=lambda ref: (ref.lineno, ref.col_offset))
+    return found
+
+
+def _import_bindings(tree: ast.Module) -> Dict[str, Tuple[ast.AST, Optional[str], Optional[str]]]:
+    """Maps names bound by top-level imports to (statement, module, imported attribute or None)."""
+    bindings = {}
+    for stmt in tree.body:
+        if isinstance(stmt, ast.Import):
+            for alias in stmt.names:
+                if alias.asname:
+                    bindings[alias.asname] = (stmt, alias.name, None)
+                else:
+                    root_name = alias.name.partition(".")[0]
+                    bindings[root_name] = (stmt, root_name, None)
+        elif isinstance(stmt, ast.ImportFrom):
+            for alias in stmt.names:
+                if alias.name != "*":
+                    bindings[alias.asname or alias.name] = (stmt, stmt.module, alias.name)
+    return bindings
+
+
+def _statement_source(parsed: ParsedFile, node: ast.AST) -> str:
+    return parsed.snippet(node.lineno, node.end_lineno or node.lineno)
+
+
+def _is_docstring(node: ast.AST) -> bool:
+    return isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)
+
+
+def _is_simple_assignment(node: ast.AST) -> bool:
+    """True for one-line module or class level assignments (constants, fields)."""
+    return isinstance(node, (ast.Assign, ast.AnnAssign)) and node.lineno == node.end_lineno
+
+
+def _signature(parsed: ParsedFile, node: ast.AST, with_docstring: bool = True) -> str:
+    """Returns the decorators, signature and (optionally) docstring of a definition as written."""
+    start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+    body = node.body[0]
+    if body.lineno == node.lineno:  # One-line definition
+        return parsed.snippet(start, node.end_lineno or node.lineno)
+    text = parsed.snippet(start, body.lineno - 1)
+    if with_docstring and _is_docstring(body):
+        text += parsed.snippet(body.lineno, body.end_lineno or body.lineno)
+        if len(node.body) == 1:
+            return text
+    return text + " " * body.col_offset + "...\n"
+
+
+def _class_header(parsed: ParsedFile, node: ast.ClassDef) -> str:
+    """Returns a class's signature, docstring and one-line field assignments."""
+    start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+    body = node.body[0]
+    if body.lineno == node.lineno:  # One-line class
+        return parsed.snippet(start, node.end_lineno or node.lineno)
+    text = parsed.snippet(start, body.lineno - 1)
+    for child in node.body:
+        if (child is body and _is_docstring(child)) or _is_simple_assignment(child):
+            text += _statement_source(parsed, child)
+    return text
+
+
+def _outline(parsed: ParsedFile, node: ast.AST) -> str:
+    """Returns the signature and docstring of a function, or of a class with its fields and public methods."""
+    if not isinstance(node, ast.ClassDef):
+        return _signature(parsed, node)
+    text = _class_header(parsed, node)
+    for child in node.body:
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)) and \
+                (not child.name.startswith("_") or child.name == "__init__"):
+            text += _signature(parsed, child, with_docstring=False)
+    if text.rstrip().endswith(":"):  # Nothing of the body was included
+        text += " " * node.body[0].col_offset + "...\n"
+    return text
+
+
+def _outline_piece(parsed: ParsedFile, node: ast.AST, name: str, separator: str = "") -> list:
+    """Returns a for_module piece: [outline, its tokens, full source, priority (public first)]."""
+    outline = separator + _signature(parsed, node)
+    start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+    full = separator + parsed.snippet(start, node.end_lineno or node.lineno)
+    return [outline, estimate_tokens(outline), full, 1 if name.startswith("_") and name != "__init__" else 0]
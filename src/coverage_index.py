@@ -0,0 +1,250 @@
+import os
+import sqlite3
+import threading
+import time
+from itertools import zip_longest
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+def numbits_from_lines(lines: Iterable[int]) -> bytes:
+    """Encodes line numbers as a bitmap (coverage.py's "numbits"): bit n is set for line n."""
+    lines = list(lines)
+    if not lines:
+        return b""
+    bits = bytearray(max(lines) // 8 + 1)
+    for line in lines:
+        bits[line // 8] |= 1 << (line % 8)
+    return bytes(bits)
+
+
+def numbits_to_lines(numbits: bytes) -> List[int]:
+    """Decodes a numbits bitmap into sorted line numbers."""
+    return [index * 8 + bit for index, byte in enumerate(numbits) if byte for bit in range(8) if byte & (1 << bit)]
+
+
+def numbits_union(first: bytes, second: bytes) -> bytes:
+    """Returns the numbits of the lines in either bitmap."""
+    return bytes(a | b for a, b in zip_longest(first, second, fillvalue=0))
+
+
+def num_in_numbits(line: int, numbits: bytes) -> bool:
+    """True if line is set in a numbits bitmap."""
+    index = line // 8
+    return index < len(numbits) and bool(numbits[index] & (1 << (line % 8)))
+
+
+class CoverageIndex:
+    """Per-test line coverage in a compact SQLite file, merged from coverage.py data files.
+
+    Each shard or worker writes its own coverage.py data file (``.coverage``
+    with ``--cov-context=test``). Those files are read directly with sqlite3,
+    without importing coverage.py, and folded into one row per (file, test)
+    holding the test's executed lines as a numbits bitmap. So "which tests
+    cover file:line" is a single indexed query, and the dataset is never
+    loaded into memory as a whole.
+    """
+
+    def __init__(self, db_path: str):
+        """Initializes the index; the database is opened (and created) on first use.
+
+        Args:
+            db_path: Path of the SQLite file (":memory:" for a throwaway index)
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """The database connection, opened on first use (callers hold the lock)."""
+        if self._connection is None:
+            if self.db_path != ":memory:" and os.path.dirname(self.db_path):
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._connection.create_function("num_in_numbits", 2, num_in_numbits, deterministic=True)
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    key   TEXT PRIMARY KEY,
+                    value TEXT
+                );
+                CREATE TABLE IF NOT EXISTS file (
+                    id   INTEGER PRIMARY KEY,
+                    path TEXT NOT NULL UNIQUE
+                );
+                CREATE TABLE IF NOT EXISTS test (
+                    id     INTEGER PRIMARY KEY,
+                    nodeid TEXT NOT NULL UNIQUE
+                );
+                CREATE TABLE IF NOT EXISTS line_bits (
+                    file_id INTEGER NOT NULL,
+                    test_id INTEGER NOT NULL,
+                    numbits BLOB NOT NULL,
+                    PRIMARY KEY (file_id, test_id)
+                ) WITHOUT ROWID;
+            """)
+        return self._connection
+
+    @property
+    def built_at(self) -> Optional[float]:
+        """Start time of the coverage run the index was built from (None if never built)."""
+        with self._lock:
+            if self._connection is None and not os.path.exists(self.db_path):
+                return None  # Nothing built yet: don't create the file just to find out
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'built_at'").fetchone()
+        return float(row[0]) if row else None
+
+    def rebuild(self, data_files: Iterable[str], built_at: Optional[float] = None, root: Optional[str] = None) -> int:
+        """Replaces the index with the merged contents of coverage.py data files.
+
+        Args:
+            data_files: The per-shard coverage data files (missing files are skipped)
+            built_at: Time the coverage run started; files modified afterwards make the data stale
+            root: Directory relative paths are resolved against (coverage's ``relative_files``)
+
+        Returns:
+            The number of (file, test) rows in the index
+        """
+        with self._lock, self._conn:
+            self._clear()
+            for data_file in data_files:
+                if os.path.exists(data_file):
+                    self._merge(data_file, root)
+            self._set_built_at(built_at)
+            return self._conn.execute("SELECT COUNT(*) FROM line_bits").fetchone()[0]
+
+    def rebuild_from_report(self, coverage_data: dict, root: str, built_at: Optional[float] = None) -> int:
+        """Replaces the index with a coverage.py JSON report generated with show_contexts.
+
+        Args:
+            coverage_data: The parsed coverage JSON
+            root: Directory the report's paths are relative to
+            built_at: Time the coverage run started
+        """
+        rows: Dict[Tuple[str, str], bytes] = {}
+        for path, file_data in coverage_data.get("files", {}).items():
+            lines: Dict[str, List[int]] = {"": []}
+            for lineno, contexts in file_data.get("contexts", {}).items():
+                for context in contexts:
+                    lines.setdefault(context.split("|")[0] if context else "", []).append(int(lineno))
+            for nodeid, numbers in lines.items():
+                rows[(path, nodeid)] = numbits_from_lines(numbers)
+        with self._lock, self._conn:
+            self._clear()
+            self._store(rows, root)
+            self._set_built_at(built_at)
+            return self._conn.execute("SELECT COUNT(*) FROM line_bits").fetchone()[0]
+
+    def add(self, data_file: str, root: Optional[str] = None):
+        """Merges one more coverage.py data file into the index (e.g. a late worker's shard)."""
+        with self._lock, self._conn:
+            self._merge(data_file, root)
+
+    def _merge(self, data_file: str, root: Optional[str] = None):
+        """ORs the per-test lines of a coverage.py data file into the index (caller holds the lock)."""
+        source = sqlite3.connect(f"file:{data_file}?mode=ro", uri=True)
+        try:
+            rows: Dict[Tuple[str, str], bytes] = {}
+            query = """
+                SELECT file.path, context.context, line_bits.numbits FROM line_bits
+                JOIN file ON file.id = line_bits.file_id JOIN context ON context.id = line_bits.context_id
+            """
+            for path, context, numbits in source.execute(query):
+                self._fold(rows, path, context, numbits)
+            # Branch coverage records arcs instead of lines; their positive ends are the executed lines
+            arcs: Dict[Tuple[str, str], Set[int]] = {}
+            query = """
+                SELECT file.path, context.context, arc.fromno, arc.tono FROM arc
+                JOIN file ON file.id = arc.file_id JOIN context ON context.id = arc.context_id
+            """
+            for path, context, start, end in source.execute(query):
+                arcs.setdefault((path, context), set()).update(line for line in (start, end) if line > 0)
+            for (path, context), lines in arcs.items():
+                self._fold(rows, path, context, numbits_from_lines(lines))
+        except sqlite3.DatabaseError as e:
+            print(f"Skipping unreadable coverage data {data_file}: {e}")
+            return
+        finally:
+            source.close()
+
+        self._store(rows, root)
+
+    def _store(self, rows: Dict[Tuple[str, str], bytes], root: Optional[str]):
+        """ORs (path, nodeid) -> numbits rows into the tables (caller holds the lock)."""
+        for (path, nodeid), numbits in rows.items():
+            path = os.path.normpath(os.path.join(root or os.getcwd(), path))
+            file_id = self._id("file", "path", path)
+            if not nodeid:
+                continue  # Only executed at import time: measured, but by no test
+            test_id = self._id("test", "nodeid", nodeid)
+            existing = self._conn.execute("SELECT numbits FROM line_bits WHERE file_id = ? AND test_id = ?",
+                                          (file_id, test_id)).fetchone()
+            if existing:
+                numbits = numbits_union(existing[0], numbits)
+            self._conn.execute("INSERT OR REPLACE INTO line_bits (file_id, test_id, numbits) VALUES (?, ?, ?)",
+                               (file_id, test_id, numbits))
+
+    def _clear(self):
+        self._conn.execute("DELETE FROM line_bits")
+        self._conn.execute("DELETE FROM test")
+        self._conn.execute("DELETE FROM file")
+
+    def _set_built_at(self, built_at: Optional[float]):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('built_at', ?)",
+                           (repr(built_at if built_at is not None else time.time()),))
+
+    @staticmethod
+    def _fold(rows: Dict[Tuple[str, str], bytes], path: str, context: str, numbits: bytes):
+        # pytest-cov contexts look like "tests/test_x.py::test_a|run"; "" is import time
+        nodeid = context.split("|")[0] if context else ""
+        key = (path, nodeid)
+        rows[key] = numbits_union(rows[key], numbits) if key in rows else numbits
+
+    def _id(self, table: str, column: str, value: str) -> int:
+        self._conn.execute(f"INSERT OR IGNORE INTO {table} ({column}) VALUES (?)", (value,))
+        return self._conn.execute(f"SELECT id FROM {table} WHERE {column} = ?", (value,)).fetchone()[0]
+
+    def files(self) -> List[str]:
+        """Returns the measured file paths."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT path FROM file ORDER BY path")]
+
+    def tests_for_file(self, path: str) -> Optional[Set[str]]:
+        """Returns the tests that executed any line of a file, or None if the file was not measured.
+
+        A file that only ran at import time (module-level code, outside any
+        test) was measured but gives an empty set: the tests importing it are
+        not known here (ImpactAnalyzer.select adds them from the import graph).
+        """
+        with self._lock:
+            file_row = self._conn.execute("SELECT id FROM file WHERE path = ?", (os.path.normpath(path),)).fetchone()
+            if file_row is None:
+                return None
+            return {row[0] for row in self._conn.execute(
+                "SELECT test.nodeid FROM line_bits JOIN test ON test.id = line_bits.test_id WHERE file_id = ?",
+                file_row)}
+
+    def tests_for_line(self, path: str, lineno: int) -> List[str]:
+        """Returns the tests that executed a line of a file, sorted."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("""
+                SELECT test.nodeid FROM line_bits
+                JOIN file ON file.id = line_bits.file_id JOIN test ON test.id = line_bits.test_id
+                WHERE file.path = ? AND num_in_numbits(?, line_bits.numbits)
+                ORDER BY test.nodeid
+            """, (os.path.normpath(path), lineno))]
+
+    def lines_for_test(self, nodeid: str, path: str) -> List[int]:
+        """Returns the lines of a file a test executed."""
+        with self._lock:
+            row = self._conn.execute("""
+                SELECT line_bits.numbits FROM line_bits
+                JOIN file ON file.id = line_bits.file_id JOIN test ON test.id = line_bits.test_id
+                WHERE file.path = ? AND test.nodeid = ?
+            """, (os.path.normpath(path), nodeid)).fetchone()
+        return numbits_to_lines(row[0]) if row else []
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -1,5 +1,11 @@
+import os
+from dataclasses import asdict
+from typing import Optional
+
+from . import telemetry
 from .executor import Executor
 from .code_analyzer import CodeAnalyzer
+from .traceback_parser import parse_traceback
 # from .llm_interface import LLMInterface # Import when LLM is added
 
 class Debugger:
@@ -12,45 +18,111 @@ class Debugger:
         # self.llm = llm # Uncomment when LLM is integrated
         print("Debugger initialized.")
 
-    def debug_file(self, file_path: str):
-        """Attempts to run and debug a Python file."""
+    def debug_file(self, file_path: str) -> dict:
+        """Attempts to run and debug a Python file.
+
+        Returns:
+            A dictionary describing the outcome: ``status`` ("passed", "failed",
+            "timeout" or "analysis_error") plus exit code, captured output and
+            ``resources`` (peak RSS, CPU and wall time). Failures with a
+            traceback also get ``exception`` (type, message and frames) and
+            ``locations``: the smallest enclosing code of every project frame,
+            innermost first
+        """
         print(f"Attempting to debug {file_path}...")
 
         # 1. Static Analysis (Optional but good practice)
         try:
-            ast_tree = self.analyzer.analyze_file(file_path)
+            with telemetry.span("debugger.static_analysis", file=file_path):
+                ast_tree = self.analyzer.analyze_file(file_path)
             print(f"Static analysis passed for {file_path}.")
             # TODO: Add more sophisticated static checks here if needed
         except (FileNotFoundError, SyntaxError) as e:
             print(f"Debugging stopped due to initial analysis error: {e}")
             # TODO: Potentially use LLM to suggest fixes for SyntaxError
-            return
+            return {"file_path": file_path, "status": "analysis_error", "error": f"{type(e).__name__}: {e}"}
         except Exception as e:
             print(f"Unexpected error during static analysis: {e}")
-            return # Stop debugging if analysis fails unexpectedly
-
-        # 2. Execution
-        return_code, stdout, stderr = self.executor.run_python_script(file_path)
+            # Stop debugging if analysis fails unexpectedly
+            return {"file_path": file_path, "status": "analysis_error", "error": f"{type(e).__name__}: {e}"}
 
+        # 2. Execution (output is shown live; only a bounded head/tail is kept)
         print("--- Execution Output ---")
-        if stdout:
-            print("Stdout:")
-            print(stdout)
-        if stderr:
-            print("Stderr:")
-            print(stderr)
+        with telemetry.span("debugger.execute", file=file_path) as stage:
+            process = self.executor.stream_python_script(file_path)
+            for stream, line in process:
+                print(line if stream == "stdout" else f"[stderr] {line}", end="")
+            return_code, stdout, stderr = process.returncode, process.stdout, process.stderr
+            stage.set_attribute("exit_code", return_code)
+        if process.timed_out:
+            print(f"Execution timed out after {process.timeout}s.")
         print(f"Exit Code: {return_code}")
+        if process.usage:
+            print(f"Resources: {process.usage.describe()}")
         print("------------------------")
 
+        result = {
+            "file_path": file_path,
+            "status": "timeout" if process.timed_out else ("passed" if return_code == 0 else "failed"),
+            "exit_code": return_code,
+            "stdout": stdout,
+            "stderr": stderr,
+            "duration": process.duration,
+            "resources": process.usage.to_dict() if process.usage else None,
+        }
+
         # 3. Error Analysis
         if return_code != 0:
             print("Execution failed. Analyzing error...")
-            # TODO: Parse stderr for stack trace and error message
-            # TODO: Use CodeAnalyzer to pinpoint error location in AST
+            with telemetry.span("debugger.localize", file=file_path):
+                result.update(self.localize_error(stderr, roots=[os.getcwd(), os.path.dirname(os.path.abspath(file_path))]))
+            exception = result.get("exception")
+            if exception:
+                print(f"{exception['type']}: {exception['message']}")
+                for location in result["locations"][:1]:
+                    where = location["symbol"] or "module level"
+                    print(f"Raised in {location['path']}:{location['lineno']} ({where}):")
+                    for number, line in enumerate(location["snippet"].splitlines(), start=location["start"]):
+                        print(f"{'>' if number == location['lineno'] else ' '}{number:5d} | {line}")
             # TODO: Feed error details, stack trace, and code context to LLM
             # self.llm.analyze_error(file_path, stderr, ast_tree)
             # TODO: Suggest fixes based on LLM analysis
         else:
             print(f"{file_path} executed successfully (exit code 0).")
+        return result
+
+    def localize_error(self, stderr: str, roots: Optional[list] = None) -> dict:
+        """Parses a traceback from stderr and maps its project frames onto the code.
+
+        Args:
+            stderr: The stderr of the failed run
+            roots: Directories whose files count as project code (default: the current directory)
+
+        Returns:
+            ``{"exception": {"type", "message", "frames"}, "locations": [...]}``
+            with one CodeAnalyzer.locate_line result per project frame,
+            innermost first; empty if stderr holds no traceback
+        """
+        traceback = parse_traceback(stderr)
+        if traceback is None:
+            return {}
+        frames = traceback.project_frames(roots or [os.getcwd()])
+        locations, seen = [], set()
+        for frame in reversed(frames):
+            if (frame.path, frame.lineno) in seen or not os.path.isfile(frame.path):
+                continue  # Recursion repeats frames; "<string>" and vanished files have no code
+            seen.add((frame.path, frame.lineno))
+            location = self.analyzer.locate_line(frame.path, frame.lineno)
+            if location is not None:
+                location["function"] = frame.function
+                locations.append(location)
+        return {
+            "exception": {
+                "type": traceback.exc_type,
+                "message": traceback.message,
+                "frames": [asdict(frame) for frame in traceback.frames],
+            },
+            "locations": locations,
+        }
 
     # TODO: Add more debugging strategies (e.g., stepping, breakpoints - complex!) 
\ No newline at end of file
@@ -0,0 +1,390 @@
+import hmac
+import ipaddress
+import json
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from . import telemetry
+
+# Workers send a heartbeat this often while a shard runs
+HEARTBEAT_INTERVAL_SECONDS = 5.0
+# A worker silent for this long is considered dead and its shard is re-queued
+HEARTBEAT_TIMEOUT_SECONDS = 30.0
+# Default limit for a whole distributed run, so a run whose workers never show up cannot hang forever
+RUN_TIMEOUT_SECONDS = 3600.0
+# Shared secret workers present in their hello message
+TOKEN_ENV = "AI_AGENT_WORKER_TOKEN"
+
+
+@dataclass
+class Shard:
+    """A batch of test node IDs handed to one worker at a time."""
+    id: int
+    nodeids: List[str]
+    expected_seconds: float = 0.0
+    attempts: int = 0
+    errors: List[str] = field(default_factory=list)
+
+
+def parse_address(address: str) -> Tuple[int, object]:
+    """Returns (socket family, address) for a ``host:port`` TCP address or a Unix socket path."""
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, address
+
+
+def is_local_address(address: str) -> bool:
+    """True for Unix socket paths and loopback TCP addresses."""
+    family, target = parse_address(address)
+    if family == socket.AF_UNIX:
+        return True
+    host = target[0]
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def send_message(sock: socket.socket, message: dict, lock: Optional[threading.Lock] = None):
+    """Writes one JSON message (one line) to a socket."""
+    data = (json.dumps(message, default=str) + "\n").encode()
+    if lock is None:
+        sock.sendall(data)
+    else:
+        with lock:
+            sock.sendall(data)
+
+
+def read_message(reader) -> dict:
+    """Reads one JSON message from a socket file.
+
+    Raises:
+        ConnectionError: If the peer closed the connection
+        ValueError: If the line is not a JSON object
+    """
+    line = reader.readline()
+    if not line:
+        raise ConnectionError("connection closed")
+    message = json.loads(line)
+    if not isinstance(message, dict):
+        raise ValueError("message must be a JSON object")
+    return message
+
+
+class Coordinator:
+    """Hands out test shards to worker processes and collects their reports.
+
+    Workers connect over TCP or a Unix socket and speak a JSONL protocol:
+
+    * worker: ``{"type": "hello", "worker": name, "token": secret}``
+    * coordinator: ``{"type": "shard", "id": n, "nodeids": [...], "pytest_args": [...]}``
+      or ``{"type": "done"}`` once no work is left
+    * worker: ``{"type": "heartbeat"}`` while the shard runs, then
+      ``{"type": "result", "id": n, "report": {...}}``
+
+    Shards are handed out longest-expected first, one at a time per worker,
+    so faster workers simply take more shards. A worker whose connection
+    drops or that misses heartbeats is considered dead, and its shard goes
+    back to the front of the queue (up to max_attempts times).
+
+    Workers must present the coordinator's token; others are disconnected
+    before they see any shard. Without a configured token one is generated,
+    which only locally spawned workers receive (see spawn_local_workers), and
+    listening on a non-loopback address is refused.
+    """
+
+    def __init__(self, address: str, shards: List[Shard], pytest_args: Optional[List[str]] = None,
+                 heartbeat_timeout: float = HEARTBEAT_TIMEOUT_SECONDS, max_attempts: int = 3,
+                 fail_fast: bool = False, token: Optional[str] = None):
+        """Initializes the coordinator; call start() to listen for workers.
+
+        Args:
+            address: ``host:port`` or a Unix socket path to listen on
+            shards: The shards to run
+            pytest_args: Extra pytest arguments sent with every shard
+            heartbeat_timeout: Seconds of worker silence after which its shard is re-queued
+            max_attempts: How many workers may die on a shard before it is reported as an error
+            fail_fast: Stop handing out shards once a test failed
+            token: Shared secret workers must send (default: AI_AGENT_WORKER_TOKEN, else a random one)
+        """
+        self.address = address
+        self.shards = shards
+        self.pytest_args = list(pytest_args or [])
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_attempts = max_attempts
+        self.fail_fast = fail_fast
+        configured = token or os.environ.get(TOKEN_ENV)
+        self.token = configured or secrets.token_urlsafe(24)
+        self._token_configured = bool(configured)
+        self.reports: Dict[int, dict] = {}
+        self.workers: Dict[str, int] = {}  # Shards completed per worker
+        self.requeued = 0
+        self._pending = deque(sorted(shards, key=lambda shard: shard.expected_seconds, reverse=True))
+        self._in_flight: Dict[int, Shard] = {}
+        self._cancelled = False
+        self._connected = 0  # Authenticated worker connections
+        self._condition = threading.Condition()
+        self._server: Optional[socket.socket] = None
+
+    def start(self):
+        """Listens on the address and accepts workers in a background thread."""
+        if not self._token_configured and not is_local_address(self.address):
+            raise ValueError(f"Listening on {self.address} requires a shared worker token: set {TOKEN_ENV} "
+                             "on the coordinator and the workers")
+        family, address = parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(address):
+            os.unlink(address)
+        self._server = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self._server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._server.bind(address)
+        self._server.listen()
+        if family == socket.AF_INET and address[1] == 0:
+            self.address = f"{address[0]}:{self._server.getsockname()[1]}"
+        threading.Thread(target=self._accept, args=(self._server,), name="coordinator-accept", daemon=True).start()
+        print(f"Coordinator listening for workers on {self.address} ({len(self.shards)} shards)")
+        if not self._token_configured:
+            print(f"No {TOKEN_ENV} set: only workers started by this run can join.")
+
+    @property
+    def finished(self) -> bool:
+        return len(self.reports) == len(self.shards) or (self._cancelled and not self._in_flight)
+
+    def wait(self, timeout: Optional[float] = None,
+             local_workers: Optional[List[subprocess.Popen]] = None) -> List[dict]:
+        """Waits until every shard has a report and returns them in shard order.
+
+        Shards without a report (timeout, fail-fast cancellation, no worker
+        left) are returned as error reports so the caller can merge them.
+
+        Args:
+            timeout: Give up after this many seconds
+            local_workers: Worker processes started for this run; once all of them
+                exited and no other worker is connected, the remaining work is abandoned
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        abandoned = None
+        with self._condition:
+            while not self.finished:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                if local_workers:
+                    if self._connected == 0 and all(worker.poll() is not None for worker in local_workers):
+                        codes = ", ".join(str(worker.returncode) for worker in local_workers)
+                        abandoned = f"every local worker exited (exit codes: {codes})"
+                        print(f"No workers left: {abandoned}.")
+                        break
+                    remaining = 0.5 if remaining is None else min(remaining, 0.5)
+                self._condition.wait(remaining)
+            reports = []
+            for shard in self.shards:
+                report = self.reports.get(shard.id)
+                if report is None and self._cancelled:
+                    report = {"created": time.time(), "exitcode": 2, "summary": {"total": 0}, "tests": [],
+                              "stopped_early": True}
+                elif report is None:
+                    error = f"Shard {shard.id} not run: {abandoned}" if abandoned \
+                        else f"Shard {shard.id} did not finish in time"
+                    report = {"error": error, "exit_code": 1, "nodeids": shard.nodeids}
+                reports.append(report)
+            return reports
+
+    def close(self):
+        """Stops accepting workers; connected workers are told there is no more work."""
+        with self._condition:
+            self._cancelled = True
+            self._pending.clear()
+            self._condition.notify_all()
+        if self._server is not None:
+            self._server.close()
+            family, address = parse_address(self.address)
+            if family == socket.AF_UNIX and os.path.exists(address):
+                os.unlink(address)
+            self._server = None
+
+    def _accept(self, server: socket.socket):
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return  # Closed
+            thread = threading.Thread(target=self._serve_worker, args=(conn,), daemon=True)
+            thread.start()
+
+    def _serve_worker(self, conn: socket.socket):
+        """Feeds shards to one worker connection until the work is done or the worker dies."""
+        name = "unknown"
+        shard = None
+        authenticated = False
+        try:
+            conn.settimeout(self.heartbeat_timeout)
+            reader = conn.makefile("rb")
+            hello = read_message(reader)
+            name = str(hello.get("worker") or name)
+            if not hmac.compare_digest(str(hello.get("token") or ""), self.token):
+                print(f"Rejected worker {name}: wrong or missing token")
+                return
+            with self._condition:
+                self._connected += 1
+            authenticated = True
+            print(f"Worker connected: {name}")
+            while True:
+                shard = self._next_shard()
+                if shard is None:
+                    send_message(conn, {"type": "done"})
+                    return
+                send_message(conn, {"type": "shard", "id": shard.id, "nodeids": shard.nodeids,
+                                    "pytest_args": self.pytest_args})
+                message = read_message(reader)
+                while message.get("type") == "heartbeat":
+                    message = read_message(reader)
+                if message.get("type") != "result" or message.get("id") != shard.id:
+                    raise ValueError(f"unexpected message {message.get('type')!r}")
+                self._complete(shard, message.get("report") or {}, name)
+                shard = None
+        except (OSError, ValueError) as e:
+            if shard is not None:
+                self._requeue(shard, name, f"{type(e).__name__}: {e}")
+        finally:
+            conn.close()
+            if authenticated:
+                with self._condition:
+                    self._connected -= 1
+                    self._condition.notify_all()
+
+    def _next_shard(self) -> Optional[Shard]:
+        """Blocks until a shard is available; None once no work is left.
+
+        An idle worker keeps waiting while shards are in flight elsewhere,
+        since they come back if their worker dies.
+        """
+        with self._condition:
+            while not self._pending:
+                if self._cancelled or not self._in_flight:
+                    return None
+                self._condition.wait()
+            shard = self._pending.popleft()
+            shard.attempts += 1
+            self._in_flight[shard.id] = shard
+            return shard
+
+    def _complete(self, shard: Shard, report: dict, worker: str):
+        with self._condition:
+            self._in_flight.pop(shard.id, None)
+            self.reports[shard.id] = report
+            self.workers[worker] = self.workers.get(worker, 0) + 1
+            failed = any(test.get("outcome") in ("failed", "error") for test in report.get("tests", []))
+            if self.fail_fast and failed:
+                self._cancelled = True
+                self._pending.clear()
+            self._condition.notify_all()
+        telemetry.count("ai_agent_shards_total", status="ok", worker=worker)
+
+    def _requeue(self, shard: Shard, worker: str, reason: str):
+        with self._condition:
+            self._in_flight.pop(shard.id, None)
+            shard.errors.append(f"{worker}: {reason}")
+            if shard.attempts >= self.max_attempts:
+                print(f"Shard {shard.id} failed on {shard.attempts} workers; giving up.")
+                self.reports[shard.id] = {"error": f"Shard {shard.id} lost its worker {shard.attempts} times",
+                                          "exit_code": 1, "worker_errors": shard.errors, "nodeids": shard.nodeids}
+            elif not self._cancelled:
+                print(f"Worker {worker} died ({reason}); re-queueing shard {shard.id}.")
+                self._pending.appendleft(shard)
+                self.requeued += 1
+            self._condition.notify_all()
+        telemetry.count("ai_agent_shards_total", status="requeued", worker=worker)
+
+
+def run_worker(address: str, test_runner, cwd: Optional[str] = None, name: Optional[str] = None,
+               heartbeat_interval: float = HEARTBEAT_INTERVAL_SECONDS, token: Optional[str] = None) -> int:
+    """Connects to a coordinator and runs the shards it hands out until told to stop.
+
+    Args:
+        address: The coordinator's ``host:port`` or Unix socket path
+        test_runner: The TestRunner that runs each shard locally
+        cwd: The project checkout to run pytest in (default: the current directory)
+        name: Worker name reported to the coordinator (default: host:pid)
+        heartbeat_interval: Seconds between heartbeats while a shard runs
+        token: The coordinator's shared secret (default: AI_AGENT_WORKER_TOKEN)
+
+    Returns:
+        The number of shards run
+    """
+    cwd = os.path.abspath(cwd or os.getcwd())
+    name = name or f"{socket.gethostname()}:{os.getpid()}"
+    family, target = parse_address(address)
+    conn = socket.socket(family, socket.SOCK_STREAM)
+    conn.connect(target)
+    reader = conn.makefile("rb")
+    lock = threading.Lock()
+    completed = 0
+    try:
+        send_message(conn, {"type": "hello", "worker": name, "token": token or os.environ.get(TOKEN_ENV)}, lock)
+        while True:
+            try:
+                message = read_message(reader)
+            except ConnectionError:
+                break
+            if message.get("type") != "shard":
+                break  # "done"
+            stopped = threading.Event()
+
+            def heartbeat():
+                while not stopped.wait(heartbeat_interval):
+                    try:
+                        send_message(conn, {"type": "heartbeat"}, lock)
+                    except OSError:
+                        return
+
+            beat = threading.Thread(target=heartbeat, daemon=True)
+            beat.start()
+            try:
+                with telemetry.span("worker.run_shard", shard=message["id"], tests=len(message["nodeids"])):
+                    pytest_args = [f"--rootdir={cwd}"] + list(message.get("pytest_args") or [])
+                    stream = test_runner.stream_pytest(message["nodeids"], cwd=cwd, pytest_args=pytest_args,
+                                                       echo=False)
+                    report = test_runner._collect_results(stream, cwd)
+            finally:
+                stopped.set()
+                beat.join()
+            report.pop("stdout", None)  # Error reports carry the full output; keep messages small
+            send_message(conn, {"type": "result", "id": message["id"], "report": report.to_dict()}, lock)
+            report.close()
+            completed += 1
+            print(f"Worker {name}: shard {message['id']} done ({report.total} tests)")
+    finally:
+        conn.close()
+    return completed
+
+
+def spawn_local_workers(address: str, count: int, cwd: Optional[str] = None,
+                        token: Optional[str] = None) -> List[subprocess.Popen]:
+    """Starts ``count`` worker processes of this agent on the local machine.
+
+    Args:
+        address: The coordinator address the workers connect to
+        count: Number of worker processes
+        cwd: The project directory the workers run pytest in
+        token: The coordinator's token, passed in the environment (not visible in ps)
+    """
+    package_parent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    if token:
+        env[TOKEN_ENV] = token
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [package_parent, env.get("PYTHONPATH")]))
+    command = [sys.executable, "-m", "src.main", "--worker", address, "--history-db", ""]
+    return [subprocess.Popen(command, cwd=cwd, env=env, stdout=subprocess.DEVNULL)
+            for _ in range(count)]
@@ -1,36 +1,467 @@
+import os
+import queue
+import shutil
+import signal
 import subprocess
 import sys
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from . import telemetry
+
+try:
+    import resource
+except ImportError:  # Not available on Windows: no limits, wall time only
+    resource = None
+
+if TYPE_CHECKING:
+    from .warm_pool import WarmPool
+
+# Longest chunk read as one "line"; longer lines are split so memory stays bounded
+MAX_LINE_BYTES = 64 * 1024
+# Lines buffered between the pipe reader threads and the consumer
+QUEUE_LINES = 1024
+# How long to wait for pipes to close after killing a timed-out process group
+KILL_GRACE_SECONDS = 1.0
+# Sets the limits given as arguments, then replaces itself with the command (no preexec_fn: that
+# runs Python between fork and exec, which is unsafe with threads and disables vfork/posix_spawn)
+LIMITS_WRAPPER = (
+    "import os, resource, sys\n"
+    "memory, cpu = (int(value) if value else None for value in sys.argv[1:3])\n"
+    "if memory is not None: resource.setrlimit(resource.RLIMIT_AS, (memory, memory))\n"
+    "if cpu is not None: resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))\n"
+    "os.execvp(sys.argv[3], sys.argv[3:])\n"
+)
+
+
+@dataclass
+class ResourceUsage:
+    """Resources used by one child process (and the children it waited for)."""
+    wall_seconds: float
+    user_seconds: Optional[float] = None
+    system_seconds: Optional[float] = None
+    max_rss_kb: Optional[int] = None  # Peak resident set size
+
+    @property
+    def cpu_seconds(self) -> Optional[float]:
+        if self.user_seconds is None or self.system_seconds is None:
+            return None
+        return self.user_seconds + self.system_seconds
+
+    @classmethod
+    def from_rusage(cls, rusage, wall_seconds: float) -> "ResourceUsage":
+        """Builds the usage from an os.wait4 rusage (or the dict a fork server reports)."""
+        if rusage is None:
+            return cls(wall_seconds)
+        if isinstance(rusage, dict):
+            return cls(wall_seconds, rusage.get("user_seconds"), rusage.get("system_seconds"),
+                       rusage.get("max_rss_kb"))
+        # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+        max_rss_kb = rusage.ru_maxrss // 1024 if sys.platform == "darwin" else rusage.ru_maxrss
+        return cls(wall_seconds, rusage.ru_utime, rusage.ru_stime, max_rss_kb)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    def describe(self) -> str:
+        """One-line human readable summary, e.g. "wall 1.20s, cpu 0.85s (user 0.80s, sys 0.05s), peak RSS 41.3 MB"."""
+        text = f"wall {self.wall_seconds:.2f}s"
+        if self.cpu_seconds is not None:
+            text += f", cpu {self.cpu_seconds:.2f}s (user {self.user_seconds:.2f}s, sys {self.system_seconds:.2f}s)"
+        if self.max_rss_kb is not None:
+            text += f", peak RSS {self.max_rss_kb / 1024:.1f} MB"
+        return text
+
+
+@dataclass
+class ResourceLimits:
+    """Optional caps set on a child process with setrlimit before it execs the command.
+
+    A process exceeding memory_mb fails to allocate (MemoryError in Python);
+    one exceeding cpu_seconds receives SIGXCPU, then SIGKILL a second later.
+    """
+    memory_mb: Optional[int] = None  # Address space (RLIMIT_AS)
+    cpu_seconds: Optional[int] = None  # CPU time (RLIMIT_CPU)
+
+    def __bool__(self) -> bool:
+        return self.memory_mb is not None or self.cpu_seconds is not None
+
+    def wrap(self, command: List[str], env: Optional[Dict[str, str]] = None) -> List[str]:
+        """Returns a command that sets the limits and then execs ``command``.
+
+        Raises:
+            FileNotFoundError: If the program cannot be found (as Popen would)
+        """
+        program = command[0]
+        if os.sep not in program:
+            program = shutil.which(program, path=(env or os.environ).get("PATH"))
+            if program is None:
+                raise FileNotFoundError(f"No such file or directory: {command[0]!r}")
+        memory = self.memory_mb * 1024 * 1024 if self.memory_mb is not None else ""
+        cpu = self.cpu_seconds if self.cpu_seconds is not None else ""
+        return [sys.executable, "-c", LIMITS_WRAPPER, str(memory), str(cpu), program, *command[1:]]
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class CommandResult(tuple):
+    """The (returncode, stdout, stderr) of a finished command, plus its resource usage.
+
+    It is a 3-tuple, so ``code, out, err = executor.run_command(...)`` keeps
+    working; the figures are available as ``result.usage``.
+    """
+
+    def __new__(cls, returncode: int, stdout: str, stderr: str, usage: Optional[ResourceUsage] = None):
+        result = super().__new__(cls, (returncode, stdout, stderr))
+        result.usage = usage
+        return result
+
+    @property
+    def returncode(self) -> int:
+        return self[0]
+
+    @property
+    def stdout(self) -> str:
+        return self[1]
+
+    @property
+    def stderr(self) -> str:
+        return self[2]
+
+
+class OutputBuffer:
+    """Keeps the first and last lines of a stream, dropping the middle.
+
+    With ``head_lines=None`` every line is kept (unbounded capture).
+    """
+
+    def __init__(self, head_lines: Optional[int] = 200, tail_lines: int = 800):
+        self.head_lines = head_lines
+        self.head: List[str] = []
+        self.tail: deque = deque(maxlen=tail_lines)
+        self.dropped = 0
+        self.total_lines = 0
+
+    def append(self, line: str):
+        """Adds a line, evicting the oldest tail line once the buffer is full."""
+        self.total_lines += 1
+        if self.head_lines is None or len(self.head) < self.head_lines:
+            self.head.append(line)
+            return
+        if len(self.tail) == self.tail.maxlen:
+            self.dropped += 1
+        self.tail.append(line)
+
+    def text(self) -> str:
+        """Returns the buffered output, marking where lines were dropped."""
+        if not self.dropped:
+            return "".join(self.head) + "".join(self.tail)
+        return (
+            "".join(self.head)
+            + f"\n... [{self.dropped} lines omitted] ...\n"
+            + "".join(self.tail)
+        )
+
+
+class StreamingProcess:
+    """A running command whose output is consumed line by line as it is produced.
+
+    Iterating yields ``(stream, line)`` tuples where stream is "stdout" or
+    "stderr". Only a bounded head and tail of each stream is retained. The
+    command runs in its own process group, which is killed as a whole when
+    the timeout expires or the consumer stops iterating early.
+
+    Once it finished, ``usage`` holds the resources it used (peak RSS and
+    CPU time from os.wait4, wall time everywhere).
+
+    Example:
+        process = executor.stream_command(["pytest"], timeout=600)
+        for stream, line in process:
+            print(line, end="")
+        print(process.returncode, process.timed_out, process.usage)
+    """
+
+    start_mode = "cold"  # Telemetry label: how the process is started
+
+    def __init__(self, command: List[str], cwd: str = None, timeout: Optional[float] = None,
+                 head_lines: Optional[int] = 200, tail_lines: int = 800,
+                 env: Optional[Dict[str, str]] = None, pass_fds: Sequence[int] = (),
+                 limits: Optional[ResourceLimits] = None):
+        self.command = command
+        self.timeout = timeout
+        self.limits = limits if limits else None
+        self.usage: Optional[ResourceUsage] = None
+        self.stdout_buffer = OutputBuffer(head_lines, tail_lines)
+        self.stderr_buffer = OutputBuffer(head_lines, tail_lines)
+        self.returncode: Optional[int] = None
+        self.timed_out = False
+        self.started_at = time.monotonic()
+        self.duration: Optional[float] = None
+        self._consumed = False
+        self._queue: queue.Queue = queue.Queue(maxsize=QUEUE_LINES)
+        self._reaper: Optional[threading.Thread] = None
+        self._rusage = None
+        self._bytes_read = {"stdout": 0, "stderr": 0}  # Raw bytes, each counted by its own reader thread
+
+        with telemetry.span("executor.spawn", mode=self.start_mode):
+            self._process = self._start(command, cwd, env, pass_fds)
+        telemetry.count("ai_agent_processes_spawned_total", mode=self.start_mode)
+        for name, pipe in (("stdout", self._process.stdout), ("stderr", self._process.stderr)):
+            threading.Thread(target=self._pump, args=(name, pipe), daemon=True).start()
+
+    def _start(self, command: List[str], cwd: Optional[str], env: Optional[Dict[str, str]],
+               pass_fds: Sequence[int]):
+        """Starts the command; returns a Popen-like object with piped stdout and stderr."""
+        if self.limits and resource is not None:
+            command = self.limits.wrap(command, {**os.environ, **env} if env else None)
+        return subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=cwd,
+            env={**os.environ, **env} if env else None,
+            pass_fds=tuple(pass_fds),
+            start_new_session=(os.name == "posix"),  # Own process group, killable as a whole
+        )
+
+    @property
+    def pid(self) -> int:
+        return self._process.pid
+
+    @property
+    def stdout(self) -> str:
+        return self.stdout_buffer.text()
+
+    @property
+    def stderr(self) -> str:
+        return self.stderr_buffer.text()
+
+    def _pump(self, name: str, pipe):
+        """Reads a pipe in a background thread and forwards its lines to the queue."""
+        try:
+            for chunk in iter(lambda: pipe.readline(MAX_LINE_BYTES), b""):
+                self._bytes_read[name] += len(chunk)
+                self._queue.put((name, chunk.decode("utf-8", errors="replace")))
+        except (OSError, ValueError):
+            pass  # Pipe closed underneath us after a kill
+        finally:
+            self._queue.put((name, None))
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        if self._consumed:
+            return
+        self._consumed = True
+        deadline = self.started_at + self.timeout if self.timeout is not None else None
+        grace_deadline = None
+        open_streams = 2
+        try:
+            while open_streams:
+                now = time.monotonic()
+                if deadline is not None and now >= deadline and not self.timed_out:
+                    self._on_timeout()
+                    grace_deadline = now + KILL_GRACE_SECONDS
+                if grace_deadline is not None and now >= grace_deadline:
+                    break  # Something outside the process group still holds the pipes
+                wait = 0.1 if deadline is None or self.timed_out else max(0.0, min(0.1, deadline - now))
+                try:
+                    name, line = self._queue.get(timeout=wait)
+                except queue.Empty:
+                    continue
+                if line is None:
+                    open_streams -= 1
+                    continue
+                (self.stdout_buffer if name == "stdout" else self.stderr_buffer).append(line)
+                yield name, line
+            self._wait(deadline)
+        finally:
+            if self.returncode is None:
+                # The consumer stopped early (or an error occurred): don't leave the command running
+                self.kill()
+                self._drain(open_streams)
+                self._wait(None)
+
+    def _drain(self, open_streams: int):
+        """Discards queued output so blocked reader threads can see EOF and exit."""
+        grace_deadline = time.monotonic() + KILL_GRACE_SECONDS
+        while open_streams and time.monotonic() < grace_deadline:
+            try:
+                if self._queue.get(timeout=0.1)[1] is None:
+                    open_streams -= 1
+            except queue.Empty:
+                continue
+
+    def wait(self) -> int:
+        """Consumes the remaining output without yielding it and returns the exit code."""
+        for _ in self:
+            pass
+        return self.returncode
+
+    def kill(self):
+        """Kills the command together with every process it started."""
+        try:
+            if os.name == "posix":
+                os.killpg(self._process.pid, signal.SIGKILL)
+            else:
+                self._process.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def _on_timeout(self):
+        self.timed_out = True
+        self.kill()
+        self.stderr_buffer.append(f"\n[Timed out after {self.timeout}s; process group killed]\n")
+
+    def _reap(self, timeout: Optional[float]):
+        """Waits for the process to exit; returns (returncode, rusage or None).
+
+        Children of ours are reaped with a blocking os.wait4 in a helper
+        thread, which also returns the resources they used, so the exit is
+        seen as soon as it happens. Other processes (warm runs) report their own.
+        """
+        if not isinstance(self._process, subprocess.Popen) or not hasattr(os, "wait4"):
+            returncode = self._process.wait(timeout=timeout)
+            return returncode, getattr(self._process, "rusage", None)
+        if self._reaper is None:
+            self._reaper = threading.Thread(target=self._wait4, daemon=True)
+            self._reaper.start()
+        self._reaper.join(timeout)
+        if self._reaper.is_alive():
+            raise subprocess.TimeoutExpired(self.command, timeout)
+        if self._rusage is None:
+            return self._process.wait(), None  # Already reaped elsewhere
+        return self._process.returncode, self._rusage
+
+    def _wait4(self):
+        try:
+            _, status, self._rusage = os.wait4(self._process.pid, 0)
+        except ChildProcessError:
+            return
+        self._process.returncode = os.waitstatus_to_exitcode(status)
+
+    def _wait(self, deadline: Optional[float]):
+        """Reaps the process, killing it if it outlives the deadline after closing its pipes."""
+        try:
+            remaining = None if deadline is None or self.timed_out else max(0.0, deadline - time.monotonic())
+            self.returncode, rusage = self._reap(remaining)
+        except subprocess.TimeoutExpired:
+            self._on_timeout()
+            self.returncode, rusage = self._reap(None)
+        self.duration = time.monotonic() - self.started_at
+        self.usage = ResourceUsage.from_rusage(rusage, self.duration)
+        if self.usage.cpu_seconds is not None:
+            telemetry.observe("ai_agent_process_cpu_seconds", self.usage.cpu_seconds, mode=self.start_mode)
+        for pipe in (self._process.stdout, self._process.stderr):
+            pipe.close()
+        for name, size in self._bytes_read.items():
+            telemetry.count("ai_agent_output_bytes_total", size, stream=name)
+
 
 class Executor:
     """Executes external commands and scripts."""
 
-    def __init__(self):
-        pass
+    def __init__(self, timeout: Optional[float] = None, head_lines: int = 200, tail_lines: int = 800,
+                 warm_pool: Optional["WarmPool"] = None, limits: Optional[ResourceLimits] = None):
+        """Initializes the Executor.
 
-    def run_command(self, command: list[str], cwd: str = None) -> tuple[int, str, str]:
-        """Runs an external command and returns return code, stdout, and stderr."""
+        Args:
+            timeout: Default wall-clock timeout in seconds for every command (None for no limit)
+            head_lines: Lines kept from the start of each stream by stream_command
+            tail_lines: Lines kept from the end of each stream by stream_command
+            warm_pool: Optional WarmPool forking Python runs from a warm interpreter
+            limits: Default memory/CPU limits for every command (None for no limit)
+        """
+        self.timeout = timeout
+        self.head_lines = head_lines
+        self.tail_lines = tail_lines
+        self.warm_pool = warm_pool
+        self.limits = limits
+
+    def run_command(self, command: list[str], cwd: str = None,
+                    timeout: Optional[float] = None) -> CommandResult:
+        """Runs an external command and returns return code, stdout, and stderr.
+
+        The full output is captured; use stream_command for bounded, live output.
+        A command that exceeds the timeout is killed and its (negative) return
+        code and partial output are returned. The result unpacks as a 3-tuple
+        and carries the command's resource usage as ``.usage``.
+        """
+        process = self.stream_command(command, cwd=cwd, timeout=timeout, bounded=False)
+        process.wait()
+        return CommandResult(process.returncode, process.stdout, process.stderr, process.usage)
+
+    def stream_command(self, command: list[str], cwd: str = None, timeout: Optional[float] = None,
+                       bounded: bool = True, env: Optional[Dict[str, str]] = None,
+                       pass_fds: Sequence[int] = (), limits: Optional[ResourceLimits] = None) -> StreamingProcess:
+        """Starts an external command whose output can be consumed line by line.
+
+        Args:
+            command: The command and its arguments
+            cwd: The working directory to run the command in
+            timeout: Wall-clock timeout in seconds (defaults to the Executor timeout)
+            bounded: Keep only a head and tail of each stream instead of everything
+            env: Extra environment variables, added to the current environment
+            pass_fds: File descriptors the command inherits (e.g. a result pipe)
+            limits: Memory/CPU limits of the command (defaults to the Executor limits)
+
+        Returns:
+            A StreamingProcess to iterate over
+        """
+        timeout = timeout if timeout is not None else self.timeout
+        limits = limits if limits is not None else self.limits
+        head_lines = self.head_lines if bounded else None
         try:
-            process = subprocess.run(
-                command,
-                capture_output=True,
-                text=True,
-                check=False,  # Don't raise exception for non-zero exit codes
-                cwd=cwd
-            )
-            return process.returncode, process.stdout, process.stderr
+            return StreamingProcess(command, cwd=cwd, timeout=timeout, head_lines=head_lines,
+                                    tail_lines=self.tail_lines, env=env, pass_fds=pass_fds, limits=limits)
         except FileNotFoundError:
             print(f"Error: Command not found: {command[0]}")
             # Re-raise or handle as appropriate
             raise
         except Exception as e:
-            print(f"An unexpected error occurred while running command {' '.join(command)}: {e}")
+            command_line = ' '.join(command)
+            if len(command_line) > 200:
+                command_line = f"{command_line[:200]}... ({len(command)} arguments)"
+            print(f"An unexpected error occurred while running command {command_line}: {e}")
             raise
 
-    def run_python_script(self, script_path: str, args: list[str] = None, cwd: str = None) -> tuple[int, str, str]:
+    def run_python_script(self, script_path: str, args: list[str] = None, cwd: str = None,
+                          timeout: Optional[float] = None) -> CommandResult:
         """Runs a specific Python script."""
-        command = [sys.executable, script_path]
-        if args:
-            command.extend(args)
-        return self.run_command(command, cwd=cwd)
+        process = self.stream_python([script_path] + list(args or []), cwd=cwd, timeout=timeout, bounded=False)
+        process.wait()
+        return CommandResult(process.returncode, process.stdout, process.stderr, process.usage)
+
+    def stream_python_script(self, script_path: str, args: list[str] = None, cwd: str = None,
+                             timeout: Optional[float] = None) -> StreamingProcess:
+        """Starts a Python script whose output can be consumed line by line."""
+        return self.stream_python([script_path] + list(args or []), cwd=cwd, timeout=timeout)
+
+    def stream_python(self, args: list[str], cwd: str = None, timeout: Optional[float] = None,
+                      bounded: bool = True, env: Optional[Dict[str, str]] = None,
+                      pass_fds: Sequence[int] = ()) -> StreamingProcess:
+        """Starts the Python interpreter with the given arguments (e.g. ``["-m", "pytest"]``).
+
+        With a warm pool, scripts and ``-m`` modules are forked from a warm
+        interpreter; otherwise (or if that fails) a new interpreter is started.
+        The arguments are the same as for stream_command.
+        """
+        if self.warm_pool is not None:
+            timeout = timeout if timeout is not None else self.timeout
+            try:
+                process = self.warm_pool.stream(args, cwd=cwd, timeout=timeout,
+                                                head_lines=self.head_lines if bounded else None,
+                                                tail_lines=self.tail_lines, env=env, pass_fds=pass_fds,
+                                                limits=self.limits)
+            except OSError as e:
+                print(f"Warning: {e}; starting a new interpreter instead.")
+                process = None
+            if process is not None:
+                return process
+        return self.stream_command([sys.executable] + list(args), cwd=cwd, timeout=timeout,
+                                   bounded=bounded, env=env, pass_fds=pass_fds)
 
-    # TODO: Add methods for specific execution environments if needed 
\ No newline at end of file
+    # TODO: Add methods for specific execution environments if needed
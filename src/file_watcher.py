@@ -0,0 +1,225 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+from .code_analyzer import SKIP_DIRS
+
+# Non-Python files whose changes affect test runs
+CONFIG_FILES = {"pytest.ini", "pyproject.toml", "setup.cfg", "tox.ini"}
+# Directories never watched besides SKIP_DIRS (the agent's own caches)
+IGNORED_DIRS = {".ai_agent"}
+
+# inotify constants (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+# struct inotify_event: wd, mask, cookie, len, then len bytes of NUL-padded name
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def is_relevant(path: str) -> bool:
+    """True for files whose changes should trigger a re-run (sources and test configuration)."""
+    name = os.path.basename(path)
+    if name.startswith((".", "#")):
+        return False  # Editor swap, backup and lock files
+    return name.endswith(".py") or name in CONFIG_FILES
+
+
+def _watched_dirs(root: str) -> Iterator[str]:
+    for dirpath, dirnames, _ in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS and d not in IGNORED_DIRS
+                       and not d.startswith(".") and not d.endswith(".egg-info")]
+        yield dirpath
+
+
+class PollingWatcher:
+    """Detects changed files by comparing (mtime, size) snapshots of the tree."""
+
+    kind = "polling"
+
+    def __init__(self, root: str, interval: float = 0.5):
+        """Takes the initial snapshot.
+
+        Args:
+            root: The directory tree to watch
+            interval: Seconds between two scans
+        """
+        self.root = os.path.abspath(root)
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for dirpath in _watched_dirs(self.root):
+            try:
+                entries = list(os.scandir(dirpath))
+            except OSError:
+                continue
+            for entry in entries:
+                if is_relevant(entry.name) and entry.is_file(follow_symlinks=False):
+                    try:
+                        stat = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    snapshot[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """Returns the files changed, created or deleted since the last call (empty after timeout)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self._scan()
+            changed = {path for path in snapshot.keys() | self._snapshot.keys()
+                       if snapshot.get(path) != self._snapshot.get(path)}
+            self._snapshot = snapshot
+            if changed:
+                return changed
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return set()
+            time.sleep(self.interval if remaining is None else min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Linux inotify watcher over a directory tree, through ctypes (no dependencies).
+
+    Every directory gets a watch, and new directories are added as they
+    appear. Saves are reported on close-after-write and renames, so an
+    editor's write-then-rename save counts once. If the kernel event queue
+    overflows, the root itself is reported so the caller can re-run everything.
+    """
+
+    kind = "inotify"
+
+    def __init__(self, root: str):
+        """Creates the inotify instance and watches every directory under root.
+
+        Raises:
+            OSError: If inotify is unavailable or the watch limit is reached
+        """
+        self.root = os.path.abspath(root)
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1 failed: {os.strerror(errno)}")
+        self._dirs: Dict[int, str] = {}
+        try:
+            for dirpath in _watched_dirs(self.root):
+                self._add_watch(dirpath)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, path: str):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            if errno == 2:  # ENOENT: the directory vanished meanwhile
+                return
+            raise OSError(errno, f"inotify_add_watch({path}) failed: {os.strerror(errno)}")
+        self._dirs[wd] = path
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """Returns the files changed since the last call, blocking up to timeout (None: forever)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            readable, _, _ = select.select([self._fd], [], [], remaining)
+            if not readable:
+                return set()
+            changed = self._read_events()
+            if changed:
+                return changed
+
+    def _read_events(self) -> Set[str]:
+        changed: Set[str] = set()
+        try:
+            data = os.read(self._fd, 1 << 16)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                changed.add(self.root)  # Events were lost
+                continue
+            directory = self._dirs.get(wd)
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and name not in SKIP_DIRS and name not in IGNORED_DIRS \
+                        and not name.startswith("."):
+                    # Files may land in a new directory before its watch exists: report them now
+                    for dirpath in _watched_dirs(path):
+                        try:
+                            self._add_watch(dirpath)
+                        except OSError as e:
+                            print(f"Warning: cannot watch {dirpath}: {e}")
+                        try:
+                            names = os.listdir(dirpath)
+                        except OSError:
+                            continue  # Already removed again (temp dirs, rm -rf build/, checkouts)
+                        changed.update(os.path.join(dirpath, f) for f in names if is_relevant(f))
+                continue
+            if is_relevant(name) and mask & (IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE | IN_CREATE):
+                changed.add(path)
+        return changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def create_watcher(root: str, polling_interval: float = 0.5):
+    """Returns an InotifyWatcher on Linux, falling back to a PollingWatcher elsewhere or on failure."""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}); polling for changes every {polling_interval}s.")
+    return PollingWatcher(root, interval=polling_interval)
+
+
+def debounced_changes(watcher, debounce: float = 0.1, max_delay: float = 2.0) -> Iterator[Set[str]]:
+    """Yields sets of changed files, merging bursts of events (e.g. a save-all) into one set.
+
+    Args:
+        watcher: An InotifyWatcher or PollingWatcher
+        debounce: A set is yielded once no further change arrived for this many seconds
+        max_delay: ... or at the latest this many seconds after its first change
+    """
+    while True:
+        changes = watcher.wait(None)
+        first = time.monotonic()
+        while time.monotonic() - first < max_delay:
+            more = watcher.wait(min(debounce, max_delay - (time.monotonic() - first)))
+            if not more:
+                break
+            changes |= more
+        yield changes
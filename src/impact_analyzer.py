@@ -0,0 +1,241 @@
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Set
+
+from .code_analyzer import CodeAnalyzer
+from .coverage_index import CoverageIndex
+
+
+class ImpactAnalyzer:
+    """Selects the tests affected by a set of changed files.
+
+    Two kinds of dependency data are combined:
+
+    * the project import graph built by CodeAnalyzer (file granularity), and
+    * per-test coverage (which tests executed lines of which file), built
+      by run_test_coverage(contexts=True). It is kept in a CoverageIndex
+      database, or in a JSON map when data_path ends in ".json".
+
+    The tests importing a changed file (directly or transitively) are always
+    selected, since a change to module-level code affects every importer but
+    is recorded by coverage as import time, outside any test. Coverage adds
+    the tests that reach a file without importing it (fixtures, plugins,
+    dynamic imports). Whenever the data cannot be trusted
+    (stale coverage, deleted or non-Python files, conftest changes) select()
+    returns None so the caller runs the full suite.
+    """
+
+    def __init__(self, code_analyzer: Optional[CodeAnalyzer] = None, data_path: Optional[str] = None,
+                 coverage_index: Optional[CoverageIndex] = None):
+        """Initializes the analyzer and loads persisted coverage data if present.
+
+        Args:
+            code_analyzer: CodeAnalyzer used to build the import graph
+            data_path: Optional file where coverage is persisted: a JSON map if
+                it ends in ".json", a CoverageIndex database otherwise
+            coverage_index: Optional CoverageIndex to use instead of data_path
+        """
+        self.code_analyzer = code_analyzer or CodeAnalyzer()
+        self.data_path = data_path
+        if coverage_index is None and data_path and not data_path.endswith(".json"):
+            coverage_index = CoverageIndex(data_path)
+        self.coverage_index = coverage_index
+        self.coverage_map: Dict[str, Set[str]] = {}
+        self.built_at: Optional[float] = coverage_index.built_at if coverage_index else None
+        # Files reported to select() since the coverage run; their edits do not make it stale
+        self.reported: Set[str] = set()
+        if coverage_index is None and data_path and os.path.exists(data_path):
+            self.load()
+
+    def update_coverage(self, coverage_data: dict, root: str, built_at: Optional[float] = None):
+        """Rebuilds the coverage map from a coverage.py JSON report with test contexts.
+
+        Args:
+            coverage_data: The parsed coverage JSON (generated with show_contexts)
+            root: Directory the coverage paths are relative to (pytest's cwd)
+            built_at: Time the coverage run started; files modified afterwards make the data stale
+        """
+        root = os.path.abspath(root)
+        if self.coverage_index is not None:
+            self.coverage_index.rebuild_from_report(coverage_data, root, built_at=built_at)
+            self.built_at = self.coverage_index.built_at
+            self.reported = set()
+            return
+        coverage_map: Dict[str, Set[str]] = {}
+        for path, file_data in coverage_data.get("files", {}).items():
+            tests = coverage_map.setdefault(os.path.normpath(os.path.join(root, path)), set())
+            for contexts in file_data.get("contexts", {}).values():
+                # pytest-cov contexts look like "tests/test_x.py::test_a|run"; "" is import time
+                tests.update(context.split("|")[0] for context in contexts if context)
+        self.coverage_map = coverage_map
+        self.built_at = built_at if built_at is not None else time.time()
+        self.reported = set()
+        if self.data_path:
+            self.save()
+
+    def update_coverage_files(self, data_files: List[str], root: str, built_at: Optional[float] = None):
+        """Rebuilds the coverage index from per-shard coverage.py data files (see CoverageIndex).
+
+        Args:
+            data_files: The coverage data files, recorded with per-test contexts
+            root: Directory relative paths in the data are resolved against
+            built_at: Time the coverage run started; files modified afterwards make the data stale
+        """
+        if self.coverage_index is None:
+            self.coverage_index = CoverageIndex(":memory:")
+        self.coverage_index.rebuild(data_files, built_at=built_at, root=os.path.abspath(root))
+        self.built_at = self.coverage_index.built_at
+        self.reported = set()
+
+    def tests_for_line(self, path: str, lineno: int) -> Optional[List[str]]:
+        """Returns the tests that executed a line, or None without line-level coverage data."""
+        if self.coverage_index is None:
+            return None
+        return self.coverage_index.tests_for_line(os.path.abspath(path), lineno)
+
+    def _measured_files(self) -> List[str]:
+        if self.coverage_index is not None:
+            return self.coverage_index.files()
+        return list(self.coverage_map)
+
+    def _covering_tests(self, path: str) -> Optional[Set[str]]:
+        """Returns the tests that executed a file, or None if coverage did not measure it."""
+        if self.coverage_index is not None:
+            return self.coverage_index.tests_for_file(path)
+        return self.coverage_map.get(path)
+
+    def save(self):
+        """Writes the coverage map to data_path."""
+        if os.path.dirname(self.data_path):
+            os.makedirs(os.path.dirname(self.data_path), exist_ok=True)
+        with open(self.data_path, 'w') as f:
+            json.dump({
+                "built_at": self.built_at,
+                "coverage": {path: sorted(tests) for path, tests in self.coverage_map.items()},
+            }, f)
+
+    def load(self):
+        """Reads the coverage map from data_path, discarding it if unreadable."""
+        try:
+            with open(self.data_path, 'r') as f:
+                data = json.load(f)
+            self.built_at = data["built_at"]
+            self.coverage_map = {path: set(tests) for path, tests in data["coverage"].items()}
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable impact data {self.data_path}: {e}")
+            self.coverage_map, self.built_at = {}, None
+
+    def is_stale(self, changed_files: Iterable[str] = ()) -> bool:
+        """True if a measured file changed since the coverage run without being reported.
+
+        Args:
+            changed_files: Absolute paths of the files known to have changed (in
+                addition to those reported to earlier select() calls)
+        """
+        if self.built_at is None:
+            return True
+        changed = self.reported.union(changed_files)
+        for path in self._measured_files():
+            if path in changed:
+                continue
+            try:
+                if os.path.getmtime(path) > self.built_at:
+                    return True
+            except OSError:
+                return True  # A measured file disappeared
+        return False
+
+    def select(self, changed_files: Iterable[str], root: str) -> Optional[List[str]]:
+        """Computes the tests affected by the changed files.
+
+        Args:
+            changed_files: Changed file paths (absolute or relative to root)
+            root: The project root; returned paths are relative to it
+
+        Returns:
+            Sorted pytest arguments (test files and node IDs) to run, an empty
+            list if no test is affected, or None if the full suite must run
+        """
+        root = os.path.abspath(root)
+        changed = {os.path.normpath(os.path.join(root, path)) for path in changed_files}
+
+        use_coverage = self.built_at is not None and bool(self._measured_files())
+        if use_coverage and self.is_stale(changed):
+            print("Impact data is stale; running the full suite.")
+            return None
+        self.reported.update(changed)
+
+        graph = self._import_graph(root)
+        dependents: Dict[str, Set[str]] = {}
+        for source, targets in graph.items():
+            for target in targets:
+                dependents.setdefault(target, set()).add(source)
+
+        selected_files: Set[str] = set()
+        selected_nodeids: Set[str] = set()
+        for path in changed:
+            if not path.endswith(".py") or os.path.basename(path) == "conftest.py" or path not in graph:
+                print(f"Cannot map change to tests: {path}; running the full suite.")
+                return None
+            if self._is_test_file(path):
+                selected_files.add(path)
+                continue
+            # Coverage only records lines run inside a test: module-level code (constants, decorators,
+            # class bodies) runs at import time, so the importing tests are always affected too
+            selected_files.update(p for p in self._reverse_closure(path, dependents) if self._is_test_file(p))
+            if use_coverage:
+                selected_nodeids.update(self._covering_tests(path) or ())
+
+        file_args = {os.path.relpath(path, root) for path in selected_files}
+        node_args = {nodeid for nodeid in selected_nodeids if nodeid.split("::")[0] not in file_args}
+        return sorted(file_args | node_args)
+
+    def affects(self, changed_files: Iterable[str], file_path: str, root: str) -> bool:
+        """True if file_path is one of the changed files or imports one of them, directly or transitively.
+
+        Args:
+            changed_files: Changed file paths (absolute or relative to root)
+            file_path: The file whose behaviour may depend on the changes (e.g. a script being debugged)
+            root: The project root
+        """
+        root = os.path.abspath(root)
+        changed = {os.path.normpath(os.path.join(root, path)) for path in changed_files}
+        file_path = os.path.normpath(os.path.join(root, file_path))
+        if file_path in changed:
+            return True
+        graph = self._import_graph(root)
+        seen: Set[str] = {file_path}
+        stack = [file_path]
+        while stack:
+            for dependency in graph.get(stack.pop(), ()):
+                if dependency in changed:
+                    return True
+                if dependency not in seen:
+                    seen.add(dependency)
+                    stack.append(dependency)
+        return False
+
+    def _import_graph(self, root: str) -> Dict[str, Set[str]]:
+        """Returns the import graph from the analyzer's incremental project index.
+
+        Only files whose (mtime, size) changed since the previous call are
+        re-parsed, which keeps repeated selections (watch mode) cheap.
+        """
+        return self.code_analyzer.analyze_project(root).import_graph()
+
+    def _reverse_closure(self, path: str, dependents: Dict[str, Set[str]]) -> Set[str]:
+        """Returns every file that imports ``path`` directly or transitively."""
+        seen: Set[str] = set()
+        stack = [path]
+        while stack:
+            for dependent in dependents.get(stack.pop(), ()):
+                if dependent not in seen:
+                    seen.add(dependent)
+                    stack.append(dependent)
+        return seen
+
+    def _is_test_file(self, path: str) -> bool:
+        """True for files pytest collects by default (test_*.py / *_test.py)."""
+        name = os.path.basename(path)
+        return name.startswith("test_") or name.endswith("_test.py")
@@ -0,0 +1,56 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Optional
+
+
+class ResponseCache:
+    """Persistent, content-addressed cache of LLM responses.
+
+    The key is a SHA-256 over everything that determines the answer (model
+    name, request kind, error text, code context), so identical requests
+    are answered from disk across runs and processes. Each response lives
+    in its own small JSON file, written atomically.
+    """
+
+    def __init__(self, cache_dir: str):
+        """Initializes the cache; the directory is created when the first response is stored.
+
+        Args:
+            cache_dir: Directory holding the cached responses
+        """
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts: Optional[str]) -> str:
+        """Returns the content address of a request made of the given parts."""
+        return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached response for a key, or None."""
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                response = json.load(f)["response"]
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return response
+
+    def put(self, key: str, response: str):
+        """Stores a response under a key."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"response": response}, f)
+        os.replace(tmp_path, path)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
@@ -1,10 +1,112 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Optional
+
+from . import telemetry
+from .context_builder import DEFAULT_MAX_TOKENS, trim_to_tokens
+from .llm_cache import ResponseCache
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+
+class LLMError(Exception):
+    """Raised when a request to the LLM API fails.
+
+    ``transient`` is True for failures worth retrying (network errors,
+    timeouts, rate limiting and server errors).
+    """
+
+    def __init__(self, message: str, transient: bool = False):
+        super().__init__(message)
+        self.transient = transient
+
+
+class RateLimiter:
+    """Spaces out calls so that at most ``rate`` start per second (thread-safe)."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until the caller may start its request."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class RetryBudget:
+    """A shared, thread-safe allowance of retries for a batch of requests.
+
+    A global budget (rather than a per-request retry count) stops a failing
+    API from multiplying the load of a large batch.
+    """
+
+    def __init__(self, retries: int):
+        self.remaining = retries
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        """Consumes one retry; returns False once the budget is exhausted."""
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+    def call(self, function, *args):
+        """Calls function, retrying transient LLMErrors with backoff while the budget lasts.
+
+        Raises:
+            LLMError: The last error, once it is not transient or the budget is exhausted
+        """
+        attempt = 0
+        while True:
+            try:
+                return function(*args)
+            except LLMError as e:
+                if not (e.transient and self.take()):
+                    raise
+                time.sleep(min(0.5 * 2 ** attempt, 8.0))
+                attempt += 1
+
+
 class LLMInterface:
-    """Placeholder for interacting with a Large Language Model."""
+    """Interacts with a Large Language Model through an OpenAI-compatible chat API.
+
+    Without an API key the interface stays a placeholder that returns canned
+    answers, so the rest of the agent keeps working offline.
+    """
+
+    def __init__(self, api_key: str = None, model_name: str = None, base_url: str = None,
+                 timeout: float = 60.0, cache: Optional[ResponseCache] = None,
+                 requests_per_second: Optional[float] = None, context_tokens: int = DEFAULT_MAX_TOKENS):
+        """Initializes the LLM interface (e.g., sets up API key, model).
 
-    def __init__(self, api_key: str = None, model_name: str = None):
-        """Initializes the LLM interface (e.g., sets up API key, model)."""
+        Args:
+            api_key: API key; without it no requests are made
+            model_name: Model to use
+            base_url: Base URL of an OpenAI-compatible API (e.g. a local server)
+            timeout: Timeout of a single HTTP request in seconds
+            cache: Optional ResponseCache answering repeated requests from disk
+            requests_per_second: Optional client-side rate limit shared by all threads
+            context_tokens: Estimated token budget of the code and of the error output in
+                a prompt; longer inputs are cut (code keeps its head, errors their tail)
+        """
         self.api_key = api_key
         self.model_name = model_name or "default-model"
+        self.base_url = (base_url or DEFAULT_BASE_URL).rstrip("/")
+        self.timeout = timeout
+        self.cache = cache
+        self.rate_limiter = RateLimiter(requests_per_second) if requests_per_second else None
+        self.context_tokens = context_tokens
         if not api_key:
             print("Warning: LLM API key not provided. Functionality will be limited.")
         print(f"LLM Interface initialized for model: {self.model_name}")
@@ -19,16 +121,32 @@ class LLMInterface:
 
         Returns:
             A string containing the LLM's analysis or suggested fix.
+
+        Raises:
+            LLMError: If the API request fails
         """
+        error_output = trim_to_tokens(error_output, self.context_tokens, keep="tail")
+        if code_context:
+            code_context = trim_to_tokens(code_context, self.context_tokens)
         print("--- LLM Analysis Request ---")
         print(f"File: {file_path}")
         print(f"Error Output:\n{error_output}")
         if code_context:
             print(f"Code Context:\n{code_context}")
         print("---------------------------")
-        # TODO: Implement actual API call to the LLM
-        print("(LLM interaction not implemented yet)")
-        return "Placeholder LLM analysis: Check the error message and stack trace."
+        if not self.api_key:
+            print("(LLM interaction not implemented yet)")
+            return "Placeholder LLM analysis: Check the error message and stack trace."
+
+        prompt = f"File: {file_path}\n\nError:\n{error_output}\n"
+        if code_context:
+            prompt += f"\nRelevant code:\n{code_context}\n"
+        return self._cached_completion(
+            "analyze_error",
+            "You are a senior Python engineer. Explain the root cause of the error and suggest a minimal fix.",
+            prompt,
+            cache_parts=(error_output, code_context),
+        )
 
     def suggest_tests(self, file_path: str, code_content: str = None) -> str:
         """Asks the LLM to suggest unit tests for the given code.
@@ -39,15 +157,88 @@ class LLMInterface:
 
         Returns:
             A string containing suggested test cases (e.g., in Python/pytest format).
+
+        Raises:
+            LLMError: If the API request fails
         """
+        if code_content:
+            code_content = trim_to_tokens(code_content, self.context_tokens)
         print("--- LLM Test Generation Request ---")
         print(f"File: {file_path}")
         if code_content:
             print("Code Content provided (snippet shown):")
             print(code_content[:200] + ("..." if len(code_content) > 200 else ""))
         print("-------------------------------")
-        # TODO: Implement actual API call to the LLM
-        print("(LLM interaction not implemented yet)")
-        return "# Placeholder LLM suggestion: Add tests for edge cases and common inputs."
+        if not self.api_key:
+            print("(LLM interaction not implemented yet)")
+            return "# Placeholder LLM suggestion: Add tests for edge cases and common inputs."
+
+        return self._cached_completion(
+            "suggest_tests",
+            "You write pytest unit tests. Reply with a single runnable Python test module and nothing else.",
+            f"Write pytest tests for {file_path}:\n\n{code_content or ''}",
+            cache_parts=(file_path, code_content),
+        )
+
+    def _cached_completion(self, kind: str, system: str, prompt: str, cache_parts: tuple) -> str:
+        """Returns the completion for a prompt, answering from the cache when possible."""
+        key = ResponseCache.make_key(self.model_name, kind, *cache_parts) if self.cache else None
+        if key:
+            cached = self.cache.get(key)
+            telemetry.count("ai_agent_llm_cache_total", result="miss" if cached is None else "hit")
+            if cached is not None:
+                return cached
+        response = self._complete(system, prompt, kind)
+        if key:
+            self.cache.put(key, response)
+        return response
+
+    def _complete(self, system: str, prompt: str, kind: str = "chat") -> str:
+        """Sends one chat completion request and returns the reply text."""
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+        started = time.monotonic()
+        try:
+            with telemetry.span("llm.request", kind=kind, model=self.model_name) as stage:
+                data = self._request(system, prompt)
+                usage = data.get("usage") if isinstance(data, dict) else None
+                if isinstance(usage, dict):
+                    for direction in ("prompt", "completion"):
+                        tokens = usage.get(f"{direction}_tokens") or 0
+                        stage.set_attribute(f"{direction}_tokens", tokens)
+                        telemetry.count("ai_agent_llm_tokens_total", tokens, kind=kind, direction=direction)
+        except LLMError:
+            telemetry.count("ai_agent_llm_requests_total", kind=kind, status="error")
+            raise
+        finally:
+            telemetry.observe("ai_agent_llm_latency_seconds", time.monotonic() - started, kind=kind)
+        telemetry.count("ai_agent_llm_requests_total", kind=kind, status="ok")
+        try:
+            return data["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            raise LLMError("LLM API response has no message content")
+
+    def _request(self, system: str, prompt: str):
+        """Posts a chat completion request and returns the decoded JSON response."""
+        body = json.dumps({
+            "model": self.model_name,
+            "messages": [{"role": "system", "content": system}, {"role": "user", "content": prompt}],
+            "temperature": 0,
+        }).encode("utf-8")
+        request = urllib.request.Request(
+            f"{self.base_url}/chat/completions",
+            data=body,
+            headers={"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                data = json.load(response)
+        except urllib.error.HTTPError as e:
+            raise LLMError(f"LLM API returned HTTP {e.code}", transient=e.code == 429 or e.code >= 500)
+        except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+            raise LLMError(f"LLM API request failed: {e}", transient=True)
+        except ValueError as e:
+            raise LLMError(f"LLM API returned invalid JSON: {e}")
+        return data
 
-    # Add more methods as needed (e.g., code generation, refactoring suggestions) 
\ No newline at end of file
+    # Add more methods as needed (e.g., code generation, refactoring suggestions)
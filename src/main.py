@@ -2,12 +2,20 @@ import argparse
 import os
 from dotenv import load_dotenv
 
+from . import telemetry
 from .agent import Agent
+from .ast_cache import AstCache, default_cache_dir
 from .code_analyzer import CodeAnalyzer
 from .debugger import Debugger
-from .executor import Executor
-from .llm_interface import LLMInterface # Placeholder
+from .distributed import RUN_TIMEOUT_SECONDS, run_worker
+from .executor import Executor, ResourceLimits
+from .impact_analyzer import ImpactAnalyzer
+from .llm_cache import ResponseCache
+from .llm_interface import LLMInterface
+from .test_generation import BatchTestGenerator
+from .test_history import TestHistory
 from .test_runner import TestRunner
+from .warm_pool import WarmPool
 
 def main():
     """Main function to initialize components and run the agent."""
@@ -17,27 +25,85 @@ def main():
     # TODO: Implement more robust config loading (e.g., YAML file, command line args)
     config = {
         "llm_api_key": os.getenv("OPENAI_API_KEY"), # Example: Load API key
-        "llm_model_name": os.getenv("LLM_MODEL_NAME", "gpt-4o-mini") # Example model
+        "llm_model_name": os.getenv("LLM_MODEL_NAME", "gpt-4o-mini"), # Example model
+        "llm_base_url": os.getenv("LLM_BASE_URL"), # Any OpenAI-compatible endpoint
+        "llm_requests_per_second": float(os.getenv("LLM_REQUESTS_PER_SECOND", "5")),
+        "llm_context_tokens": int(os.getenv("LLM_CONTEXT_TOKENS", "3000")), # Code/error budget per prompt
     }
     print("Configuration loaded.")
 
     # --- Argument Parsing (Example) ---
     parser = argparse.ArgumentParser(description="AI Agent for Code Debugging and Testing.")
     parser.add_argument("--debug", metavar="FILE_PATH", help="Run the debugger on the specified Python file.")
+    parser.add_argument("--analyze", metavar="ROOT", help="Statically analyze every Python file under ROOT in parallel (symbols, imports, complexity, syntax errors).")
+    parser.add_argument("--generate-tests", metavar="PATH", nargs="+", help="Generate tests with the LLM for these modules (directories are searched), keeping only tests that pass.")
+    parser.add_argument("--generated-dir", default=os.path.join("tests", "generated"), help="With --generate-tests, where accepted test files (and the source hashes of their modules) are stored.")
     parser.add_argument("--test", metavar="TARGET", nargs='?', const=".", default=None, help="Run tests on the specified target (file or directory, defaults to current directory if flag is present with no value).")
+    parser.add_argument("--workers", type=int, default=1, help="Number of parallel pytest processes for --test (0 uses one per CPU core).")
+    parser.add_argument("--coordinator", metavar="ADDRESS", help="With --test, listen on a Unix socket path or host:port and distribute test shards to --worker processes.")
+    parser.add_argument("--local-workers", type=int, default=0, help="With --test, start this many local worker processes for a distributed run (implies a coordinator).")
+    parser.add_argument("--distributed-timeout", type=float, default=RUN_TIMEOUT_SECONDS, help="With --coordinator or --local-workers, give up on shards not finished after this many seconds.")
+    parser.add_argument("--worker", metavar="ADDRESS", help="Run as a test worker: connect to the coordinator at ADDRESS and run the shards it hands out.")
+    parser.add_argument("--complexity-threshold", type=int, default=10, help="With --analyze, report functions whose cyclomatic complexity exceeds this.")
+    parser.add_argument("--fail-fast", action="store_true", help="Stop --test at the first failing test (across all workers).")
+    parser.add_argument("--history-db", default=os.path.join(".ai_agent", "test_history.db"), help="SQLite file storing per-test durations and outcomes used to order tests (empty string disables).")
+    parser.add_argument("--changed", metavar="FILE", nargs="+", help="With --test, run only the tests affected by these changed files.")
+    parser.add_argument("--coverage", action="store_true", help="With --test, run with per-test coverage (sharded across --workers) and refresh the impact data used by --changed.")
+    parser.add_argument("--impact-data", default=os.path.join(".ai_agent", "coverage_index.db"), help="SQLite coverage index (or a .json coverage map) storing which tests cover which lines, used by --changed.")
+    parser.add_argument("--watch", action="store_true", help="With --test or --debug, keep running and re-run the affected tests (or the debug target) whenever files change.")
+    parser.add_argument("--debounce", type=float, default=0.1, help="With --watch, seconds without further changes before a burst of saves is handled.")
+    parser.add_argument("--warm", action="store_true", help="Fork scripts and pytest runs from a warm interpreter that already imported pytest (restarted when its modules change).")
+    parser.add_argument("--warm-preload", metavar="MODULE", nargs="+", default=[], help="With --warm, extra modules the warm interpreter imports once (e.g. heavy dependencies).")
+    parser.add_argument("--timeout", type=float, default=None, help="Wall-clock timeout in seconds for every script or pytest process (killed with its children).")
+    parser.add_argument("--memory-limit", type=int, metavar="MB", help="Cap the address space of every script or pytest process (setrlimit RLIMIT_AS).")
+    parser.add_argument("--cpu-limit", type=int, metavar="SECONDS", help="Cap the CPU time of every script or pytest process (setrlimit RLIMIT_CPU).")
+    parser.add_argument("--jobs-file", metavar="JSONL", help="Run the agent as a job service over the jobs in this JSONL file.")
+    parser.add_argument("--results-file", metavar="JSONL", help="Append the structured result of each --jobs-file job to this file (default: stdout; job output goes to stderr).")
+    parser.add_argument("--serve", metavar="ADDRESS", help="Accept JSONL jobs on a Unix socket path (owner-only; TCP is refused) and reply with JSON results.")
+    parser.add_argument("--metrics-file", metavar="PATH", help="Collect metrics and write them to this file in the Prometheus text format.")
+    parser.add_argument("--trace-file", metavar="PATH", help="Collect per-stage trace spans and write them to this OTLP/JSON file.")
+    parser.add_argument("--max-queued-jobs", type=int, default=100, help="Maximum number of queued jobs before submitters are blocked.")
     # Add other arguments as needed (e.g., --config-file)
     args = parser.parse_args()
+    if args.watch and not (args.debug or args.test is not None):
+        parser.error("--watch requires --test or --debug")
+    config["test_workers"] = args.workers
+    config["test_fail_fast"] = args.fail_fast
+    config["test_coordinator"] = args.coordinator
+    config["test_local_workers"] = args.local_workers
+    config["test_distributed_timeout"] = args.distributed_timeout
+    config["max_queued_jobs"] = args.max_queued_jobs
+
+    # Telemetry is off unless an export file is requested (spans and counters are no-ops then)
+    if args.metrics_file or args.trace_file:
+        telemetry.enable(metrics_path=args.metrics_file, trace_path=args.trace_file,
+                         export_interval=10.0 if args.serve else None)
 
     # --- Component Initialization ---
     # Initialize components needed by the agent
-    # Note: LLMInterface is currently a placeholder
-    llm_interface = LLMInterface(api_key=config.get("llm_api_key"), model_name=config.get("llm_model_name"))
-    code_analyzer = CodeAnalyzer()
-    executor = Executor()
+    llm_interface = LLMInterface(
+        api_key=config.get("llm_api_key"),
+        model_name=config.get("llm_model_name"),
+        base_url=config.get("llm_base_url"),
+        cache=ResponseCache(os.path.join(".ai_agent", "llm_cache")),
+        requests_per_second=config.get("llm_requests_per_second"),
+        context_tokens=config.get("llm_context_tokens"),
+    )
+    code_analyzer = CodeAnalyzer(AstCache(cache_dir=default_cache_dir()))
+    # Watch mode always keeps a warm interpreter: re-runs fork from it instead of starting Python
+    warm_pool = WarmPool(preload=args.warm_preload) if args.warm or args.watch else None
+    limits = ResourceLimits(memory_mb=args.memory_limit, cpu_seconds=args.cpu_limit)
+    executor = Executor(timeout=args.timeout, warm_pool=warm_pool, limits=limits or None)
     # Inject dependencies
-    # TODO: Inject llm_interface into Debugger/TestRunner when implemented
+    # TODO: Inject llm_interface into Debugger when it analyzes errors
     debugger = Debugger(executor=executor, analyzer=code_analyzer)
-    test_runner = TestRunner(executor=executor)
+    # State files under .ai_agent/ are only set up for the modes using them (and created on first write)
+    runs_tests = args.test is not None or args.worker or args.jobs_file or args.serve
+    history = TestHistory(args.history_db) if args.history_db and runs_tests else None
+    uses_impact = args.changed or args.coverage or args.watch or args.jobs_file or args.serve
+    impact = ImpactAnalyzer(code_analyzer, data_path=args.impact_data) if uses_impact else None
+    test_runner = TestRunner(executor=executor, llm=llm_interface, code_analyzer=code_analyzer,
+                             history=history, impact=impact)
 
     # --- Agent Initialization ---
     agent = Agent(
@@ -47,10 +113,41 @@ def main():
     )
 
     # --- Task Execution based on Args ---
-    if args.debug:
+    if args.watch and (args.debug or args.test is not None):
+        agent.watch(target=args.test, debug_file=args.debug, debounce=args.debounce)
+    elif args.debug:
         agent.debug_code(args.debug)
+    elif args.worker:
+        shards = run_worker(args.worker, test_runner)
+        print(f"Worker finished after {shards} shards.")
+    elif args.analyze:
+        workers = args.workers if args.workers > 0 else None
+        index = code_analyzer.analyze_project(args.analyze, workers=workers,
+                                              index_path=os.path.join(".ai_agent", "project_index.json"))
+        stats = index.stats
+        print(f"Analyzed {stats['files']} files in {stats['seconds']:.2f}s "
+              f"({stats['parsed']} parsed, {stats['reused']} unchanged)")
+        for path, error in index.syntax_errors().items():
+            print(f"Syntax error: {path}:{error['lineno']}: {error['message']}")
+        for path, qualname, score in index.complex_functions(args.complexity_threshold):
+            print(f"Complexity {score}: {path}:{qualname}")
+    elif args.generate_tests:
+        modules = []
+        for path in args.generate_tests:
+            found = code_analyzer.find_python_files(path) if os.path.isdir(path) else [path]
+            modules.extend(module for module in found
+                           if not os.path.basename(module).startswith("test_")
+                           and os.path.basename(module) not in ("conftest.py", "__init__.py"))
+        generator = BatchTestGenerator(test_runner, output_dir=args.generated_dir,
+                                       validation_workers=args.workers if args.workers > 1 else None)
+        generator.generate(modules)
+    elif args.test is not None and args.coverage:
+        coverage = test_runner.run_test_coverage(args.test, contexts=True, source=".", workers=args.workers)
+        print(coverage.get("error") or f"Impact data refreshed: {args.impact_data}")
     elif args.test is not None: # Check if --test flag was used (even without a value)
-        agent.run_tests(args.test)
+        agent.run_tests(args.test, changed_files=args.changed)
+    elif args.jobs_file or args.serve:
+        agent.run(jobs_file=args.jobs_file, serve_address=args.serve, results_file=args.results_file)
     else:
         # Default behavior if no specific task is given
         print("No specific task provided via arguments. Starting default agent run...")
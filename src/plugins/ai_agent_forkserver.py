@@ -0,0 +1,291 @@
+"""Fork server keeping a warm interpreter for the AI agent's Python runs.
+
+Started by WarmPool as ``python -m ai_agent_forkserver SOCKET [MODULE ...]``
+in the project directory (this directory is put on PYTHONPATH). It imports
+pytest, the result streaming plugin and the given modules once, then forks
+a child per request, so each run skips interpreter startup and those
+imports. Like the pytest plugin, this module must not import anything from
+the agent package.
+
+Protocol, one Unix socket connection per run:
+    client -> server: 8-byte big-endian length sent together with the
+        stdout and stderr pipe write ends (plus any extra descriptors) as
+        SCM_RIGHTS, followed by a JSON request:
+        {"argv": [SCRIPT, ARG...] or ["-m", MODULE, ARG...],
+         "cwd": DIR, "env": {NAME: VALUE}, "fds": [FD...],
+         "limits": {"memory_mb": N, "cpu_seconds": N}}  (limits optional)
+        where "fds" are the descriptor numbers the extra descriptors get in
+        the child (like subprocess' pass_fds).
+    server -> client: {"pid": N} once forked, then once reaped
+        {"returncode": N, "rusage": {"user_seconds": S, "system_seconds": S, "max_rss_kb": N}}.
+
+The server exits once its stdin is closed and all running children have
+been reaped. On start it prints one JSON line to stdout:
+    {"ready": true, "pid": N, "modules": {FILE: MTIME_NS}}
+listing the files of every loaded module, so the client can tell when the
+warm interpreter has gone stale.
+"""
+import array
+import atexit
+import importlib
+import json
+import os
+import resource
+import runpy
+import select
+import signal
+import socket
+import struct
+import sys
+import threading
+import traceback
+
+HEADER = struct.Struct("!Q")
+MAX_FDS = 16
+
+
+def loaded_module_files() -> dict:
+    """Returns {file: mtime_ns} for every loaded module backed by a file."""
+    files = {}
+    for module in list(sys.modules.values()):
+        path = getattr(module, "__file__", None)
+        if not path:
+            continue
+        try:
+            files[os.path.abspath(path)] = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+    return files
+
+
+def receive_request(conn: socket.socket):
+    """Reads one request and the descriptors sent with it."""
+    fds = array.array("i")
+    data, ancdata, _, _ = conn.recvmsg(HEADER.size, socket.CMSG_SPACE(MAX_FDS * fds.itemsize))
+    for level, kind, payload in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(payload[:len(payload) - (len(payload) % fds.itemsize)])
+    while len(data) < HEADER.size:
+        chunk = conn.recv(HEADER.size - len(data))
+        if not chunk:
+            raise EOFError("Connection closed while reading the request header")
+        data += chunk
+    (length,) = HEADER.unpack(data)
+    body = b""
+    while len(body) < length:
+        chunk = conn.recv(min(65536, length - len(body)))
+        if not chunk:
+            raise EOFError("Connection closed while reading the request")
+        body += chunk
+    return json.loads(body.decode("utf-8")), list(fds)
+
+
+def exit_code(status: int) -> int:
+    """Converts a waitpid status into a subprocess-style return code."""
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def rusage_dict(rusage) -> dict:
+    """Converts an os.wait4 rusage into the figures reported to the client."""
+    max_rss_kb = rusage.ru_maxrss // 1024 if sys.platform == "darwin" else rusage.ru_maxrss
+    return {"user_seconds": rusage.ru_utime, "system_seconds": rusage.ru_stime, "max_rss_kb": max_rss_kb}
+
+
+def apply_limits(limits: dict):
+    """Sets the requested memory (address space) and CPU time limits on this process."""
+    if limits.get("memory_mb") is not None:
+        memory = int(limits["memory_mb"]) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+    if limits.get("cpu_seconds") is not None:
+        cpu = int(limits["cpu_seconds"])
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+
+
+def finish_child():
+    """Shuts the child down like a normal interpreter exit before os._exit skips it.
+
+    As in Py_FinalizeEx: wait for non-daemon threads, run atexit handlers,
+    then flush the standard streams.
+    """
+    try:
+        threading._shutdown()
+        atexit._run_exitfuncs()
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+
+def run_child(request: dict, fds: list) -> int:
+    """Runs the requested script or module in the forked child and returns its exit code."""
+    os.setsid()  # Own process group, so the client can kill the run with everything it starts
+    if request.get("limits"):
+        apply_limits(request["limits"])
+    # Move the received descriptors out of the way before placing them at their target numbers
+    high = [os.dup(fd) for fd in fds]
+    for fd in fds:
+        os.close(fd)
+    targets = [1, 2] + list(request.get("fds", []))
+    for fd, target in zip(high, targets):
+        os.dup2(fd, target)
+    for fd in high:
+        if fd not in targets:
+            os.close(fd)
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+
+    os.chdir(request.get("cwd") or os.getcwd())
+    os.environ.update(request.get("env") or {})
+    importlib.invalidate_caches()  # Files may have been added since the server started
+    argv = request["argv"]
+    try:
+        if argv[0] == "-m":
+            sys.argv = [argv[1]] + argv[2:]
+            sys.path[0] = os.getcwd()
+            runpy.run_module(argv[1], run_name="__main__", alter_sys=True)
+        else:
+            sys.argv = list(argv)
+            sys.path[0] = os.path.dirname(os.path.abspath(argv[0]))
+            runpy.run_path(argv[0], run_name="__main__")
+        return 0
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    except BaseException:
+        traceback.print_exc()
+        return 1
+
+
+def pytest_modules() -> list:
+    """Returns pytest, its built-in plugins and the installed plugins, which pytest imports lazily."""
+    names = ["pytest", "ai_agent_stream"]
+    try:
+        from _pytest.config import default_plugins
+        names += [f"_pytest.{name}" for name in default_plugins]
+    except ImportError:
+        pass
+    try:
+        import importlib.metadata
+        entry_points = importlib.metadata.entry_points()
+        if hasattr(entry_points, "select"):
+            plugins = entry_points.select(group="pytest11")
+        else:
+            plugins = entry_points.get("pytest11", [])
+        names += [entry_point.value.split(":")[0] for entry_point in plugins]
+    except Exception:
+        pass
+    return names
+
+
+def serve(socket_path: str, preload: list):
+    for name in pytest_modules() + preload:
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"ai_agent_forkserver: could not preload {name}: {e}", file=sys.stderr)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(64)
+    print(json.dumps({"ready": True, "pid": os.getpid(), "modules": loaded_module_files()}), flush=True)
+
+    # Exiting children wake up select() through SIGCHLD, so exit codes are reported without delay
+    wakeup_r, wakeup_w = os.pipe()
+    os.set_blocking(wakeup_r, False)
+    os.set_blocking(wakeup_w, False)
+    signal.set_wakeup_fd(wakeup_w)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+    children = {}  # pid -> client connection
+    accepting = True
+    try:
+        while accepting or children:
+            watched = [wakeup_r] + list(children.values()) + ([listener, sys.stdin] if accepting else [])
+            readable, _, _ = select.select(watched, [], [], 1.0)
+            for ready in readable:
+                if ready is wakeup_r:
+                    try:
+                        os.read(wakeup_r, 4096)
+                    except BlockingIOError:
+                        pass
+                elif ready is sys.stdin:
+                    if not os.read(sys.stdin.fileno(), 4096):
+                        accepting = False  # The client is gone or retired us: finish running children
+                        listener.close()
+                elif ready is listener:
+                    if not accepting:
+                        continue
+                    conn, _ = listener.accept()
+                    try:
+                        request, fds = receive_request(conn)
+                    except (OSError, ValueError, EOFError) as e:
+                        print(f"ai_agent_forkserver: bad request: {e}", file=sys.stderr)
+                        conn.close()
+                        continue
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+                    pid = os.fork()
+                    if pid == 0:
+                        code = 1
+                        try:
+                            signal.set_wakeup_fd(-1)
+                            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                            os.close(wakeup_r)
+                            os.close(wakeup_w)
+                            listener.close()
+                            conn.close()
+                            for other in children.values():
+                                other.close()
+                            code = run_child(request, fds)
+                        finally:
+                            try:
+                                finish_child()
+                            finally:
+                                os._exit(code)
+                    for fd in fds:
+                        os.close(fd)  # Only the child may hold the pipes, or the client never sees EOF
+                    children[pid] = conn
+                    conn.sendall(json.dumps({"pid": pid}).encode("utf-8") + b"\n")
+                else:
+                    # A client connection became readable: the client went away, stop its run
+                    if not ready.recv(1):
+                        for pid, conn in children.items():
+                            if conn is ready:
+                                try:
+                                    os.killpg(pid, signal.SIGKILL)
+                                except OSError:
+                                    pass
+            while children:
+                pid, status, rusage = os.wait4(-1, os.WNOHANG)
+                if pid == 0:
+                    break
+                conn = children.pop(pid, None)
+                if conn is not None:
+                    message = {"returncode": exit_code(status), "rusage": rusage_dict(rusage)}
+                    try:
+                        conn.sendall(json.dumps(message).encode("utf-8") + b"\n")
+                    except OSError:
+                        pass
+                    conn.close()
+    finally:
+        for pid in children:
+            try:
+                os.killpg(pid, signal.SIGKILL)
+            except OSError:
+                pass
+        if accepting:
+            listener.close()
+        try:
+            os.unlink(socket_path)
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    serve(sys.argv[1], sys.argv[2:])
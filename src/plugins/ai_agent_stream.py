@@ -0,0 +1,121 @@
+"""pytest plugin streaming one JSON line per finished test to the AI agent.
+
+Loaded by TestRunner with ``-p ai_agent_stream`` (this directory is put on
+PYTHONPATH). Records are written to the inherited file descriptor named by
+AI_AGENT_RESULT_FD, or appended to the file named by AI_AGENT_RESULT_PATH.
+This module must not import anything from the agent package: it runs
+inside the pytest process of the project under test.
+
+Record types (one JSON object per line):
+    {"type": "collection", "collected": N}
+    {"type": "collect_error", "nodeid": ..., "longrepr": ...}
+    {"type": "test", "nodeid": ..., "outcome": ..., "setup": {...}, "call": {...}, "teardown": {...},
+     "resources": {"user_seconds": S, "system_seconds": S, "max_rss_kb": N, "rss_growth_kb": N}}
+    {"type": "session", "exitcode": N, "duration": seconds}
+
+"resources" are getrusage() deltas of the pytest process over the test
+(setup to teardown). Peak RSS is a high-water mark, so "rss_growth_kb" is
+how far the test raised it (0 if it stayed below an earlier peak).
+"""
+import json
+import os
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: no per-test resource figures
+    resource = None
+
+FD_ENV = "AI_AGENT_RESULT_FD"
+PATH_ENV = "AI_AGENT_RESULT_PATH"
+MAX_CAPTURE_ENV = "AI_AGENT_MAX_CAPTURE"
+
+
+class ResultStreamPlugin:
+    def __init__(self, config, stream, max_capture: int):
+        self.config = config
+        self.stream = stream
+        self.max_capture = max_capture
+        self.started_at = time.time()
+        self.pending = {}
+        self.usage_at_start = {}
+
+    def pytest_runtest_logstart(self, nodeid, location):
+        if resource is not None:
+            self.usage_at_start[nodeid] = resource.getrusage(resource.RUSAGE_SELF)
+
+    def emit(self, record: dict):
+        self.stream.write(json.dumps(record) + "\n")
+        self.stream.flush()
+
+    def pytest_collection_finish(self, session):
+        self.emit({"type": "collection", "collected": len(session.items)})
+
+    def pytest_collectreport(self, report):
+        if report.failed:
+            self.emit({"type": "collect_error", "nodeid": report.nodeid,
+                       "longrepr": self._trim(str(report.longrepr))})
+
+    def pytest_runtest_logreport(self, report):
+        test = self.pending.setdefault(report.nodeid, {"type": "test", "nodeid": report.nodeid, "outcome": "passed"})
+        stage = {"duration": report.duration, "outcome": report.outcome}
+        crash = getattr(report.longrepr, "reprcrash", None)
+        if crash is not None:
+            stage["crash"] = {"path": crash.path, "lineno": crash.lineno, "message": crash.message}
+        if report.failed or report.skipped:
+            stage["longrepr"] = self._trim(report.longreprtext)
+        for key, text in (("stdout", report.capstdout), ("stderr", report.capstderr), ("log", report.caplog)):
+            if text and (report.when == "call" or report.failed):
+                stage[key] = self._trim(text)
+        test[report.when] = stage
+
+        # The overall outcome can differ from the stage outcome (error, xfailed, ...)
+        category = self.config.hook.pytest_report_teststatus(report=report, config=self.config)[0]
+        if category not in ("passed", ""):
+            test["outcome"] = category
+
+    def pytest_runtest_logfinish(self, nodeid, location):
+        test = self.pending.pop(nodeid, None)
+        start = self.usage_at_start.pop(nodeid, None)
+        if test is not None and start is not None:
+            test["resources"] = self._usage_delta(start, resource.getrusage(resource.RUSAGE_SELF))
+        if test is not None:
+            self.emit(test)
+
+    @staticmethod
+    def _usage_delta(start, end) -> dict:
+        # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+        scale = 1024 if sys.platform == "darwin" else 1
+        return {
+            "user_seconds": round(end.ru_utime - start.ru_utime, 6),
+            "system_seconds": round(end.ru_stime - start.ru_stime, 6),
+            "max_rss_kb": end.ru_maxrss // scale,
+            "rss_growth_kb": (end.ru_maxrss - start.ru_maxrss) // scale,
+        }
+
+    def pytest_sessionfinish(self, session, exitstatus):
+        self.emit({"type": "session", "exitcode": int(exitstatus), "duration": time.time() - self.started_at})
+
+    def pytest_unconfigure(self, config):
+        self.stream.close()
+
+    def _trim(self, text: str) -> str:
+        # Keep the end of long outputs: that is where tracebacks and assertion details are
+        if self.max_capture and len(text) > self.max_capture:
+            return f"[... {len(text) - self.max_capture} characters omitted ...]\n" + text[-self.max_capture:]
+        return text
+
+
+def pytest_configure(config):
+    if os.environ.get(FD_ENV):
+        stream = os.fdopen(int(os.environ[FD_ENV]), "w", encoding="utf-8")
+    elif os.environ.get(PATH_ENV):
+        stream = open(os.environ[PATH_ENV], "a", encoding="utf-8")
+    else:
+        return
+    # Workers started by pytest plugins (e.g. xdist) must not write to the same stream
+    os.environ.pop(FD_ENV, None)
+    os.environ.pop(PATH_ENV, None)
+    max_capture = int(os.environ.get(MAX_CAPTURE_ENV, "20000"))
+    config.pluginmanager.register(ResultStreamPlugin(config, stream, max_capture), "ai_agent_stream_plugin")
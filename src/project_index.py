@@ -0,0 +1,245 @@
+import ast
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from .ast_cache import LineRange
+
+# Bump when the stored summary format or its analysis changes
+INDEX_VERSION = 1
+
+# Nodes adding one decision point to the cyclomatic complexity of their function
+_BRANCH_NODES = (ast.If, ast.IfExp, ast.For, ast.AsyncFor, ast.While, ast.ExceptHandler, ast.Assert)
+if hasattr(ast, "match_case"):
+    _BRANCH_NODES += (ast.match_case,)
+_SCOPE_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+# Exact-type lookups of the single-pass walk (AST node types are never subclassed)
+_BRANCH_TYPES = frozenset(_BRANCH_NODES)
+_SCOPE_TYPES = frozenset(_SCOPE_NODES)
+
+
+@dataclass
+class FileSummary:
+    """The compact analysis result of one Python file.
+
+    Only plain data is kept (no AST), so summaries are cheap to send
+    between processes and to store.
+    """
+    path: str
+    content_hash: str
+    mtime_ns: int
+    size: int
+    symbols: Dict[str, LineRange] = field(default_factory=dict)
+    imports: List[str] = field(default_factory=list)
+    complexity: Dict[str, int] = field(default_factory=dict)
+    syntax_error: Optional[dict] = None
+
+
+def collect_imports(tree: ast.AST, module_name: Optional[str], is_package: bool) -> List[str]:
+    """Returns the absolute names of all modules imported in a tree (see CodeAnalyzer.find_imports)."""
+    imports: List[str] = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            imports.extend(_imported_names(node, module_name, is_package))
+    return list(dict.fromkeys(imports))
+
+
+def _imported_names(node: ast.AST, module_name: Optional[str], is_package: bool) -> List[str]:
+    """Returns the absolute module names one import statement may import."""
+    if isinstance(node, ast.Import):
+        return [alias.name for alias in node.names]
+    if node.level:
+        package = module_name if is_package else (module_name or "").rpartition(".")[0]
+        parts = package.split(".") if package else []
+        if node.level - 1 > len(parts):
+            return []  # Relative import beyond the top-level package
+        base_parts = parts[:len(parts) - (node.level - 1)]
+        if node.module:
+            base_parts.append(node.module)
+        base = ".".join(base_parts)
+    else:
+        base = node.module or ""
+    names = [base] if base else []
+    names.extend(f"{base}.{alias.name}" if base else alias.name for alias in node.names if alias.name != "*")
+    return names
+
+
+def cyclomatic_complexity(tree: ast.AST) -> Dict[str, int]:
+    """Returns the McCabe cyclomatic complexity of every function, keyed by qualname.
+
+    Each function starts at 1 and gains one per branch (if, loops, except,
+    assert, match case, conditional expression, comprehension loop and
+    condition) and per extra operand of ``and``/``or``. Nested functions and
+    classes are measured separately.
+    """
+    return _summarize_tree(tree, None, False)[2]
+
+
+def summarize_source(source: bytes, path: str, module_name: Optional[str], content_hash: str,
+                     mtime_ns: int = 0, size: int = 0) -> FileSummary:
+    """Parses source code into a FileSummary; syntax errors are recorded, not raised."""
+    summary = FileSummary(path, content_hash, mtime_ns, size)
+    try:
+        tree = ast.parse(source, filename=path)
+    except (SyntaxError, ValueError) as e:
+        summary.syntax_error = {
+            "message": getattr(e, "msg", None) or str(e),
+            "lineno": getattr(e, "lineno", None),
+            "offset": getattr(e, "offset", None),
+        }
+        return summary
+    summary.symbols, summary.imports, summary.complexity = _summarize_tree(
+        tree, module_name, os.path.basename(path) == "__init__.py")
+    return summary
+
+
+def _summarize_tree(tree: ast.AST, module_name: Optional[str],
+                    is_package: bool) -> Tuple[Dict[str, LineRange], List[str], Dict[str, int]]:
+    """Collects symbols, imports and complexity in a single walk over the tree.
+
+    Symbols match ast_cache.build_symbol_index and imports match
+    collect_imports (in source order); visiting every node once is about
+    three times faster than separate walks.
+    """
+    symbols: Dict[str, LineRange] = {}
+    complexity: Dict[str, int] = {}
+    imports: List[str] = []
+    import_nodes = (ast.Import, ast.ImportFrom)
+
+    def visit(node: ast.AST, prefix: str, function: Optional[str]):
+        for child in ast.iter_child_nodes(node):
+            kind = type(child)
+            if kind in _SCOPE_TYPES:
+                qualname = f"{prefix}{child.name}"
+                start = min([child.lineno] + [d.lineno for d in child.decorator_list])
+                symbols[qualname] = (start, child.end_lineno or child.lineno)
+                for decorator in child.decorator_list:
+                    visit(decorator, prefix, function)
+                if kind is ast.ClassDef:
+                    visit(child, qualname + ".", None)
+                else:
+                    complexity[qualname] = 1
+                    visit(child, qualname + ".", qualname)
+                continue
+            if function is not None:
+                if kind in _BRANCH_TYPES:
+                    complexity[function] += 1
+                elif kind is ast.BoolOp:
+                    complexity[function] += len(child.values) - 1
+                elif kind is ast.comprehension:
+                    complexity[function] += 1 + len(child.ifs)
+            if kind in import_nodes:
+                imports.extend(_imported_names(child, module_name, is_package))
+            visit(child, prefix, function)
+
+    visit(tree, "", None)
+    return symbols, list(dict.fromkeys(imports)), complexity
+
+
+def summarize_file(task: Tuple[str, Optional[str], Optional[str]]) -> Tuple[str, Optional[FileSummary], int, int, str]:
+    """Process pool worker: reads, hashes and (if its hash changed) summarizes one file.
+
+    Args:
+        task: (path, module name, content hash of the previous summary or None)
+
+    Returns:
+        (path, summary or None if the content hash is unchanged, mtime_ns, size, content hash);
+        unreadable files get an empty hash and no summary
+    """
+    path, module_name, previous_hash = task
+    try:
+        stat = os.stat(path)
+        with open(path, 'rb') as f:
+            source = f.read()
+    except OSError:
+        return path, None, 0, 0, ""
+    content_hash = hashlib.sha256(source).hexdigest()
+    if content_hash == previous_hash:
+        return path, None, stat.st_mtime_ns, stat.st_size, content_hash
+    return path, summarize_source(source, path, module_name, content_hash, stat.st_mtime_ns, stat.st_size), \
+        stat.st_mtime_ns, stat.st_size, content_hash
+
+
+class ProjectIndex:
+    """Symbols, import edges, complexity and syntax errors of every file in a project."""
+
+    def __init__(self, root: str, files: Optional[Dict[str, FileSummary]] = None,
+                 modules: Optional[Dict[str, str]] = None):
+        """Initializes an index.
+
+        Args:
+            root: The project root directory
+            files: FileSummary per absolute file path
+            modules: Dotted module name -> absolute file path of the project's modules
+        """
+        self.root = os.path.abspath(root)
+        self.files: Dict[str, FileSummary] = files or {}
+        self.modules: Dict[str, str] = modules or {}
+        self.stats: Dict[str, float] = {}
+
+    def import_graph(self) -> Dict[str, Set[str]]:
+        """Returns the project-internal import graph (same shape as CodeAnalyzer.build_import_graph)."""
+        graph: Dict[str, Set[str]] = {}
+        for file_path, summary in self.files.items():
+            edges = graph[file_path] = set()
+            for name in summary.imports:
+                parts = name.split(".")
+                for end in range(1, len(parts) + 1):
+                    target = self.modules.get(".".join(parts[:end]))
+                    if target and target != file_path:
+                        edges.add(target)
+        return graph
+
+    def syntax_errors(self) -> Dict[str, dict]:
+        """Returns the syntax error of every file that does not parse."""
+        return {path: summary.syntax_error for path, summary in self.files.items() if summary.syntax_error}
+
+    def complex_functions(self, threshold: int = 10) -> List[Tuple[str, str, int]]:
+        """Returns (file, qualname, complexity) of functions above threshold, most complex first."""
+        found = [(path, qualname, score)
+                 for path, summary in self.files.items()
+                 for qualname, score in summary.complexity.items() if score > threshold]
+        return sorted(found, key=lambda item: (-item[2], item[0], item[1]))
+
+    def find_symbol(self, name: str) -> List[Tuple[str, str, LineRange]]:
+        """Returns (file, qualname, line range) of every symbol whose qualname or short name is ``name``."""
+        return [(path, qualname, line_range)
+                for path, summary in self.files.items()
+                for qualname, line_range in summary.symbols.items()
+                if qualname == name or qualname.rpartition(".")[2] == name]
+
+    def save(self, path: str):
+        """Stores the index as JSON (paths relative to the root)."""
+        data = {
+            "version": INDEX_VERSION,
+            "root": self.root,
+            "files": {os.path.relpath(file_path, self.root): asdict(summary)
+                      for file_path, summary in self.files.items()},
+        }
+        for summary in data["files"].values():
+            del summary["path"]
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, root: str) -> Optional["ProjectIndex"]:
+        """Loads an index saved for root; None if missing, unreadable or from another version/root."""
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        root = os.path.abspath(root)
+        if data.get("version") != INDEX_VERSION or data.get("root") != root:
+            return None
+        files = {}
+        for rel_path, fields in data.get("files", {}).items():
+            file_path = os.path.join(root, rel_path)
+            fields["symbols"] = {name: tuple(line_range) for name, line_range in fields["symbols"].items()}
+            files[file_path] = FileSummary(path=file_path, **fields)
+        return cls(root, files)
@@ -0,0 +1,140 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+from .executor import Executor, StreamingProcess
+
+# Directory holding the bundled pytest plugin (put on the child's PYTHONPATH)
+PLUGIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "plugins")
+PLUGIN_NAME = "ai_agent_stream"
+RESULT_FD_ENV = "AI_AGENT_RESULT_FD"
+RESULT_PATH_ENV = "AI_AGENT_RESULT_PATH"
+
+
+def plugin_env() -> Dict[str, str]:
+    """Returns the environment variables that make the bundled plugin importable."""
+    pythonpath = os.environ.get("PYTHONPATH")
+    return {"PYTHONPATH": PLUGIN_DIR + (os.pathsep + pythonpath if pythonpath else "")}
+
+
+def plugin_args() -> List[str]:
+    """Returns the pytest arguments that load the bundled plugin."""
+    return ["-p", PLUGIN_NAME]
+
+
+class ResultParser:
+    """Parses the plugin's JSON lines, keeping summary counts up to date.
+
+    Only one record is held at a time; test records are returned to the
+    caller, every other record type updates the parser's state.
+    """
+
+    def __init__(self):
+        self.created = time.time()
+        self.summary: Dict[str, int] = {"total": 0}
+        self.collected: Optional[int] = None
+        self.collect_errors: List[dict] = []
+        self.exitcode: Optional[int] = None
+        self.duration: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        """True once pytest reported the end of the session."""
+        return self.exitcode is not None
+
+    def feed(self, line: str) -> Optional[dict]:
+        """Parses one line; returns the test record it contains, if any."""
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None  # A test wrote garbage to the inherited descriptor
+        kind = record.pop("type", "test")
+        if kind == "test":
+            outcome = record.get("outcome", "unknown")
+            self.summary[outcome] = self.summary.get(outcome, 0) + 1
+            self.summary["total"] += 1
+            return record
+        if kind == "collection":
+            self.collected = record.get("collected")
+            self.summary["collected"] = self.collected
+        elif kind == "collect_error":
+            self.collect_errors.append(record)
+        elif kind == "session":
+            self.exitcode = record.get("exitcode")
+            self.duration = record.get("duration")
+        return None
+
+
+class PytestStream(ResultParser):
+    """A running pytest process whose results are consumed one test at a time.
+
+    The bundled ``ai_agent_stream`` plugin writes one JSON line per finished
+    test to a pipe; iterating the stream yields each test record (in the
+    pytest-json-report layout: nodeid, outcome, setup/call/teardown stages)
+    as soon as the test finishes. Summary counts are updated on the fly and
+    only one record is parsed at a time. Stopping the iteration early (or
+    calling stop()) kills pytest, which makes fail-fast cancellation cheap.
+    """
+
+    def __init__(self, executor: Executor, pytest_args: List[str], cwd: str = None, echo: bool = True,
+                 timeout: Optional[float] = None):
+        """Starts pytest with the plugin loaded and the result pipe attached.
+
+        Args:
+            executor: The Executor used to start pytest
+            pytest_args: Targets and arguments passed to pytest
+            cwd: The working directory to run pytest from
+            echo: Print pytest's own output live
+            timeout: Kill pytest after this many seconds (default: the executor's timeout)
+        """
+        super().__init__()
+        self.stopped = False
+        self.parse_seconds = 0.0  # Time spent parsing result records
+
+        read_fd, write_fd = os.pipe()
+        try:
+            self.process: StreamingProcess = executor.stream_python(
+                ["-m", "pytest", *plugin_args(), *pytest_args], cwd=cwd, timeout=timeout,
+                env={**plugin_env(), RESULT_FD_ENV: str(write_fd)}, pass_fds=(write_fd,)
+            )
+        except Exception:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)  # Only pytest holds the write end now: EOF means pytest is gone
+        self._results = os.fdopen(read_fd, "r", encoding="utf-8")
+        # pytest's stdout/stderr must be drained concurrently or it blocks on a full pipe
+        self._output_thread = threading.Thread(target=self._consume_output, args=(echo,), daemon=True)
+        self._output_thread.start()
+
+    @property
+    def returncode(self) -> Optional[int]:
+        return self.process.returncode
+
+    def _consume_output(self, echo: bool):
+        for stream, line in self.process:
+            if echo:
+                print(line if stream == "stdout" else f"[stderr] {line}", end="")
+
+    def __iter__(self) -> Iterator[dict]:
+        try:
+            for line in self._results:
+                started = time.perf_counter()
+                record = self.feed(line)
+                self.parse_seconds += time.perf_counter() - started
+                if record is not None:
+                    yield record
+        finally:
+            if not self.finished:
+                # Iteration ended early (the consumer stopped, or pytest died): make sure pytest is gone,
+                # without marking the run as stopped on purpose, which only stop() does
+                self.process.kill()
+            self._results.close()
+            self._output_thread.join()
+
+    def stop(self):
+        """Kills pytest (e.g. on the first failure when failing fast)."""
+        self.stopped = True
+        self.process.kill()
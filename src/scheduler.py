@@ -0,0 +1,273 @@
+import asyncio
+import itertools
+import json
+import os
+import socket
+import stat
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from . import telemetry
+
+# A handler runs one job synchronously (in a worker thread) and returns its result
+JobHandler = Callable[[dict], Any]
+
+
+@dataclass(order=True)
+class Job:
+    """A unit of work queued in the JobScheduler.
+
+    Jobs are ordered by descending priority, then by submission order.
+    """
+    sort_key: tuple = field(init=False, repr=False)
+    priority: int = field(compare=False)
+    sequence: int = field(compare=False)
+    id: str = field(compare=False)
+    type: str = field(compare=False)
+    payload: dict = field(compare=False, default_factory=dict)
+    submitted_at: float = field(compare=False, default_factory=time.time)
+    future: Optional[asyncio.Future] = field(compare=False, default=None, repr=False)
+
+    def __post_init__(self):
+        self.sort_key = (-self.priority, self.sequence)
+
+
+class JobScheduler:
+    """Asyncio task queue running agent jobs with priorities and per-type concurrency.
+
+    Every job type has its own priority queue served by a fixed number of
+    workers (its concurrency limit), so a saturated job type never blocks
+    the others. The total number of queued jobs is bounded: submit() waits
+    for room (backpressure) and try_submit() raises asyncio.QueueFull.
+    Handlers are synchronous and run in a thread pool; each job resolves to
+    a structured result dictionary.
+    """
+
+    def __init__(self, handlers: Dict[str, JobHandler], concurrency: Optional[Dict[str, int]] = None,
+                 default_concurrency: int = 1, max_queued: int = 100):
+        """Initializes the scheduler.
+
+        Args:
+            handlers: Mapping of job type to the function running that job type
+            concurrency: Maximum number of concurrently running jobs per type
+            default_concurrency: Concurrency for job types not listed in ``concurrency``
+            max_queued: Maximum number of jobs waiting to run across all types
+        """
+        self.handlers = handlers
+        self.concurrency = {job_type: (concurrency or {}).get(job_type, default_concurrency)
+                            for job_type in handlers}
+        self.max_queued = max_queued
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0}
+        self._sequence = itertools.count()
+        self._queues: Dict[str, asyncio.PriorityQueue] = {}
+        self._queued = 0
+        self._room: Optional[asyncio.Condition] = None
+        self._workers: list = []
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def queued(self) -> int:
+        """Number of jobs waiting to run."""
+        return self._queued
+
+    async def start(self):
+        """Starts the worker tasks; must be called from within the event loop."""
+        self._room = asyncio.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=sum(self.concurrency.values()),
+                                        thread_name_prefix="agent-job")
+        for job_type, limit in self.concurrency.items():
+            self._queues[job_type] = asyncio.PriorityQueue()
+            self._workers.extend(asyncio.create_task(self._worker(job_type)) for _ in range(limit))
+
+    async def stop(self):
+        """Cancels the workers and shuts down the thread pool (running jobs finish first)."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        if self._pool:
+            self._pool.shutdown(wait=True)
+
+    async def __aenter__(self) -> "JobScheduler":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def submit(self, job_type: str, payload: Optional[dict] = None, priority: int = 0,
+                     job_id: Optional[str] = None) -> asyncio.Future:
+        """Queues a job, waiting while the queue is full.
+
+        Returns:
+            A future resolving to the job's result dictionary
+        """
+        job = self._make_job(job_type, payload, priority, job_id)
+        async with self._room:
+            await self._room.wait_for(lambda: self._queued < self.max_queued)
+            return self._enqueue(job)
+
+    def try_submit(self, job_type: str, payload: Optional[dict] = None, priority: int = 0,
+                   job_id: Optional[str] = None) -> asyncio.Future:
+        """Queues a job without waiting.
+
+        Raises:
+            asyncio.QueueFull: If max_queued jobs are already waiting
+        """
+        job = self._make_job(job_type, payload, priority, job_id)
+        if self._queued >= self.max_queued:
+            self.stats["rejected"] += 1
+            raise asyncio.QueueFull(f"{self.max_queued} jobs already queued")
+        return self._enqueue(job)
+
+    async def join(self):
+        """Waits until every queued job has finished."""
+        await asyncio.gather(*(q.join() for q in self._queues.values()))
+
+    def _make_job(self, job_type: str, payload: Optional[dict], priority: int, job_id: Optional[str]) -> Job:
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type '{job_type}' (expected one of {sorted(self.handlers)})")
+        return Job(priority=priority, sequence=next(self._sequence), id=job_id or uuid.uuid4().hex,
+                   type=job_type, payload=payload or {})
+
+    def _enqueue(self, job: Job) -> asyncio.Future:
+        job.future = asyncio.get_running_loop().create_future()
+        self._queues[job.type].put_nowait(job)
+        self._queued += 1
+        self.stats["submitted"] += 1
+        return job.future
+
+    async def _worker(self, job_type: str):
+        queue = self._queues[job_type]
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await queue.get()
+            self._queued -= 1
+            async with self._room:  # The job left the queue: wake up a waiting submitter
+                self._room.notify()
+            started_at = time.time()
+            result = {"id": job.id, "type": job.type, "priority": job.priority,
+                      "queued_seconds": round(started_at - job.submitted_at, 6)}
+            try:
+                result["result"] = await loop.run_in_executor(self._pool, self._run_handler, job)
+                result["status"] = "ok"
+                self.stats["completed"] += 1
+            except Exception as e:
+                result["status"] = "error"
+                result["error"] = f"{type(e).__name__}: {e}"
+                self.stats["failed"] += 1
+            result["duration_seconds"] = round(time.time() - started_at, 6)
+            telemetry.observe("ai_agent_job_queue_seconds", result["queued_seconds"], type=job.type)
+            telemetry.observe("ai_agent_job_duration_seconds", result["duration_seconds"],
+                              type=job.type, status=result["status"])
+            if not job.future.done():
+                job.future.set_result(result)
+            queue.task_done()
+
+    def _run_handler(self, job: Job) -> Any:
+        """Runs a job's handler (in a worker thread) inside a trace span."""
+        with telemetry.span(f"job.{job.type}", job_id=str(job.id), priority=job.priority):
+            return self.handlers[job.type](job.payload)
+
+
+async def serve_jsonl(scheduler: JobScheduler, jobs_path: str,
+                      on_result: Callable[[dict], Awaitable[None]]):
+    """Submits every job in a JSONL file and reports each result as soon as it completes.
+
+    Each line is a JSON object with a ``type`` ("debug", "test", ...), an
+    optional ``id`` and ``priority``; the remaining keys are the job payload.
+    """
+    pending = []
+    with open(jobs_path, 'r') as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                future = await _submit_request(scheduler, request)
+            except (ValueError, TypeError) as e:
+                await on_result({"id": None, "status": "rejected", "error": f"line {line_number}: {e}"})
+                continue
+            pending.append(asyncio.ensure_future(_deliver(future, on_result)))
+    await asyncio.gather(*pending)
+
+
+async def serve_socket(scheduler: JobScheduler, address: str):
+    """Serves JSONL job requests on a Unix socket.
+
+    Results are written back on the connection that submitted the job, one
+    JSON object per line, in completion order. A client that submits faster
+    than jobs are dequeued is slowed down by socket flow control.
+
+    Jobs run arbitrary files, so only local clients are served: TCP
+    addresses are refused and the socket is only accessible to its owner.
+
+    Raises:
+        ValueError: If address is a ``host:port`` TCP address
+    """
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        lock = asyncio.Lock()
+
+        async def send(result: dict):
+            async with lock:
+                writer.write((json.dumps(result, default=str) + "\n").encode())
+                await writer.drain()
+
+        pending = []
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                try:
+                    future = await _submit_request(scheduler, json.loads(line))
+                except (ValueError, TypeError) as e:
+                    await send({"id": None, "status": "rejected", "error": str(e)})
+                    continue
+                pending.append(asyncio.ensure_future(_deliver(future, send)))
+            await asyncio.gather(*pending)
+        except ConnectionError:
+            pass  # Client went away; its remaining jobs still run
+        finally:
+            writer.close()
+
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        raise ValueError(f"Refusing to serve jobs on TCP address {address}: use a Unix socket path")
+    server = await asyncio.start_unix_server(handle, sock=_bind_private_socket(address))
+    print(f"Agent listening for jobs on {address}")
+    async with server:
+        await server.serve_forever()
+
+
+def _bind_private_socket(address: str) -> socket.socket:
+    """Binds a Unix socket that is created with mode 0600, so no other user can ever connect."""
+    try:
+        if stat.S_ISSOCK(os.stat(address).st_mode):
+            os.unlink(address)  # Left behind by a previous run
+    except FileNotFoundError:
+        pass
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    previous = os.umask(0o177)
+    try:
+        sock.bind(address)
+    except OSError:
+        sock.close()
+        raise
+    finally:
+        os.umask(previous)
+    return sock
+
+
+async def _submit_request(scheduler: JobScheduler, request: dict) -> asyncio.Future:
+    if not isinstance(request, dict) or "type" not in request:
+        raise ValueError("job request must be a JSON object with a 'type'")
+    payload = {key: value for key, value in request.items() if key not in ("type", "id", "priority")}
+    return await scheduler.submit(request["type"], payload, priority=int(request.get("priority", 0)),
+                                  job_id=request.get("id"))
+
+
+async def _deliver(future: asyncio.Future, on_result: Callable[[dict], Awaitable[None]]):
+    await on_result(await future)
@@ -0,0 +1,344 @@
+import atexit
+import bisect
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+# Upper bounds (seconds) of the default histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+# Upper bounds (CPU seconds) for whole processes, e.g. a pytest run of a large suite
+CPU_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 1800.0, 3600.0)
+# Finished spans kept for the trace file; older spans are dropped first
+MAX_SPANS = 10000
+
+# Known metrics: name -> (type, help)
+METRICS = {
+    "ai_agent_processes_spawned_total": ("counter", "Processes started by the Executor, by start mode."),
+    "ai_agent_output_bytes_total": ("counter", "Bytes of process output read by the Executor, by stream."),
+    "ai_agent_tests_total": ("counter", "Test results received from pytest, by outcome."),
+    "ai_agent_llm_requests_total": ("counter", "LLM requests, by request kind and status."),
+    "ai_agent_llm_tokens_total": ("counter", "LLM tokens reported by the API, by request kind and direction."),
+    "ai_agent_llm_cache_total": ("counter", "LLM response cache lookups, by result."),
+    "ai_agent_llm_latency_seconds": ("histogram", "LLM request latency, by request kind."),
+    "ai_agent_stage_duration_seconds": ("histogram", "Duration of instrumented stages (trace spans)."),
+    "ai_agent_job_duration_seconds": ("histogram", "Job run time, by job type and status."),
+    "ai_agent_job_queue_seconds": ("histogram", "Time jobs spent queued, by job type."),
+    "ai_agent_watch_latency_seconds": ("histogram", "Time from a detected file change to the end of its re-run in watch mode."),
+    "ai_agent_shards_total": ("counter", "Distributed test shards, by status and worker."),
+    "ai_agent_process_cpu_seconds": ("histogram", "CPU time (user + system) of processes run by the Executor, by start mode."),
+}
+# Histograms not using DEFAULT_BUCKETS
+BUCKETS = {
+    "ai_agent_process_cpu_seconds": CPU_BUCKETS,
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("ai_agent_current_span", default=None)
+
+
+class _NoopSpan:
+    """Returned by span() while telemetry is disabled; does nothing."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_attribute(self, key: str, value):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """A timed stage; use as a context manager. Nested spans share the trace of their parent."""
+
+    __slots__ = ("name", "attributes", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+                 "error", "_telemetry", "_token")
+
+    def __init__(self, telemetry: "Telemetry", name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+        self._telemetry = telemetry
+        self.span_id = secrets.token_hex(8)
+        self.trace_id: Optional[str] = None
+        self.parent_id: Optional[str] = None
+        self.start_ns = 0
+        self.end_ns = 0
+        self.error: Optional[str] = None
+        self._token = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        parent = _current_span.get()
+        if parent is not None:
+            self.trace_id, self.parent_id = parent.trace_id, parent.span_id
+        else:
+            self.trace_id = secrets.token_hex(16)
+        self._token = _current_span.set(self)
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        if exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        self._telemetry._finish(self)
+        return False
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observed values."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Telemetry:
+    """Collects spans, counters and histograms and exports them.
+
+    Metrics are written in the Prometheus text format (suitable for the
+    node_exporter textfile collector) and spans as an OTLP/JSON trace file,
+    both atomically. Every span also feeds the
+    ``ai_agent_stage_duration_seconds`` histogram.
+    """
+
+    def __init__(self, metrics_path: Optional[str] = None, trace_path: Optional[str] = None,
+                 service_name: str = "ai-agent", max_spans: int = MAX_SPANS):
+        """Initializes an empty collector.
+
+        Args:
+            metrics_path: Prometheus text file written by export()
+            trace_path: OTLP/JSON trace file written by export()
+            service_name: ``service.name`` resource attribute of the trace
+            max_spans: Finished spans kept for the trace file
+        """
+        self.metrics_path = metrics_path
+        self.trace_path = trace_path
+        self.service_name = service_name
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.spans: deque = deque(maxlen=max_spans)
+        self.dropped_spans = 0
+        self._lock = threading.Lock()
+        self._stop_exporter: Optional[threading.Event] = None
+
+    def span(self, name: str, attributes: dict) -> Span:
+        return Span(self, name, attributes)
+
+    def count(self, name: str, value: float, labels: Dict[str, str]):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: Dict[str, str]):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(BUCKETS.get(name, DEFAULT_BUCKETS))
+            histogram.observe(value)
+
+    def _finish(self, span: Span):
+        self.observe("ai_agent_stage_duration_seconds", (span.end_ns - span.start_ns) / 1e9, {"stage": span.name})
+        with self._lock:
+            if len(self.spans) == self.spans.maxlen:
+                self.dropped_spans += 1
+            self.spans.append(span)
+
+    def prometheus_text(self) -> str:
+        """Returns all counters and histograms in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name in sorted(set(self.counters) | set(self.histograms)):
+                kind, help_text = METRICS.get(name, ("histogram" if name in self.histograms else "counter", ""))
+                if help_text:
+                    lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(self.counters.get(name, {}).items()):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                for labels, histogram in sorted(self.histograms.get(name, {}).items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def otlp_traces(self) -> dict:
+        """Returns the finished spans as an OTLP/JSON ``ExportTraceServiceRequest``."""
+        with self._lock:
+            spans = list(self.spans)
+        otlp_spans = []
+        for span in spans:
+            otlp_span = {
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,  # SPAN_KIND_INTERNAL
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [_otlp_attribute(key, value) for key, value in span.attributes.items()],
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+            }
+            if span.parent_id:
+                otlp_span["parentSpanId"] = span.parent_id
+            otlp_spans.append(otlp_span)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", self.service_name)]},
+            "scopeSpans": [{"scope": {"name": "ai_agent"}, "spans": otlp_spans}],
+        }]}
+
+    def export(self):
+        """Writes the metrics and trace files (whichever paths are configured)."""
+        if self.metrics_path:
+            _write_atomic(self.metrics_path, self.prometheus_text())
+        if self.trace_path:
+            _write_atomic(self.trace_path, json.dumps(self.otlp_traces()))
+
+    def start_exporter(self, interval: float):
+        """Exports every ``interval`` seconds in a background thread (for long-running services)."""
+        self._stop_exporter = threading.Event()
+
+        def run(stop: threading.Event):
+            while not stop.wait(interval):
+                self.export()
+
+        threading.Thread(target=run, args=(self._stop_exporter,), daemon=True).start()
+
+    def stop_exporter(self):
+        if self._stop_exporter is not None:
+            self._stop_exporter.set()
+            self._stop_exporter = None
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        f'{key}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _otlp_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def _write_atomic(path: str, text: str):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+# The active collector; None while telemetry is disabled (the default)
+_active: Optional[Telemetry] = None
+
+
+def enable(metrics_path: Optional[str] = None, trace_path: Optional[str] = None,
+           export_interval: Optional[float] = None) -> Telemetry:
+    """Starts collecting telemetry process-wide and exports it at exit.
+
+    Args:
+        metrics_path: Prometheus text file to write
+        trace_path: OTLP/JSON trace file to write
+        export_interval: Also export every this many seconds (for services)
+
+    Returns:
+        The active Telemetry collector
+    """
+    global _active
+    disable()
+    telemetry = Telemetry(metrics_path, trace_path)
+    if export_interval:
+        telemetry.start_exporter(export_interval)
+    atexit.register(telemetry.export)
+    _active = telemetry
+    return telemetry
+
+
+def disable():
+    """Stops collecting telemetry (already collected data is not exported)."""
+    global _active
+    if _active is not None:
+        _active.stop_exporter()
+        atexit.unregister(_active.export)
+        _active = None
+
+
+def active() -> Optional[Telemetry]:
+    """Returns the active collector, or None while telemetry is disabled."""
+    return _active
+
+
+def span(name: str, **attributes):
+    """Returns a context manager timing a stage (a no-op while telemetry is disabled).
+
+    Example:
+        with telemetry.span("debugger.execute", file=file_path) as stage:
+            ...
+            stage.set_attribute("exit_code", return_code)
+    """
+    if _active is None:
+        return _NOOP_SPAN
+    return _active.span(name, attributes)
+
+
+def count(name: str, value: float = 1, **labels: str):
+    """Increments a counter (no-op while telemetry is disabled)."""
+    if _active is not None:
+        _active.count(name, value, labels)
+
+
+def observe(name: str, value: float, **labels: str):
+    """Records a value in a histogram (no-op while telemetry is disabled)."""
+    if _active is not None:
+        _active.observe(name, value, labels)
+
+
+def enabled() -> bool:
+    return _active is not None
@@ -0,0 +1,284 @@
+import ast
+import contextvars
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Set, Tuple
+
+from . import telemetry
+from .llm_interface import LLMError, RetryBudget
+from .test_runner import TestRunner
+
+# ```python ... ``` blocks in an LLM reply
+_FENCE_RE = re.compile(r"```[ \t]*(?:python|py)?[ \t]*\n(.*?)```", re.DOTALL)
+
+
+def extract_code(reply: str) -> str:
+    """Returns the Python code of an LLM reply: its longest fenced block, or the reply itself."""
+    blocks = _FENCE_RE.findall(reply)
+    return max(blocks, key=len) if blocks else reply
+
+
+def prune_tests(source: str, keep: Set[Tuple[Optional[str], str]]) -> str:
+    """Removes every test function of a test module that is not in keep.
+
+    Args:
+        source: The test module
+        keep: (class name or None, function name) of the tests to keep
+
+    Returns:
+        The module without the other ``test*`` functions; test classes
+        left without tests are removed as well
+    """
+    tree = ast.parse(source)
+    lines = source.splitlines(keepends=True)
+    drop: List[Tuple[int, int]] = []
+
+    def span(node: ast.AST) -> Tuple[int, int]:
+        return min([node.lineno] + [d.lineno for d in node.decorator_list]), node.end_lineno or node.lineno
+
+    def is_test(node: ast.AST) -> bool:
+        return isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test")
+
+    for node in tree.body:
+        if is_test(node) and (None, node.name) not in keep:
+            drop.append(span(node))
+        elif isinstance(node, ast.ClassDef) and node.name.startswith("Test"):
+            tests = [child for child in node.body if is_test(child)]
+            dropped = [child for child in tests if (node.name, child.name) not in keep]
+            if tests and len(dropped) == len(tests):
+                drop.append(span(node))
+            else:
+                drop.extend(span(child) for child in dropped)
+    for start, end in sorted(drop, reverse=True):
+        del lines[start - 1:end]
+    return "".join(lines)
+
+
+class BatchTestGenerator:
+    """Generates tests for many modules with the LLM and keeps only tests that pass.
+
+    Generation requests run concurrently. Each generated module is validated
+    as soon as it arrives: it is run in its own temporary directory through
+    the TestRunner's Executor, in parallel with other validations. Failing
+    tests are pruned and the rest re-run. Only files whose remaining tests
+    collect and pass are written to the output directory. The source hash of
+    every accepted module is stored, so unchanged modules are skipped on the
+    next run.
+    """
+
+    def __init__(self, test_runner: TestRunner, output_dir: str = os.path.join("tests", "generated"),
+                 state_path: Optional[str] = None, root: Optional[str] = None,
+                 concurrency: int = 8, validation_workers: Optional[int] = None,
+                 validation_timeout: float = 120.0, retry_budget: int = 20):
+        """Initializes the generator.
+
+        Args:
+            test_runner: TestRunner with an LLM (and ideally a ContextBuilder for budgeted prompts)
+            output_dir: Directory the accepted test files are written to
+            state_path: JSON file with the source hashes of accepted modules
+                (default: ``generated_tests.json`` in output_dir)
+            root: Project root; validation runs from here so project modules are importable
+            concurrency: Maximum number of LLM requests in flight
+            validation_workers: Parallel pytest processes validating generated tests
+                (default: one per CPU core)
+            validation_timeout: Seconds after which a validation run is killed
+            retry_budget: Total retries of transient LLM errors for a batch
+        """
+        self.runner = test_runner
+        self.root = os.path.abspath(root or os.getcwd())
+        self.output_dir = os.path.join(self.root, output_dir)
+        self.state_path = state_path or os.path.join(self.output_dir, "generated_tests.json")
+        self.concurrency = concurrency
+        self.validation_workers = validation_workers or os.cpu_count() or 1
+        self.validation_timeout = validation_timeout
+        self.retry_budget = retry_budget
+        self.state: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Reads the accepted-generation state, discarding it if unreadable."""
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, 'r') as f:
+                self.state = json.load(f)["modules"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable test generation state {self.state_path}: {e}")
+            self.state = {}
+
+    def save(self):
+        """Writes the accepted-generation state atomically."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with self._lock:
+            data = json.dumps({"modules": self.state}, indent=1, sort_keys=True)
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, self.state_path)
+
+    def test_file_for(self, file_path: str) -> str:
+        """Returns the output test file of a module, e.g. ``pkg/io.py`` -> ``test_pkg_io.py``."""
+        relative = os.path.relpath(os.path.abspath(file_path), self.root)
+        name = os.path.splitext(relative)[0].replace(os.sep, "_").lstrip("._")
+        return os.path.join(self.output_dir, f"test_{name}.py")
+
+    def generate(self, file_paths: List[str], force: bool = False) -> dict:
+        """Generates and validates tests for a batch of modules.
+
+        Args:
+            file_paths: The modules to generate tests for
+            force: Regenerate modules whose source did not change since their last accepted generation
+
+        Returns:
+            ``{"modules": [...], "stats": {...}}``. Each module entry has a
+            ``status`` of "accepted", "rejected", "skipped" or "error" and a
+            ``reason`` when not accepted. ``stats`` holds the counts, the
+            acceptance rates and the throughput
+        """
+        if not self.runner.llm:
+            return {"error": "LLM not available for test generation"}
+        started = time.monotonic()
+        modules: List[dict] = []
+        pending: List[Tuple[str, str]] = []
+        for file_path in file_paths:
+            file_path = os.path.abspath(file_path)
+            try:
+                with open(file_path, 'rb') as f:
+                    source_hash = hashlib.sha256(f.read()).hexdigest()
+            except OSError as e:
+                modules.append({"file_path": file_path, "status": "error", "reason": str(e)})
+                continue
+            known = self.state.get(os.path.relpath(file_path, self.root))
+            if not force and known and known["source_hash"] == source_hash \
+                    and os.path.exists(os.path.join(self.root, known["test_file"])):
+                modules.append({"file_path": file_path, "status": "skipped", "reason": "unchanged",
+                                "test_file": known["test_file"]})
+            else:
+                pending.append((file_path, source_hash))
+
+        print(f"Generating tests for {len(pending)} modules ({len(file_paths) - len(pending)} skipped)...")
+        budget = RetryBudget(self.retry_budget)
+        with telemetry.span("test_generation.batch", modules=len(pending)):
+            with ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(pending) or 1))) as llm_pool, \
+                    ThreadPoolExecutor(max_workers=self.validation_workers) as validation_pool:
+                generations = {llm_pool.submit(contextvars.copy_context().run, self._generate_one, path, budget): (path, digest)
+                               for path, digest in pending}
+                validations = []
+                # Validate each module as soon as its tests arrive, while other generations are in flight
+                for future in as_completed(generations):
+                    file_path, source_hash = generations[future]
+                    reply, error = future.result()
+                    if error:
+                        modules.append({"file_path": file_path, "status": "error", "reason": error})
+                        continue
+                    validations.append(validation_pool.submit(contextvars.copy_context().run, self._validate_one,
+                                                              file_path, source_hash, extract_code(reply)))
+                modules.extend(future.result() for future in validations)
+        self.save()
+
+        stats = self._stats(modules, time.monotonic() - started)
+        print(f"Test generation: {stats['accepted']}/{stats['generated']} modules accepted "
+              f"({stats['acceptance_rate']:.0%}), {stats['tests_kept']}/{stats['tests_generated']} tests kept, "
+              f"{stats['skipped']} unchanged modules skipped, {stats['modules_per_minute']:.1f} modules/min")
+        return {"modules": modules, "stats": stats}
+
+    def _generate_one(self, file_path: str, budget: RetryBudget) -> Tuple[Optional[str], Optional[str]]:
+        """Asks the LLM for tests of one module; returns (reply, error message)."""
+        with telemetry.span("test_generation.generate", file=file_path):
+            context = self.runner.context_builder.for_module(file_path) if self.runner.context_builder else None
+            try:
+                if context is None:
+                    with open(file_path, 'r') as f:
+                        context = f.read()
+                return budget.call(self.runner.llm.suggest_tests, os.path.relpath(file_path, self.root), context), None
+            except (LLMError, OSError) as e:
+                return None, f"Generation failed: {e}"
+
+    def _validate_one(self, file_path: str, source_hash: str, code: str) -> dict:
+        """Runs generated tests in isolation, prunes failing ones and stores the file if the rest pass."""
+        entry = {"file_path": file_path, "status": "rejected", "tests": 0, "kept": 0}
+        try:
+            ast.parse(code)
+        except SyntaxError as e:
+            entry["reason"] = f"syntax error: {e}"
+            return entry
+
+        test_file = self.test_file_for(file_path)
+        workdir = tempfile.mkdtemp(prefix="generated_", dir=self.runner.temp_dir.name)
+        try:
+            with telemetry.span("test_generation.validate", file=file_path) as stage:
+                results = self._run(workdir, os.path.basename(test_file), code)
+                passed = [test["nodeid"] for test in results.get("tests", []) if test.get("outcome") == "passed"]
+                entry["tests"] = len(results.get("tests", []))
+                stage.set_attribute("tests", entry["tests"])
+                if "error" in results or results.get("collectors"):
+                    entry["reason"] = "tests do not collect"
+                    return entry
+                if not passed:
+                    entry["reason"] = "no passing tests"
+                    return entry
+                if len(passed) < entry["tests"]:
+                    keep = set()
+                    for nodeid in passed:
+                        names = [re.sub(r"\[.*\]$", "", part) for part in nodeid.split("::")[1:]]
+                        keep.add((names[0], names[1]) if len(names) > 1 else (None, names[0]))
+                    code = prune_tests(code, keep)
+                    results = self._run(workdir, os.path.basename(test_file), code)
+                    outcomes = {test.get("outcome") for test in results.get("tests", [])}
+                    if results.get("exitcode") != 0 or outcomes != {"passed"}:
+                        entry["reason"] = "remaining tests do not pass on their own"
+                        return entry
+                    passed = [test["nodeid"] for test in results["tests"]]
+                stage.set_attribute("kept", len(passed))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        tmp_path = f"{test_file}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(code)
+        os.replace(tmp_path, test_file)
+        relative_test_file = os.path.relpath(test_file, self.root)
+        with self._lock:
+            self.state[os.path.relpath(file_path, self.root)] = {
+                "source_hash": source_hash, "test_file": relative_test_file,
+                "tests": len(passed), "generated_at": time.time(),
+            }
+        entry.update(status="accepted", kept=len(passed), test_file=relative_test_file)
+        return entry
+
+    def _run(self, workdir: str, name: str, code: str) -> dict:
+        """Runs a test module from workdir (its own rootdir, no cache) with the project root as cwd."""
+        with open(os.path.join(workdir, name), 'w') as f:
+            f.write(code)
+        stream = self.runner.stream_pytest(
+            os.path.join(workdir, name), cwd=self.root,
+            pytest_args=[f"--rootdir={workdir}", "-p", "no:cacheprovider"], timeout=self.validation_timeout,
+        )
+        return self.runner._collect_results(stream, self.root)
+
+    def _stats(self, modules: List[dict], seconds: float) -> dict:
+        counts = {status: sum(1 for module in modules if module["status"] == status)
+                  for status in ("accepted", "rejected", "skipped", "error")}
+        generated = counts["accepted"] + counts["rejected"]
+        tests_generated = sum(module.get("tests", 0) for module in modules if module["status"] != "skipped")
+        tests_kept = sum(module.get("kept", 0) for module in modules if module["status"] == "accepted")
+        return {
+            "modules": len(modules),
+            "generated": generated,
+            **counts,
+            "tests_generated": tests_generated,
+            "tests_kept": tests_kept,
+            "acceptance_rate": counts["accepted"] / generated if generated else 0.0,
+            "test_acceptance_rate": tests_kept / tests_generated if tests_generated else 0.0,
+            "seconds": seconds,
+            "modules_per_minute": (generated + counts["error"]) / seconds * 60 if seconds else 0.0,
+        }
@@ -0,0 +1,211 @@
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+FAILED_OUTCOMES = ("failed", "error")
+
+
+@dataclass
+class TestStats:
+    """Aggregated history of a single test node ID."""
+    nodeid: str
+    runs: int
+    avg_duration: float
+    last_outcome: str
+    last_run_at: float
+    last_failed_at: Optional[float]
+    flips: int
+
+    @property
+    def recently_failed(self) -> bool:
+        """True if the most recent recorded run of the test failed."""
+        return self.last_outcome in FAILED_OUTCOMES
+
+    @property
+    def flaky(self) -> bool:
+        """True if the outcome flipped between pass and fail more than once."""
+        return self.flips >= 2
+
+
+class TestHistory:
+    """Persistent per-test result history stored in a local SQLite database.
+
+    Every recorded run adds one row per test (outcome, duration, timestamp).
+    The history is used to order tests (recent failures first, slowest first),
+    to balance shards by expected duration and to flag flaky tests.
+    """
+
+    def __init__(self, db_path: str, window: int = 20):
+        """Initializes the history; the database is opened (and created) on first use.
+
+        Args:
+            db_path: Path of the SQLite file (":memory:" for a throwaway store)
+            window: Number of most recent runs per test kept and used for stats
+        """
+        self.db_path = db_path
+        self.window = window
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """The database connection, opened on first use (callers hold the lock)."""
+        if self._connection is None:
+            if self.db_path != ":memory:" and os.path.dirname(self.db_path):
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._connection.executescript("""
+                CREATE TABLE IF NOT EXISTS results (
+                    nodeid   TEXT NOT NULL,
+                    outcome  TEXT NOT NULL,
+                    duration REAL NOT NULL,
+                    run_at   REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_results_nodeid ON results (nodeid, run_at);
+            """)
+        return self._connection
+
+    def record(self, test_results: dict, run_at: Optional[float] = None) -> int:
+        """Stores the outcome and duration of every test in a results dictionary.
+
+        Args:
+            test_results: Results in the run_pytest layout (a ``tests`` list)
+            run_at: Timestamp of the run (defaults to now)
+
+        Returns:
+            The number of test results recorded
+        """
+        run_at = run_at if run_at is not None else time.time()
+        rows = [
+            (test["nodeid"], test.get("outcome", "unknown"), total_duration(test), run_at)
+            for test in test_results.get("tests", [])
+            if test.get("nodeid")
+        ]
+        if not rows:
+            return 0
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO results (nodeid, outcome, duration, run_at) VALUES (?, ?, ?, ?)", rows
+            )
+            # Keep only the most recent `window` runs of each test
+            self._conn.execute("""
+                DELETE FROM results WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, ROW_NUMBER() OVER (
+                            PARTITION BY nodeid ORDER BY run_at DESC, rowid DESC
+                        ) AS position FROM results
+                    ) WHERE position > ?
+                )
+            """, (self.window,))
+        return len(rows)
+
+    def stats(self, nodeids: Optional[Iterable[str]] = None) -> Dict[str, TestStats]:
+        """Returns aggregated stats per node ID (all known tests if none given).
+
+        The wanted node IDs go to a temporary table joined on the
+        (nodeid, run_at) index, so only their rows are read, already in order;
+        each test's runs are then folded in a single pass.
+        """
+        query = "SELECT results.nodeid, outcome, duration, run_at FROM results {join} " \
+                "ORDER BY results.nodeid, run_at, results.rowid"
+        with self._lock:
+            if nodeids is None:
+                rows = self._conn.execute(query.format(join="")).fetchall()
+            else:
+                self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (nodeid TEXT PRIMARY KEY)")
+                self._conn.execute("DELETE FROM temp.wanted")
+                self._conn.executemany("INSERT OR IGNORE INTO temp.wanted (nodeid) VALUES (?)",
+                                       ((nodeid,) for nodeid in nodeids))
+                rows = self._conn.execute(
+                    query.format(join="JOIN temp.wanted ON temp.wanted.nodeid = results.nodeid")).fetchall()
+                self._conn.execute("DELETE FROM temp.wanted")
+                self._conn.commit()
+
+        stats: Dict[str, TestStats] = {}
+        current: Optional[TestStats] = None
+        total = 0.0
+        for nodeid, outcome, duration, run_at in rows:
+            failed = outcome in FAILED_OUTCOMES
+            if current is None or current.nodeid != nodeid:
+                if current is not None:
+                    current.avg_duration = total / current.runs
+                current = stats[nodeid] = TestStats(nodeid=nodeid, runs=0, avg_duration=0.0, last_outcome=outcome,
+                                                    last_run_at=run_at, last_failed_at=None, flips=0)
+                total = 0.0
+            elif failed != (current.last_outcome in FAILED_OUTCOMES):
+                current.flips += 1
+            current.runs += 1
+            total += duration
+            current.last_outcome = outcome
+            current.last_run_at = run_at
+            if failed:
+                current.last_failed_at = run_at
+        if current is not None:
+            current.avg_duration = total / current.runs
+        return stats
+
+    def durations(self, nodeids: Iterable[str], default: Optional[float] = None,
+                  stats: Optional[Dict[str, TestStats]] = None) -> Dict[str, float]:
+        """Returns the expected duration of each node ID.
+
+        Tests without history get ``default``, or the mean duration of the
+        known tests when no default is given. ``stats`` (from stats()) avoids
+        querying the database again.
+        """
+        nodeids = list(nodeids)
+        return self._durations(nodeids, self.stats(nodeids) if stats is None else stats, default)
+
+    def _durations(self, nodeids: List[str], stats: Dict[str, TestStats],
+                   default: Optional[float] = None) -> Dict[str, float]:
+        if default is None:
+            known = [s.avg_duration for s in stats.values()]
+            default = sum(known) / len(known) if known else 1.0
+        return {nodeid: stats[nodeid].avg_duration if nodeid in stats else default for nodeid in nodeids}
+
+    def order(self, nodeids: Iterable[str], stats: Optional[Dict[str, TestStats]] = None) -> List[str]:
+        """Orders node IDs so that failures surface as early as possible.
+
+        Recently failed tests come first, then tests without any history
+        (new tests are the most likely to fail), then the rest. Within each
+        group the slowest tests are started first. ``stats`` (from stats(),
+        e.g. of a whole run being split into shards) avoids another query.
+        """
+        nodeids = list(nodeids)
+        if stats is None:
+            stats = self.stats(nodeids)
+        durations = self._durations(nodeids, stats)
+
+        def sort_key(nodeid: str):
+            if nodeid not in stats:
+                group = 1
+            else:
+                group = 0 if stats[nodeid].recently_failed else 2
+            return group, -durations[nodeid]
+
+        return sorted(nodeids, key=sort_key)
+
+    def flaky_tests(self, nodeids: Optional[Iterable[str]] = None) -> List[str]:
+        """Returns the node IDs whose outcome flipped between pass and fail repeatedly."""
+        return sorted(nodeid for nodeid, s in self.stats(nodeids).items() if s.flaky)
+
+    def close(self):
+        """Closes the underlying database connection."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+def total_duration(test: dict) -> float:
+    """Returns the total duration (setup + call + teardown) of a pytest-json-report test entry."""
+    if not isinstance(test, dict) and hasattr(test, "duration"):
+        return test.duration  # A TestRecord keeps the total in memory
+    phases = [test.get(phase) for phase in ("setup", "call", "teardown")]
+    durations = [phase.get("duration", 0.0) for phase in phases if isinstance(phase, dict)]
+    if durations:
+        return float(sum(durations))
+    return float(test.get("duration", 0.0))
+
@@ -0,0 +1,307 @@
+import heapq
+import json
+import tempfile
+import threading
+from array import array
+from collections.abc import Mapping, MutableMapping, Sequence
+from typing import Dict, Iterator, List, Optional, Union
+
+from .test_history import total_duration
+
+# Keys of a results mapping backed by the object's own state; everything else lives in ``extra``
+CORE_KEYS = ("created", "duration", "exitcode", "root", "summary", "collectors", "tests", "warnings", "resources")
+
+
+def cpu_seconds(test: Mapping) -> float:
+    """CPU time (user + system) a test used, from the plugin's per-test resource figures."""
+    if isinstance(test, TestRecord):
+        return test.cpu_seconds  # Kept in memory: no need to load the record
+    resources = test.get("resources") or {}
+    return (resources.get("user_seconds") or 0.0) + (resources.get("system_seconds") or 0.0)
+
+
+class TestResults(MutableMapping):
+    """The results of a pytest run, stored compactly with per-test details on disk.
+
+    Node IDs, outcomes, durations and CPU times live in flat arrays (a few
+    dozen bytes per test) and the summary counts are kept up to date as tests
+    are added. Each test's full record (stages, captured output, longrepr,
+    resources) is appended as one JSON line to an anonymous temporary file
+    and only read back when a test is inspected.
+
+    The object is a mapping in the pytest-json-report layout (``summary``,
+    ``tests``, ``exitcode``, ...), so callers written against the plain
+    results dictionary keep working. ``tests`` is a sequence of TestRecord
+    views; reading a record's nodeid or outcome never touches the disk.
+    Other keys (``error``, ``flaky``, ``selected``, ...) are stored in
+    ``extra``; to_dict() materializes everything, e.g. for JSON.
+    """
+
+    __slots__ = ("created", "duration", "exitcode", "root", "collected", "collectors", "resources", "extra",
+                 "_names", "_name_ends", "_outcomes", "_outcome_names", "_outcome_codes", "_durations",
+                 "_cpu", "_record_ends", "_counts", "_spool", "_spool_dir", "_lock")
+
+    def __init__(self, created: Optional[float] = None, duration: Optional[float] = None,
+                 exitcode: Optional[int] = None, root: Optional[str] = None, spool_dir: Optional[str] = None):
+        """Creates an empty result set.
+
+        Args:
+            created: Start time of the run
+            duration: Duration of the run in seconds
+            exitcode: pytest's exit code
+            root: The directory pytest ran in
+            spool_dir: Directory of the temporary file holding the test records (default: the system's)
+        """
+        self.created = created
+        self.duration = duration
+        self.exitcode = exitcode
+        self.root = root
+        self.collected: Optional[int] = None
+        self.collectors: List[dict] = []
+        self.resources: Optional[dict] = None
+        self.extra: Dict[str, object] = {}
+        self._names = bytearray()
+        self._name_ends = array("Q")
+        self._outcomes = array("B")
+        self._outcome_names: List[str] = []
+        self._outcome_codes: Dict[str, int] = {}
+        self._durations = array("d")
+        self._cpu = array("d")
+        self._record_ends = array("Q")
+        self._counts: Dict[str, int] = {}
+        self._spool = None
+        self._spool_dir = spool_dir
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_report(cls, report: dict, spool_dir: Optional[str] = None) -> "TestResults":
+        """Builds a TestResults from a results dictionary (e.g. one received from a worker)."""
+        results = cls(report.get("created"), report.get("duration"), report.get("exitcode"), report.get("root"),
+                      spool_dir=spool_dir)
+        results.extend(report)
+        results.collectors = list(report.get("collectors", []))
+        results.resources = report.get("resources")
+        results.extra = {key: value for key, value in report.items() if key not in CORE_KEYS}
+        return results
+
+    def append(self, test: dict):
+        """Adds one test record (a dictionary in the pytest-json-report layout)."""
+        self._add(test, json.dumps(test, default=str).encode() + b"\n")
+        outcome = test.get("outcome", "unknown")
+        self._counts[outcome] = self._counts.get(outcome, 0) + 1
+
+    def extend(self, report: Mapping):
+        """Adds the tests and summary counts of another run's results (a TestResults or a dictionary)."""
+        if isinstance(report, TestResults):
+            for index in range(report.total):
+                self._add_indexed(report, index)
+        else:
+            for test in report.get("tests", []):
+                self._add(test, json.dumps(test, default=str).encode() + b"\n")
+        for key, value in report.get("summary", {}).items():
+            if key == "collected":
+                self.collected = (self.collected or 0) + (value or 0)
+            elif key != "total" and isinstance(value, (int, float)):
+                self._counts[key] = self._counts.get(key, 0) + value
+
+    def _add_indexed(self, other: "TestResults", index: int):
+        # Copies the raw record line: nothing is parsed
+        self._add(other.record(index), other._read(index), other.outcome(index), other._durations[index],
+                  other._cpu[index])
+
+    def _add(self, test: Union[dict, "TestRecord"], line: bytes, outcome: Optional[str] = None,
+             duration: Optional[float] = None, cpu: Optional[float] = None):
+        outcome = outcome or test.get("outcome", "unknown")
+        code = self._outcome_codes.get(outcome)
+        if code is None:
+            code = self._outcome_codes[outcome] = len(self._outcome_names)
+            self._outcome_names.append(outcome)
+        with self._lock:
+            if self._spool is None:
+                self._spool = tempfile.TemporaryFile(dir=self._spool_dir)
+            self._spool.seek(0, 2)
+            self._spool.write(line)
+            self._record_ends.append((self._record_ends[-1] if self._record_ends else 0) + len(line))
+        self._names += str(test.get("nodeid", "")).encode()
+        self._name_ends.append(len(self._names))
+        self._outcomes.append(code)
+        self._durations.append(total_duration(test) if duration is None else duration)
+        self._cpu.append(cpu_seconds(test) if cpu is None else cpu)
+
+    def __len__(self) -> int:
+        """The number of keys of the mapping (use ``total`` for the number of tests)."""
+        return len(CORE_KEYS) + len(self.extra)
+
+    @property
+    def total(self) -> int:
+        """The number of tests."""
+        return len(self._outcomes)
+
+    def count(self, outcome: str) -> int:
+        """The number of tests with an outcome ("passed", "failed", ...)."""
+        return self._counts.get(outcome, 0)
+
+    @property
+    def summary(self) -> Dict[str, int]:
+        """The counts per outcome plus ``total`` (and ``collected`` once known)."""
+        summary = {key: value for key, value in self._counts.items() if value}
+        summary["total"] = sum(self._counts.values())
+        if self.collected is not None:
+            summary["collected"] = self.collected
+        return summary
+
+    @property
+    def failed(self) -> bool:
+        """True if any test failed or errored."""
+        return bool(self._counts.get("failed") or self._counts.get("error"))
+
+    def nodeid(self, index: int) -> str:
+        start = self._name_ends[index - 1] if index > 0 else 0
+        return self._names[start:self._name_ends[index]].decode()
+
+    def outcome(self, index: int) -> str:
+        return self._outcome_names[self._outcomes[index]]
+
+    def test_duration(self, index: int) -> float:
+        """Setup + call + teardown duration of a test in seconds."""
+        return self._durations[index]
+
+    def cpu_seconds(self, index: int) -> float:
+        return self._cpu[index]
+
+    def record(self, index: int) -> "TestRecord":
+        """Returns a lazy view of a test's record."""
+        if not -len(self._outcomes) <= index < len(self._outcomes):
+            raise IndexError("test index out of range")
+        return TestRecord(self, index % len(self._outcomes))
+
+    def load(self, index: int) -> dict:
+        """Reads a test's full record from disk."""
+        return json.loads(self._read(index))
+
+    def _read(self, index: int) -> bytes:
+        start = self._record_ends[index - 1] if index > 0 else 0
+        with self._lock:
+            self._spool.seek(start)
+            return self._spool.read(self._record_ends[index] - start)
+
+    def indices(self, *outcomes: str) -> List[int]:
+        """Returns the indices of the tests with one of the outcomes, in run order."""
+        codes = {self._outcome_codes[outcome] for outcome in outcomes if outcome in self._outcome_codes}
+        return [index for index, code in enumerate(self._outcomes) if code in codes] if codes else []
+
+    def heaviest(self, limit: int = 5) -> List["TestRecord"]:
+        """Returns the tests that used the most CPU time, heaviest first."""
+        top = heapq.nlargest(limit, (index for index, cpu in enumerate(self._cpu) if cpu > 0),
+                             key=self._cpu.__getitem__)
+        return [self.record(index) for index in top]
+
+    def __getitem__(self, key: str):
+        if key == "summary":
+            return self.summary
+        if key == "tests":
+            return TestRecords(self)
+        if key == "warnings":
+            return []
+        if key in CORE_KEYS:
+            return getattr(self, key)
+        return self.extra[key]
+
+    def __setitem__(self, key: str, value):
+        if key in ("summary", "tests", "warnings"):
+            raise TypeError(f"{key!r} is derived from the test records and cannot be replaced")
+        if key in CORE_KEYS:
+            setattr(self, key, value)
+        else:
+            self.extra[key] = value
+
+    def __delitem__(self, key: str):
+        if key in CORE_KEYS:
+            raise TypeError(f"{key!r} cannot be removed from test results")
+        del self.extra[key]
+
+    def __iter__(self) -> Iterator[str]:
+        yield from CORE_KEYS
+        yield from self.extra
+
+    def __repr__(self) -> str:
+        return f"TestResults(summary={self.summary}, exitcode={self.exitcode})"
+
+    def to_dict(self) -> dict:
+        """Returns the results as a plain dictionary with every test record loaded."""
+        results = {key: self[key] for key in self}
+        results["tests"] = [self.load(index) for index in range(self.total)]
+        return results
+
+    def close(self):
+        """Deletes the records file; records can no longer be loaded afterwards."""
+        with self._lock:
+            if self._spool is not None:
+                self._spool.close()
+
+
+class TestRecords(Sequence):
+    """The ``tests`` of a TestResults: a sequence of lazily loaded TestRecord views."""
+
+    __slots__ = ("_results",)
+
+    def __init__(self, results: TestResults):
+        self._results = results
+
+    def __len__(self) -> int:
+        return self._results.total
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self._results.record(i) for i in range(*index.indices(len(self)))]
+        return self._results.record(index)
+
+    def __iter__(self) -> Iterator["TestRecord"]:
+        for index in range(len(self)):
+            yield TestRecord(self._results, index)
+
+
+class TestRecord(Mapping):
+    """One test of a TestResults: nodeid and outcome come from memory, other keys load the record."""
+
+    __slots__ = ("_results", "index", "_data")
+
+    def __init__(self, results: TestResults, index: int):
+        self._results = results
+        self.index = index
+        self._data: Optional[dict] = None
+
+    @property
+    def data(self) -> dict:
+        if self._data is None:
+            self._data = self._results.load(self.index)
+        return self._data
+
+    def __getitem__(self, key: str):
+        if key == "nodeid":
+            return self._results.nodeid(self.index)
+        if key == "outcome":
+            return self._results.outcome(self.index)
+        return self.data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.data)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def duration(self) -> float:
+        return self._results.test_duration(self.index)
+
+    @property
+    def cpu_seconds(self) -> float:
+        return self._results.cpu_seconds(self.index)
+
+    def __repr__(self) -> str:
+        return f"TestRecord({self['nodeid']!r}, {self['outcome']!r})"
+
+
+def to_dict(results):
+    """Returns results as a plain (JSON-serializable) dictionary; other values are returned unchanged."""
+    return results.to_dict() if isinstance(results, TestResults) else results
@@ -1,79 +1,506 @@
 import sys
+import contextvars
 import json
 import os
+import shutil
+import signal
+import subprocess
 import tempfile
-from typing import Dict, List, Optional, Union
+import heapq
+import itertools
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Union
 from pathlib import Path
-from .executor import Executor
-from .llm_interface import LLMInterface
+from . import telemetry
+from .executor import Executor, ResourceUsage
+from .pytest_stream import PytestStream
+from .llm_interface import LLMError, LLMInterface, RetryBudget
 from .code_analyzer import CodeAnalyzer
+from .context_builder import DEFAULT_MAX_TOKENS, ContextBuilder
+from .test_history import TestHistory, TestStats
+from .test_results import TestResults, cpu_seconds
+from .impact_analyzer import ImpactAnalyzer
+from .distributed import RUN_TIMEOUT_SECONDS, Coordinator, Shard, spawn_local_workers
+
+# Volatile fragments of error messages that differ between otherwise identical failures
+_VOLATILE_PATTERNS = [
+    (re.compile(r"0x[0-9a-fA-F]+"), "0x?"),
+    (re.compile(r"/tmp/[^\s'\"]*|[A-Za-z]:\\[^\s'\"]*Temp[^\s'\"]*"), "<tmp>"),
+    (re.compile(r"\d+(\.\d+)?"), "N"),
+]
+
+
+def failure_signature(test: dict) -> str:
+    """Returns a normalized signature of a failed test's error.
+
+    Failures raised at the same location with the same message (ignoring
+    addresses, temp paths and numbers) share a signature, so one root cause
+    hitting many tests is analyzed only once.
+    """
+    crash = test.get("call", {}).get("crash", {}) or {}
+    message = crash.get("message", "")
+    for pattern, replacement in _VOLATILE_PATTERNS:
+        message = pattern.sub(replacement, message)
+    return f"{crash.get('path', '')}:{crash.get('lineno', '')}:{message}"
+
+
+def heaviest_tests(results: dict, limit: int = 5) -> List[dict]:
+    """Returns the tests of a results dictionary that used the most CPU time, heaviest first."""
+    if isinstance(results, TestResults):
+        return results.heaviest(limit)
+    tests = [test for test in results.get("tests", []) if test.get("resources")]
+    return sorted(tests, key=cpu_seconds, reverse=True)[:limit]
+
 
 class TestRunner:
     """Handles running unit tests (e.g., using pytest) and parsing results."""
 
     def __init__(self, executor: Executor, llm: Optional[LLMInterface] = None, 
-                 code_analyzer: Optional[CodeAnalyzer] = None):
+                 code_analyzer: Optional[CodeAnalyzer] = None,
+                 history: Optional[TestHistory] = None,
+                 impact: Optional[ImpactAnalyzer] = None,
+                 context_builder: Optional[ContextBuilder] = None):
         """Initializes the TestRunner with an Executor and optional LLM interface.
         
         Args:
             executor: The Executor instance for running commands
             llm: Optional LLMInterface for AI-powered analysis and test generation
             code_analyzer: Optional CodeAnalyzer for code analysis
+            history: Optional TestHistory used to order and balance tests and
+                updated with the results of every run
+            impact: Optional ImpactAnalyzer used by run_affected_tests and
+                refreshed by run_test_coverage(contexts=True)
+            context_builder: Optional ContextBuilder for the code sent to the LLM
+                (by default one with the LLM's context budget when code_analyzer is given)
         """
         self.executor = executor
         self.llm = llm
         self.code_analyzer = code_analyzer
+        self.history = history
+        self.impact = impact
+        if context_builder is None and code_analyzer is not None:
+            context_builder = ContextBuilder(code_analyzer, max_tokens=llm.context_tokens if llm else DEFAULT_MAX_TOKENS)
+        self.context_builder = context_builder
         self.temp_dir = tempfile.TemporaryDirectory()
+        self._run_ids = itertools.count()  # Keeps temporary files unique across concurrent runs
         print("TestRunner initialized.")
 
-    def run_pytest(self, target: str = ".", cwd: str = None, 
-                  pytest_args: Optional[List[str]] = None) -> dict:
-        """Runs pytest on a given target directory or file and parses JSON report.
+    def run_pytest(self, target: Union[str, List[str]] = ".", cwd: str = None, 
+                  pytest_args: Optional[List[str]] = None, workers: int = 1,
+                  fail_fast: bool = False) -> TestResults:
+        """Runs pytest on a given target directory or file and collects its results.
+
+        Results are streamed per test from the bundled pytest plugin while the
+        tests run (see stream_pytest) into a TestResults, a mapping in the
+        pytest-json-report layout (``summary``, ``tests``, ``exitcode``, ...)
+        that keeps each test's captured output on disk until it is inspected.
 
         Args:
-            target: The file or directory to run tests on (defaults to current dir)
+            target: The file or directory to run tests on (defaults to current dir),
+                or a list of files/node IDs
             cwd: The working directory to run pytest from
             pytest_args: Additional pytest arguments (e.g., ['-v', '-m', 'not slow'])
+            workers: Number of parallel pytest processes; 1 runs a single process,
+                0 uses one process per CPU core (see run_pytest_sharded)
+            fail_fast: Stop pytest as soon as the first test fails or errors
 
         Returns:
-            A dictionary containing the parsed test results or an error message
+            The TestResults, with an ``error`` key if pytest did not finish
         """
-        # Create a unique report file in the temp directory
-        report_file = os.path.join(self.temp_dir.name, f"pytest_report_{os.getpid()}.json")
-        
-        # Base pytest command
-        command = [
-            sys.executable, "-m", "pytest", target,
-            f"--json-report-file={report_file}",
-            "--disable-warnings", "-qq"
-        ]
-        
-        # Add any additional pytest arguments
-        if pytest_args:
-            command.extend(pytest_args)
+        if workers != 1:
+            return self.run_pytest_sharded(target, cwd=cwd, pytest_args=pytest_args,
+                                           workers=workers, fail_fast=fail_fast)
 
-        print(f"Running pytest on target: '{target}'...")
-        return_code, stdout, stderr = self.executor.run_command(command, cwd=cwd)
+        # With a history, run recent failures and slow tests first
+        targets = [target] if isinstance(target, str) else list(target)
+        if self.history:
+            rootdir_arg = f"--rootdir={os.path.abspath(cwd or os.getcwd())}"
+            nodeids = self.collect_nodeids(target, cwd=cwd, pytest_args=[rootdir_arg] + list(pytest_args or []))
+            if nodeids:
+                targets = self.history.order(nodeids)
+                pytest_args = [rootdir_arg] + list(pytest_args or [])
 
-        if stdout:
-            print("Pytest Stdout:")
-            print(stdout)
-        if stderr:
-            print("Pytest Stderr:")
-            print(stderr)
+        if len(targets) == 1:
+            print(f"Running pytest on target: '{targets[0]}'...")
+        else:
+            print(f"Running pytest on {len(targets)} targets...")
+        # Show pytest's progress live; only a bounded head/tail of its output is kept
+        stream = self.stream_pytest(targets, cwd=cwd, pytest_args=pytest_args, echo=True)
+        results = self._collect_results(stream, cwd, fail_fast=fail_fast)
+        if "error" not in results:
+            print(f"Collected results of {results.total} tests.")
+            self._print_resources(results)
+        return self._record_history(results)
 
-        try:
-            with open(report_file, 'r') as f:
-                results = json.load(f)
-            print(f"Successfully parsed test report: {report_file}")
+    def _print_resources(self, results: dict):
+        """Prints the resources pytest used and the tests that used the most CPU and memory."""
+        if results.get("resources"):
+            print(f"Resources: {ResourceUsage(**results['resources']).describe()}")
+        heavy = [test for test in heaviest_tests(results, limit=3) if cpu_seconds(test) >= 0.01]
+        if heavy:
+            print("Heaviest tests: " + ", ".join(
+                f"{test['nodeid']} ({cpu_seconds(test):.2f}s cpu, "
+                f"+{test['resources'].get('rss_growth_kb', 0) / 1024:.1f} MB peak RSS)" for test in heavy))
+
+    def stream_pytest(self, target: Union[str, List[str]] = ".", cwd: str = None,
+                      pytest_args: Optional[List[str]] = None, echo: bool = False,
+                      timeout: Optional[float] = None) -> PytestStream:
+        """Starts pytest and returns a PytestStream yielding each test result as it finishes.
+
+        Args:
+            target: The file or directory (or list of files/node IDs) to run tests on
+            cwd: The working directory to run pytest from
+            pytest_args: Additional pytest arguments
+            echo: Print pytest's own output live
+            timeout: Kill pytest after this many seconds (default: the executor's timeout)
+
+        Returns:
+            A PytestStream; iterate it to receive test records, stop it to kill pytest
+        """
+        args = [*self._target_args(target), "--disable-warnings", "-qq", *(pytest_args or [])]
+        return PytestStream(self.executor, args, cwd=cwd, echo=echo, timeout=timeout)
+
+    def _collect_results(self, stream: PytestStream, cwd: Optional[str], fail_fast: bool = False,
+                         on_fail_fast: Optional[Callable[[], None]] = None) -> TestResults:
+        """Consumes a PytestStream into a TestResults, spooling each record to disk as it arrives.
+
+        Args:
+            stream: The running pytest stream
+            cwd: The working directory pytest runs in (reported as ``root``)
+            fail_fast: Stop the stream at the first failed or errored test
+            on_fail_fast: Called when fail_fast stops the stream (e.g. to stop other shards)
+        """
+        results = TestResults(stream.created, root=os.path.abspath(cwd or os.getcwd()), spool_dir=self.temp_dir.name)
+        with telemetry.span("test_runner.execute", pid=stream.process.pid) as stage:
+            records = iter(stream)
+            try:
+                for test in records:
+                    results.append(test)
+                    if fail_fast and test.get("outcome") in ("failed", "error"):
+                        stream.stop()
+                        if on_fail_fast:
+                            on_fail_fast()
+                        break
+            finally:
+                records.close()
+            stage.set_attribute("tests", results.total)
+            stage.set_attribute("exit_code", stream.exitcode if stream.finished else stream.returncode)
+        telemetry.observe("ai_agent_stage_duration_seconds", stream.parse_seconds, stage="test_runner.parse_results")
+        for outcome, number in stream.summary.items():
+            if outcome not in ("total", "collected"):
+                telemetry.count("ai_agent_tests_total", number, outcome=outcome)
+
+        results.resources = stream.process.usage.to_dict() if stream.process.usage else None
+        if not stream.finished and not stream.stopped:
+            process = stream.process
+            if process.timed_out:
+                error_msg = f"Pytest timed out after {process.timeout}s"
+            else:
+                error_msg = self._handle_missing_report(process.returncode, process.stdout, process.stderr)
+            results.update(error=error_msg, exit_code=process.returncode, stdout=process.stdout,
+                           stderr=process.stderr)
             return results
-        except FileNotFoundError:
-            error_msg = self._handle_missing_report(return_code, stdout, stderr)
-            return {"error": error_msg, "exit_code": return_code, "stdout": stdout, "stderr": stderr}
-        except json.JSONDecodeError as e:
-            return {"error": "Failed to parse JSON report", "details": str(e), "exit_code": return_code}
-        except Exception as e:
-            return {"error": "Unexpected error handling report", "details": str(e)}
+
+        if stream.finished:
+            results.exitcode, results.duration = stream.exitcode, stream.duration
+        else:
+            results.exitcode, results.duration = (1 if results.failed else 2), time.time() - stream.created
+        results.collected = stream.collected
+        results.collectors = stream.collect_errors
+        if stream.stopped:
+            results["stopped_early"] = True
+        return results
+
+    def run_pytest_sharded(self, target: Union[str, List[str]] = ".", cwd: str = None,
+                           pytest_args: Optional[List[str]] = None, workers: int = 0,
+                           fail_fast: bool = False) -> dict:
+        """Runs pytest split across several parallel worker processes.
+
+        Node IDs are collected once, split into one shard per worker and each
+        shard is run in its own pytest subprocess through the Executor. The
+        per-shard results are merged into a single results dictionary with
+        the same ``summary`` and ``tests`` keys as run_pytest.
+
+        Args:
+            target: The file or directory (or list of files/node IDs) to run tests on
+            cwd: The working directory to run pytest from
+            pytest_args: Additional pytest arguments passed to every shard
+            workers: Number of shards to run in parallel (0 means os.cpu_count())
+            fail_fast: Stop all shards as soon as any test fails or errors
+
+        Returns:
+            A dictionary containing the merged test results or an error message
+        """
+        workers = workers if workers > 0 else (os.cpu_count() or 1)
+        rootdir = os.path.abspath(cwd or os.getcwd())
+        shard_args = [f"--rootdir={rootdir}"] + list(pytest_args or [])
+
+        nodeids = self.collect_nodeids(target, cwd=cwd, pytest_args=shard_args)
+        if not nodeids or workers == 1:
+            # Nothing to split (or collection failed): a single run gives the usual report/error
+            return self.run_pytest(target, cwd=cwd, pytest_args=pytest_args, workers=1, fail_fast=fail_fast)
+
+        if self.history:
+            shards = self._balance_shards(nodeids, workers)
+        else:
+            shards = self._split_shards(nodeids, workers)
+        print(f"Running {len(nodeids)} tests in {len(shards)} shards...")
+
+        start = time.monotonic()
+        streams: List[PytestStream] = []
+        stop_all = threading.Event()
+        with telemetry.span("test_runner.run_shards", shards=len(shards), tests=len(nodeids)):
+            with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+                # Each shard runs in a copy of the current context, so its spans nest under this one
+                futures = [
+                    pool.submit(contextvars.copy_context().run, self._run_shard, index, shard, cwd,
+                                shard_args, fail_fast, streams, stop_all)
+                    for index, shard in enumerate(shards)
+                ]
+                reports = [future.result() for future in futures]
+
+        results = self._merge_reports(reports, time.monotonic() - start)
+        self._print_resources(results)
+        return self._record_history(results)
+
+    def run_pytest_distributed(self, target: Union[str, List[str]] = ".", cwd: str = None,
+                               pytest_args: Optional[List[str]] = None, address: Optional[str] = None,
+                               local_workers: int = 0, shards: Optional[int] = None,
+                               fail_fast: bool = False, timeout: Optional[float] = RUN_TIMEOUT_SECONDS) -> dict:
+        """Runs pytest across worker processes, possibly on other hosts, through a Coordinator.
+
+        Node IDs are collected here and split into shards (balanced on the
+        historical durations when a history is available). Workers started
+        with ``python -m src.main --worker ADDRESS`` from a checkout of the
+        same project pull shards one at a time; shards of workers that die
+        are re-queued. The reports are merged like run_pytest_sharded's.
+
+        Args:
+            target: The file or directory (or list of files/node IDs) to run tests on
+            cwd: The working directory to collect tests in
+            pytest_args: Additional pytest arguments passed to every shard
+            address: ``host:port`` or Unix socket path to listen on (default: a temporary Unix socket)
+            local_workers: Number of worker processes to start on this machine
+            shards: Number of shards (default: four per local worker, at least 8)
+            fail_fast: Stop handing out shards once a test failed
+            timeout: Give up on shards not finished after this many seconds (None waits forever)
+
+        Returns:
+            A dictionary containing the merged test results or an error message
+        """
+        rootdir = os.path.abspath(cwd or os.getcwd())
+        nodeids = self.collect_nodeids(target, cwd=cwd, pytest_args=[f"--rootdir={rootdir}"] + list(pytest_args or []))
+        if not nodeids:
+            return self.run_pytest(target, cwd=cwd, pytest_args=pytest_args, workers=1, fail_fast=fail_fast)
+
+        count = shards or max(8, 4 * local_workers)
+        if self.history:
+            stats = self.history.stats(nodeids)
+            batches = self._balance_shards(nodeids, count, stats=stats)
+            durations = self.history.durations(nodeids, stats=stats)
+        else:
+            batches, durations = self._split_shards(nodeids, count), {}
+        work = [Shard(index, batch, sum(durations.get(nodeid, 0.0) for nodeid in batch))
+                for index, batch in enumerate(batches)]
+
+        temp_dir = None
+        if address is None:
+            temp_dir = tempfile.mkdtemp(prefix="ai-agent-")
+            address = os.path.join(temp_dir, "coordinator.sock")
+        coordinator = Coordinator(address, work, pytest_args=pytest_args, fail_fast=fail_fast)
+        workers = []
+        start = time.monotonic()
+        try:
+            with telemetry.span("test_runner.run_distributed", shards=len(work), tests=len(nodeids)):
+                coordinator.start()
+                workers = spawn_local_workers(coordinator.address, local_workers, cwd=rootdir,
+                                              token=coordinator.token)
+                print(f"Running {len(nodeids)} tests in {len(work)} shards"
+                      + (f" ({local_workers} local workers)..." if local_workers else " on connecting workers..."))
+                reports = coordinator.wait(timeout, local_workers=workers)
+        finally:
+            coordinator.close()
+            for worker in workers:
+                try:
+                    worker.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    worker.kill()
+            if temp_dir:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+        for report in reports:
+            if "tests" in report:
+                report["root"] = rootdir  # Workers report their own checkout
+        results = self._merge_reports(reports, time.monotonic() - start)
+        results["workers"] = dict(coordinator.workers)
+        results["requeued_shards"] = coordinator.requeued
+        self._print_resources(results)
+        return self._record_history(results)
+
+    def collect_nodeids(self, target: Union[str, List[str]] = ".", cwd: str = None,
+                        pytest_args: Optional[List[str]] = None) -> List[str]:
+        """Collects the test node IDs for a target without running them.
+
+        Args:
+            target: The file or directory (or list of files/node IDs) to collect tests from
+            cwd: The working directory to run pytest from
+            pytest_args: Additional pytest arguments (e.g., marker selection)
+
+        Returns:
+            The collected node IDs in collection order (empty if collection failed)
+        """
+        args = ["-m", "pytest", *self._target_args(target), "--collect-only", "-q", "--disable-warnings"]
+        if pytest_args:
+            args.extend(pytest_args)
+
+        # Parse node IDs as they are printed instead of buffering the whole listing
+        with telemetry.span("test_runner.collect") as stage:
+            process = self.executor.stream_python(args, cwd=cwd)
+            nodeids = [line.strip() for stream, line in process if stream == "stdout" and "::" in line]
+            stage.set_attribute("tests", len(nodeids))
+        if process.returncode not in (0, 5):
+            print(f"Test collection failed (exit code: {process.returncode})")
+            return []
+        return nodeids
+
+    def _target_args(self, target: Union[str, List[str]]) -> List[str]:
+        """Returns the pytest arguments naming the targets.
+
+        A list of targets (e.g. every node ID of a run or shard) can exceed the
+        OS limit on the length of a command line, so it is written one per line
+        to a file in the temp dir and passed as pytest's ``@argsfile``.
+        """
+        if isinstance(target, str):
+            return [target]
+        targets = list(target)
+        if len(targets) <= 1:
+            return targets
+        fd, path = tempfile.mkstemp(suffix=".args", dir=self.temp_dir.name)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write("".join(f"{nodeid}\n" for nodeid in targets))
+        return [f"@{path}"]
+
+    def _split_shards(self, nodeids: List[str], workers: int) -> List[List[str]]:
+        """Splits node IDs into at most ``workers`` contiguous, similarly sized shards.
+
+        Contiguous slices keep tests from the same module together so that
+        module- and class-scoped fixtures are set up once per shard.
+        """
+        count = min(workers, len(nodeids))
+        size, extra = divmod(len(nodeids), count)
+        shards, start = [], 0
+        for index in range(count):
+            end = start + size + (1 if index < extra else 0)
+            shards.append(nodeids[start:end])
+            start = end
+        return shards
+
+    def _balance_shards(self, nodeids: List[str], workers: int,
+                        stats: Optional[Dict[str, TestStats]] = None) -> List[List[str]]:
+        """Splits node IDs into shards with similar expected total durations.
+
+        Uses the longest-processing-time-first heuristic on the historical
+        durations, then orders every shard with TestHistory.order so each
+        worker starts with its recent failures and slowest tests.
+        """
+        if stats is None:
+            stats = self.history.stats(nodeids)  # One query for the whole run, shared by every shard
+        durations = self.history.durations(nodeids, stats=stats)
+        count = min(workers, len(nodeids))
+        heap = [(0.0, index) for index in range(count)]
+        shards: List[List[str]] = [[] for _ in range(count)]
+        for nodeid in sorted(nodeids, key=lambda n: durations[n], reverse=True):
+            total, index = heapq.heappop(heap)
+            shards[index].append(nodeid)
+            heapq.heappush(heap, (total + durations[nodeid], index))
+        return [self.history.order(shard, stats=stats) for shard in shards if shard]
+
+    def _record_history(self, results: dict) -> dict:
+        """Stores a run in the test history and flags flaky tests in the results."""
+        if self.history and "tests" in results:
+            self.history.record(results)
+            flaky = self.history.flaky_tests(test.get("nodeid") for test in results["tests"])
+            results["flaky"] = flaky
+            if flaky:
+                print(f"Flaky tests detected ({len(flaky)}): {', '.join(flaky[:10])}")
+        return results
+
+    def _run_shard(self, index: int, nodeids: List[str], cwd: Optional[str],
+                   pytest_args: List[str], fail_fast: bool = False,
+                   streams: Optional[List[PytestStream]] = None,
+                   stop_all: Optional[threading.Event] = None) -> dict:
+        """Runs a single shard of node IDs and returns its results dictionary.
+
+        With fail_fast, the first failure in any shard stops every shard
+        registered in ``streams``; shards not started yet are skipped.
+        """
+        if stop_all is not None and stop_all.is_set():
+            return {"created": time.time(), "exitcode": 2, "root": os.path.abspath(cwd or os.getcwd()),
+                    "summary": {"total": 0}, "tests": [], "stopped_early": True}
+        stream = self.stream_pytest(nodeids, cwd=cwd, pytest_args=pytest_args, echo=False)
+        if streams is not None:
+            streams.append(stream)
+
+        def stop_other_shards():
+            stop_all.set()
+            for other in list(streams):
+                other.stop()
+
+        on_fail_fast = stop_other_shards if streams is not None and stop_all is not None else None
+        return self._collect_results(stream, cwd, fail_fast=fail_fast, on_fail_fast=on_fail_fast)
+
+    def _merge_reports(self, reports: List[dict], duration: float) -> Union[TestResults, dict]:
+        """Merges per-shard results into one TestResults.
+
+        Args:
+            reports: The results (TestResults or dictionaries) or error results of each shard
+            duration: Wall-clock duration of the whole sharded run in seconds
+
+        Returns:
+            A single TestResults, or an error dictionary if every shard failed
+        """
+        ok = [report for report in reports if "error" not in report]
+        failed_shards = [report for report in reports if "error" in report]
+        if not ok:
+            return {"error": "All test shards failed", "shard_errors": failed_shards}
+
+        exit_codes = [report.get("exitcode", 0) for report in ok]
+        exit_codes += [report.get("exit_code", 1) for report in failed_shards]
+        real_failures = [code for code in exit_codes if code not in (0, 5)]
+        if real_failures:
+            exitcode = 1 if 1 in real_failures else real_failures[0]
+        else:
+            exitcode = 5 if all(code == 5 for code in exit_codes) else 0
+
+        merged = TestResults(min(report.get("created") or time.time() for report in ok), duration, exitcode,
+                             ok[0].get("root"), spool_dir=self.temp_dir.name)
+        for report in ok:
+            merged.extend(report)  # Records of spooled shards are copied file to file
+            if isinstance(report, TestResults):
+                report.close()
+        merged.collectors = [c for report in ok for c in report.get("collectors", [])]
+        merged.resources = self._merge_resources(ok, duration)
+        merged["shards"] = len(reports)
+        if failed_shards:
+            merged["shard_errors"] = failed_shards
+        if any(report.get("stopped_early") for report in ok):
+            merged["stopped_early"] = True
+        return merged
+
+    def _merge_resources(self, reports: List[dict], duration: float) -> Optional[dict]:
+        """Adds up the CPU time of shard processes; peak RSS is the largest shard's."""
+        usages = [report["resources"] for report in reports if report.get("resources")]
+        if not usages:
+            return None
+        def total(key):
+            values = [usage[key] for usage in usages if usage.get(key) is not None]
+            return sum(values) if values else None
+        peaks = [usage["max_rss_kb"] for usage in usages if usage.get("max_rss_kb") is not None]
+        return ResourceUsage(duration, total("user_seconds"), total("system_seconds"),
+                             max(peaks) if peaks else None).to_dict()
 
     def _handle_missing_report(self, return_code: int, stdout: str, stderr: str) -> str:
         """Handles cases where the pytest report is missing.
@@ -94,41 +521,97 @@ class TestRunner:
             return "Internal pytest error"
         elif return_code == 4:
             return "Pytest was interrupted by user"
+        elif return_code is not None and return_code < 0:
+            try:
+                name = signal.Signals(-return_code).name
+            except ValueError:
+                name = str(-return_code)
+            return f"Pytest was killed by signal {name} (crash, out of memory or CPU limit)"
         else:
             return f"Unknown error (exit code: {return_code})"
 
-    def analyze_failures(self, test_results: dict, file_path: Optional[str] = None) -> dict:
+    def analyze_failures(self, test_results: dict, file_path: Optional[str] = None,
+                         max_concurrency: int = 8, retry_budget: int = 10) -> dict:
         """Analyzes test failures using LLM if available.
+
+        Failures are grouped by failure_signature so each distinct error is
+        sent to the LLM once; the distinct requests run concurrently and
+        every failed test receives the analysis of its group.
         
         Args:
             test_results: The parsed pytest results
             file_path: Optional path to the file being tested
+            max_concurrency: Maximum number of LLM requests in flight
+            retry_budget: Total number of retries of transient LLM errors for the whole batch
             
         Returns:
             Dictionary containing analysis results
         """
         if not self.llm:
             return {"error": "LLM not available for analysis"}
-            
-        failures = test_results.get("tests", [])
+
+        if isinstance(test_results, TestResults):
+            # Only the failed tests' records are loaded from disk
+            failed = [test_results.record(index) for index in test_results.indices("failed")]
+        else:
+            failed = [test for test in test_results.get("tests", []) if test.get("outcome") == "failed"]
+        groups: Dict[str, List[dict]] = {}
+        for test in failed:
+            groups.setdefault(failure_signature(test), []).append(test)
+        if not groups:
+            return {"analysis": [], "distinct_failures": 0}
+
+        failed_count = sum(len(tests) for tests in groups.values())
+        print(f"Analyzing {failed_count} failed tests ({len(groups)} distinct errors)...")
+        budget = RetryBudget(retry_budget)
+
+        def analyze_group(tests: List[dict]) -> str:
+            representative = tests[0]
+            crash = representative.get("call", {}).get("crash", {}) or {}
+            error_msg = crash.get("message", "")
+            code_context = self._failure_context(file_path, representative.get("nodeid", ""), crash) if file_path else None
+            return self._analyze_with_retries(file_path or "", error_msg, code_context, budget)
+
+        with telemetry.span("test_runner.analyze_failures", failures=failed_count, distinct=len(groups)):
+            with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(groups)))) as pool:
+                futures = [pool.submit(contextvars.copy_context().run, analyze_group, tests)
+                           for tests in groups.values()]
+                analyses = dict(zip(groups, [future.result() for future in futures]))
+
         analysis_results = []
-        
-        for test in failures:
-            if test.get("outcome") == "failed":
-                error_msg = test.get("call", {}).get("crash", {}).get("message", "")
-                if file_path and self.code_analyzer:
-                    code_context = self.code_analyzer.get_code_context(file_path, test.get("nodeid", ""))
-                else:
-                    code_context = None
-                    
-                analysis = self.llm.analyze_error(file_path or "", error_msg, code_context)
+        for signature, tests in groups.items():
+            for test in tests:
                 analysis_results.append({
                     "test_name": test.get("nodeid"),
-                    "error": error_msg,
-                    "analysis": analysis
+                    "error": test.get("call", {}).get("crash", {}).get("message", ""),
+                    "analysis": analyses[signature],
+                    "signature": signature,
                 })
-                
-        return {"analysis": analysis_results}
+        return {"analysis": analysis_results, "distinct_failures": len(groups)}
+
+    def _failure_context(self, file_path: str, nodeid: str, crash: dict) -> Optional[str]:
+        """Returns the budgeted code context of a failure in file_path.
+
+        The crash location is used when it lies in file_path; otherwise the
+        symbol the test targets (see CodeAnalyzer.find_tested_symbol).
+        """
+        if not self.context_builder:
+            return None
+        crash_path, lineno = crash.get("path"), crash.get("lineno")
+        if crash_path and lineno and os.path.abspath(crash_path) == os.path.abspath(file_path):
+            context = self.context_builder.for_line(file_path, lineno)
+            if context:
+                return context
+        qualname = self.code_analyzer.find_tested_symbol(file_path, nodeid)
+        return self.context_builder.for_symbol(file_path, qualname) if qualname else None
+
+    def _analyze_with_retries(self, file_path: str, error_msg: str, code_context: Optional[str],
+                              budget: RetryBudget) -> str:
+        """Calls the LLM, retrying transient errors with backoff while the shared budget lasts."""
+        try:
+            return budget.call(self.llm.analyze_error, file_path, error_msg, code_context)
+        except LLMError as e:
+            return f"LLM analysis failed: {e}"
 
     def generate_tests(self, file_path: str, test_file_path: Optional[str] = None) -> dict:
         """Generates test cases for a given file using LLM if available.
@@ -144,9 +627,11 @@ class TestRunner:
             return {"error": "LLM not available for test generation"}
             
         try:
-            with open(file_path, 'r') as f:
-                code_content = f.read()
-                
+            code_content = self.context_builder.for_module(file_path) if self.context_builder else None
+            if code_content is None:
+                with open(file_path, 'r') as f:
+                    code_content = f.read()
+
             suggested_tests = self.llm.suggest_tests(file_path, code_content)
             
             if test_file_path:
@@ -162,38 +647,142 @@ class TestRunner:
         except Exception as e:
             return {"error": f"Failed to generate tests: {str(e)}"}
 
-    def run_test_coverage(self, target: str = ".", cwd: str = None) -> dict:
-        """Runs pytest with coverage reporting.
-        
+    def run_affected_tests(self, changed_files: List[str], target: str = ".", cwd: str = None,
+                           pytest_args: Optional[List[str]] = None, workers: int = 1,
+                           fail_fast: bool = False) -> dict:
+        """Runs only the tests affected by a set of changed files.
+
+        The selection comes from the ImpactAnalyzer (per-test coverage map and
+        CodeAnalyzer import graph). The full target is run when the dependency
+        data is stale or a change cannot be mapped to tests.
+
+        Args:
+            changed_files: Changed file paths, absolute or relative to cwd
+            target: The file or directory the selection is restricted to
+            cwd: The working directory (project root) to run pytest from
+            pytest_args: Additional pytest arguments
+            workers: Number of parallel pytest processes (see run_pytest)
+            fail_fast: Stop at the first failing test (see run_pytest)
+
+        Returns:
+            The run_pytest results plus a ``selected`` key with the tests run
+            (None when the full suite was run)
+        """
+        root = os.path.abspath(cwd or os.getcwd())
+        if not self.impact:
+            self.impact = ImpactAnalyzer(self.code_analyzer or CodeAnalyzer())
+
+        selection = self.impact.select(changed_files, root)
+        if selection is not None and target not in (".", ""):
+            scope = os.path.join(root, target)
+            selection = [arg for arg in selection
+                         if os.path.commonpath([scope, os.path.join(root, arg.split("::")[0])]) == scope]
+
+        if selection is None:
+            results = self.run_pytest(target, cwd=cwd, pytest_args=pytest_args, workers=workers,
+                                      fail_fast=fail_fast)
+        elif not selection:
+            print("No tests affected by the changed files.")
+            results = {"exitcode": 5, "summary": {"total": 0, "collected": 0}, "tests": []}
+        else:
+            print(f"Selected {len(selection)} affected test targets.")
+            results = self.run_pytest(selection, cwd=cwd, pytest_args=pytest_args, workers=workers,
+                                      fail_fast=fail_fast)
+        results["selected"] = selection
+        return results
+
+    def run_test_coverage(self, target: str = ".", cwd: str = None, contexts: bool = False,
+                          source: Optional[str] = None, workers: int = 1) -> dict:
+        """Runs pytest with coverage reporting, optionally split across parallel shards.
+
+        Every shard writes its own coverage.py data file. With contexts and an
+        ImpactAnalyzer that keeps a CoverageIndex, the per-test contexts are
+        folded straight from those files into the index and no JSON report is
+        built. Otherwise the files are combined with ``coverage combine`` and
+        the usual JSON report is returned.
+
         Args:
             target: The file or directory to run tests on
             cwd: The working directory to run pytest from
-            
+            contexts: Record which test covered each line (per-test contexts)
+                and refresh the ImpactAnalyzer coverage data from it
+            source: The code to measure (defaults to target)
+            workers: Number of parallel pytest processes (0 uses one per CPU core)
+
         Returns:
-            Dictionary containing coverage results
+            Dictionary containing coverage results (``coverage`` is the JSON
+            report, absent when the run only refreshed the coverage index)
         """
-        coverage_file = os.path.join(self.temp_dir.name, f"coverage_{os.getpid()}.json")
-        
-        command = [
-            sys.executable, "-m", "pytest", target,
-            "--cov=" + target,
-            f"--cov-report=json:{coverage_file}",
-            "--disable-warnings"
-        ]
-        
-        return_code, stdout, stderr = self.executor.run_command(command, cwd=cwd)
-        
+        workers = workers if workers > 0 else (os.cpu_count() or 1)
+        root = os.path.abspath(cwd or os.getcwd())
+        run_dir = tempfile.mkdtemp(prefix=f"coverage_{next(self._run_ids)}_", dir=self.temp_dir.name)
+        args = ["--cov=" + (source or target), "--cov-report=", "--disable-warnings", f"--rootdir={root}"]
+        if contexts:
+            args.append("--cov-context=test")
+
+        shards = [[target]]
+        if workers > 1:
+            nodeids = self.collect_nodeids(target, cwd=cwd, pytest_args=[f"--rootdir={root}"])
+            if len(nodeids) > 1:
+                shards = self._balance_shards(nodeids, workers) if self.history else self._split_shards(nodeids, workers)
+
+        started_at = time.time()
+        with telemetry.span("test_runner.coverage", target=target, contexts=contexts, shards=len(shards)):
+            with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+                futures = [
+                    pool.submit(contextvars.copy_context().run, self._run_coverage_shard, shard, cwd, args,
+                                os.path.join(run_dir, f".coverage.shard{index}"))
+                    for index, shard in enumerate(shards)
+                ]
+                processes = [future.result() for future in futures]
+        data_files = [os.path.join(run_dir, f".coverage.shard{index}") for index in range(len(shards))]
+        data_files = [path for path in data_files if os.path.exists(path)]
+        exit_codes = [process.returncode for process in processes]
+        return_code = next((code for code in exit_codes if code not in (0, 5)), exit_codes[0])
+        outputs = {
+            "exit_code": return_code,
+            "stdout": "".join(process.stdout for process in processes),
+            "stderr": "".join(process.stderr for process in processes),
+            "data_files": data_files,
+        }
+        if not data_files:
+            return {"error": "Failed to get coverage: no coverage data was written", **outputs}
+
+        if contexts and self.impact and self.impact.coverage_index is not None:
+            self.impact.update_coverage_files(data_files, root, built_at=started_at)
+            return {"index": self.impact.coverage_index.db_path, **outputs}
+
         try:
-            with open(coverage_file, 'r') as f:
-                coverage_data = json.load(f)
-            return {
-                "coverage": coverage_data,
-                "exit_code": return_code,
-                "stdout": stdout,
-                "stderr": stderr
-            }
+            coverage_data = self._coverage_report(data_files, run_dir, cwd, contexts)
+            if contexts and self.impact:
+                self.impact.update_coverage(coverage_data, root, built_at=started_at)
+            return {"coverage": coverage_data, **outputs}
         except Exception as e:
-            return {"error": f"Failed to get coverage: {str(e)}"}
+            return {"error": f"Failed to get coverage: {str(e)}", **outputs}
+
+    def _run_coverage_shard(self, targets: List[str], cwd: Optional[str], pytest_args: List[str], data_file: str):
+        """Runs one pytest process under coverage, writing its data to data_file."""
+        command = [sys.executable, "-m", "pytest", *targets, *pytest_args]
+        process = self.executor.stream_command(command, cwd=cwd, env={"COVERAGE_FILE": data_file})
+        process.wait()
+        return process
+
+    def _coverage_report(self, data_files: List[str], run_dir: str, cwd: Optional[str], contexts: bool) -> dict:
+        """Combines per-shard data files and returns coverage.py's JSON report."""
+        combined = os.path.join(run_dir, ".coverage")
+        report_file = os.path.join(run_dir, "coverage.json")
+        commands = [[sys.executable, "-m", "coverage", "combine", "--keep", f"--data-file={combined}", *data_files],
+                    [sys.executable, "-m", "coverage", "json", f"--data-file={combined}", "-o", report_file]]
+        if contexts:
+            # pytest-cov records "nodeid|phase" contexts; the JSON report only includes them if asked to
+            commands[1].append("--show-contexts")
+        for command in commands:
+            process = self.executor.stream_command(command, cwd=cwd)
+            process.wait()
+            if process.returncode != 0:
+                raise RuntimeError(f"{' '.join(command[2:4])} failed: {process.stderr.strip() or process.stdout.strip()}")
+        with open(report_file, 'r') as f:
+            return json.load(f)
 
     def cleanup(self):
         """Cleans up temporary files and directories."""
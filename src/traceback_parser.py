@@ -0,0 +1,127 @@
+import os
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+TRACEBACK_HEADER = "Traceback (most recent call last):"
+# Sentences separating the tracebacks of chained exceptions
+CHAIN_MARKERS = (
+    "The above exception was the direct cause of the following exception:",
+    "During handling of the above exception, another exception occurred:",
+)
+
+# '  File "path", line 12, in func' (no ", in" for the location of a SyntaxError)
+_FRAME_RE = re.compile(r'^\s*File "(?P<path>[^"]+)", line (?P<lineno>\d+)(?:, in (?P<function>.+))?$')
+# '  [Previous line repeated 996 more times]'
+_REPEATED_RE = re.compile(r"^\s*\[Previous line repeated (\d+) more times?\]$")
+# 'pkg.module.ErrorType: message' or 'ErrorType'
+_EXCEPTION_RE = re.compile(r"^(?P<type>[A-Za-z_][\w.]*)(?::\s?(?P<message>.*))?$")
+
+
+@dataclass
+class Frame:
+    """One ``File "...", line N, in func`` entry of a traceback."""
+    path: str
+    lineno: int
+    function: Optional[str] = None  # None for the location line of a SyntaxError
+    line: Optional[str] = None  # The source line Python printed, stripped
+    repeated: int = 0  # How many more times this frame repeated (recursion)
+
+
+@dataclass
+class ParsedTraceback:
+    """A Python traceback: its frames (outermost first) and the raised exception.
+
+    ``chain`` holds the tracebacks of the exceptions this one was raised
+    from or while handling, oldest first.
+    """
+    exc_type: str
+    message: str
+    frames: List[Frame] = field(default_factory=list)
+    chain: List["ParsedTraceback"] = field(default_factory=list)
+
+    def project_frames(self, roots: List[str]) -> List[Frame]:
+        """Returns the frames whose file lies under one of the roots (and not in an installed package)."""
+        return [frame for frame in self.frames if is_project_file(frame.path, roots)]
+
+
+def is_project_file(path: str, roots: List[str]) -> bool:
+    """True if path is a real file under one of the roots and not part of an installed package."""
+    if path.startswith("<") or "site-packages" in path or "dist-packages" in path:
+        return False
+    path = os.path.abspath(path)
+    return any(path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+               for root in map(os.path.abspath, roots))
+
+
+def parse_traceback(output: str) -> Optional[ParsedTraceback]:
+    """Parses the last (possibly chained) Python traceback in a process' stderr.
+
+    Output before the first traceback (logging, warnings) is skipped without
+    being split into lines, so large outputs with a traceback at the end are
+    cheap to parse.
+
+    Args:
+        output: The stderr of a Python process
+
+    Returns:
+        The final exception's traceback with earlier chained tracebacks in
+        ``chain``, or None if the output contains no traceback
+    """
+    start = output.find(TRACEBACK_HEADER)
+    if start == -1:
+        return None
+    lines = output[start:].splitlines()
+
+    tracebacks: List[ParsedTraceback] = []
+    index = 0
+    while index < len(lines):
+        if lines[index] != TRACEBACK_HEADER:
+            index += 1
+            continue
+        traceback, index = _parse_block(lines, index + 1)
+        if traceback is not None:
+            tracebacks.append(traceback)
+    if not tracebacks:
+        return None
+    final = tracebacks[-1]
+    final.chain = tracebacks[:-1]
+    return final
+
+
+def _parse_block(lines: List[str], index: int):
+    """Parses frames and the exception line of one traceback starting at lines[index].
+
+    Returns:
+        (ParsedTraceback or None if the block is truncated, index after the block)
+    """
+    frames: List[Frame] = []
+    while index < len(lines):
+        line = lines[index]
+        match = _FRAME_RE.match(line)
+        if match:
+            frames.append(Frame(match.group("path"), int(match.group("lineno")), match.group("function")))
+        elif not line or not line[0].isspace():
+            break  # The exception line
+        elif frames:
+            repeated = _REPEATED_RE.match(line)
+            if repeated:
+                frames[-1].repeated = int(repeated.group(1))
+            elif frames[-1].line is None and line.strip(" ~^"):  # Not a caret marker line
+                frames[-1].line = line.strip()
+        index += 1
+
+    if index >= len(lines):
+        return None, index
+    match = _EXCEPTION_RE.match(lines[index])
+    if match is None:
+        return None, index + 1
+    message_lines = [match.group("message") or ""]
+    index += 1
+    while index < len(lines) and lines[index] and lines[index] != TRACEBACK_HEADER:
+        message_lines.append(lines[index])
+        index += 1
+    # Skip the blank line and sentence linking this exception to the next one
+    while index < len(lines) and (not lines[index] or lines[index] in CHAIN_MARKERS):
+        index += 1
+    return ParsedTraceback(match.group("type"), "\n".join(message_lines), frames), index
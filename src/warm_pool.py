@@ -0,0 +1,291 @@
+import array
+import json
+import os
+import select
+import shutil
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+from .executor import ResourceLimits, StreamingProcess
+from .pytest_stream import plugin_env
+
+FORKSERVER_MODULE = "ai_agent_forkserver"
+# Length prefix of a request (see plugins/ai_agent_forkserver.py)
+HEADER = struct.Struct("!Q")
+# How long a fork server may take to import its modules
+STARTUP_TIMEOUT_SECONDS = 60.0
+
+
+class WarmChild:
+    """Popen-like handle of a run forked by a ForkServer.
+
+    The run is not our child: its exit code arrives over the server
+    connection, and it is killed through its process group.
+    """
+
+    def __init__(self, conn: socket.socket, stdout, stderr):
+        self.conn = conn
+        self.stdout = stdout
+        self.stderr = stderr
+        self.pid: Optional[int] = None
+        self.returncode: Optional[int] = None
+        self.rusage: Optional[dict] = None  # Resources used, as reported by the server
+        self._buffer = b""
+
+    def _read_message(self, timeout: Optional[float]) -> Optional[dict]:
+        """Reads the next JSON line from the server; None if the server went away."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while b"\n" not in self._buffer:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise subprocess.TimeoutExpired(FORKSERVER_MODULE, timeout)
+            self.conn.settimeout(remaining)
+            try:
+                chunk = self.conn.recv(4096)
+            except socket.timeout:
+                raise subprocess.TimeoutExpired(FORKSERVER_MODULE, timeout)
+            if not chunk:
+                return None
+            self._buffer += chunk
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return json.loads(line)
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        if self.returncode is None:
+            message = self._read_message(timeout)
+            if message is None:
+                # The fork server died: make sure the run died with it
+                self.kill()
+                self.returncode = -signal.SIGKILL
+            else:
+                self.returncode = message["returncode"]
+                self.rusage = message.get("rusage")
+            self.conn.close()
+        return self.returncode
+
+    def kill(self):
+        if self.pid is None:
+            return
+        try:
+            os.killpg(self.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+class ForkServer:
+    """A warm interpreter in a project directory that forks one child per run.
+
+    The server (src/plugins/ai_agent_forkserver.py) imports pytest, the
+    result streaming plugin and the preload modules once. It records the
+    files of every module it loaded; once any of them changes the server is
+    stale, because its children would run the old code.
+    """
+
+    def __init__(self, root: str, preload: Sequence[str] = ()):
+        """Starts the server and waits until it is ready.
+
+        Args:
+            root: The project directory (working directory and sys.path[0] of the server)
+            preload: Extra modules to import once (e.g. heavy dependencies or the project package)
+
+        Raises:
+            RuntimeError: If the server does not come up
+        """
+        self.root = root
+        self.preload = list(preload)
+        self._dir = tempfile.mkdtemp(prefix="ai_agent_fork_")
+        self.socket_path = os.path.join(self._dir, "server.sock")
+        self._process = subprocess.Popen(
+            [sys.executable, "-m", FORKSERVER_MODULE, self.socket_path, *self.preload],
+            cwd=root,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env={**os.environ, **plugin_env()},
+            start_new_session=True,  # Keep Ctrl-C away; it exits when its stdin closes
+        )
+        readable, _, _ = select.select([self._process.stdout], [], [], STARTUP_TIMEOUT_SECONDS)
+        line = self._process.stdout.readline() if readable else b""
+        try:
+            ready = json.loads(line)
+        except ValueError:
+            ready = {}
+        if not ready.get("ready"):
+            self.close(kill=True)
+            raise RuntimeError(f"Fork server did not start in {root}")
+        self.modules: Dict[str, int] = ready["modules"]
+
+    def is_stale(self) -> bool:
+        """True if the server died or a module it loaded changed on disk."""
+        if self._process.poll() is not None:
+            return True
+        for path, mtime_ns in self.modules.items():
+            try:
+                if os.stat(path).st_mtime_ns != mtime_ns:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def spawn(self, argv: List[str], cwd: str, env: Optional[Dict[str, str]],
+              pass_fds: Sequence[int], limits: Optional[ResourceLimits] = None) -> WarmChild:
+        """Forks a child running ``python ARGV`` and returns its handle.
+
+        Args:
+            argv: Interpreter arguments: a script path or ``-m MODULE``, then its arguments
+            cwd: The working directory of the run
+            env: Extra environment variables of the run
+            pass_fds: Descriptors the run inherits under the same numbers
+            limits: Optional memory/CPU limits the child sets before running
+        """
+        stdout_r, stdout_w = os.pipe()
+        stderr_r, stderr_w = os.pipe()
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        child = WarmChild(conn, os.fdopen(stdout_r, "rb"), os.fdopen(stderr_r, "rb"))
+        try:
+            conn.connect(self.socket_path)
+            request = {"argv": argv, "cwd": cwd, "env": env or {}, "fds": list(pass_fds)}
+            if limits:
+                request["limits"] = limits.to_dict()
+            body = json.dumps(request).encode("utf-8")
+            fds = array.array("i", [stdout_w, stderr_w, *pass_fds])
+            conn.sendmsg([HEADER.pack(len(body))], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds)])
+            conn.sendall(body)
+            message = child._read_message(STARTUP_TIMEOUT_SECONDS)
+            if message is None:
+                raise ConnectionError("Fork server closed the connection")
+            child.pid = message["pid"]
+        except (OSError, subprocess.TimeoutExpired) as e:
+            conn.close()
+            child.stdout.close()
+            child.stderr.close()
+            raise OSError(f"Warm run could not be started: {e}") from e
+        finally:
+            # Only the forked child may keep the write ends, or we never see EOF
+            os.close(stdout_w)
+            os.close(stderr_w)
+        return child
+
+    def close(self, kill: bool = False):
+        """Retires the server: running children finish, no new runs are accepted.
+
+        Args:
+            kill: Kill the server instead (its running children keep running)
+        """
+        if kill:
+            self._process.kill()
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        self._process.stdout.close()
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+
+class WarmStreamingProcess(StreamingProcess):
+    """A StreamingProcess whose command is forked by a ForkServer instead of exec'd."""
+
+    start_mode = "warm"
+
+    def __init__(self, server: ForkServer, command: List[str], **kwargs):
+        self._server = server
+        super().__init__(command, **kwargs)
+
+    def _start(self, command, cwd, env, pass_fds):
+        return self._server.spawn(command[1:], cwd, env, pass_fds, limits=self.limits)
+
+
+class WarmPool:
+    """Opt-in pool of warm fork servers, one per project directory.
+
+    Runs of ``python SCRIPT`` and ``python -m MODULE`` (pytest in particular)
+    are forked from a server that already imported pytest, the agent's pytest
+    plugin and the preload modules, instead of paying interpreter startup and
+    imports on every run. A server is replaced as soon as any module it
+    loaded changes on disk; invalidate() drops servers explicitly.
+
+    sys.path and the environment are those of the server when it started;
+    run-specific environment variables are applied in each child.
+    """
+
+    def __init__(self, preload: Sequence[str] = ()):
+        """Initializes the pool; servers start lazily on first use.
+
+        Args:
+            preload: Modules every server imports once, besides pytest
+        """
+        self.preload = list(preload)
+        self.restarts = 0
+        self._servers: Dict[str, ForkServer] = {}
+        self._unavailable = set()
+        self._lock = threading.Lock()
+
+    def supports(self, args: Sequence[str]) -> bool:
+        """True if the interpreter arguments can be run warm (a script or ``-m MODULE``)."""
+        if not args:
+            return False
+        if args[0] == "-m":
+            return len(args) > 1
+        return not args[0].startswith("-")
+
+    def server(self, root: str) -> Optional[ForkServer]:
+        """Returns a fresh server for a project directory, or None if it cannot start."""
+        with self._lock:
+            server = self._servers.get(root)
+            if server is not None and server.is_stale():
+                print(f"Source changed; restarting the warm interpreter for {root}")
+                server.close()
+                del self._servers[root]
+                server = None
+                self.restarts += 1
+            if server is None and root not in self._unavailable:
+                try:
+                    server = ForkServer(root, self.preload)
+                except (OSError, RuntimeError) as e:
+                    print(f"Warning: warm interpreter unavailable for {root} ({e}); using a new interpreter per run.")
+                    self._unavailable.add(root)
+                    return None
+                self._servers[root] = server
+            return server
+
+    def stream(self, args: List[str], cwd: Optional[str] = None, timeout: Optional[float] = None,
+               head_lines: Optional[int] = 200, tail_lines: int = 800,
+               env: Optional[Dict[str, str]] = None, pass_fds: Sequence[int] = (),
+               limits: Optional[ResourceLimits] = None) -> Optional[StreamingProcess]:
+        """Starts ``python ARGS`` in a warm interpreter.
+
+        Returns:
+            A StreamingProcess, or None if the run cannot be done warm
+
+        Raises:
+            OSError: If the server failed to fork the run
+        """
+        if not self.supports(args) or (env and "PYTHONPATH" in env and env["PYTHONPATH"] != plugin_env()["PYTHONPATH"]):
+            return None  # A different sys.path needs a new interpreter
+        root = os.path.abspath(cwd or os.getcwd())
+        server = self.server(root)
+        if server is None:
+            return None
+        return WarmStreamingProcess(server, [sys.executable, *args], cwd=root, timeout=timeout,
+                                    head_lines=head_lines, tail_lines=tail_lines, env=env, pass_fds=pass_fds,
+                                    limits=limits)
+
+    def invalidate(self, root: Optional[str] = None):
+        """Retires the server of a project directory (or all servers)."""
+        with self._lock:
+            roots = [os.path.abspath(root)] if root else list(self._servers)
+            for name in roots:
+                server = self._servers.pop(name, None)
+                if server is not None:
+                    server.close()
+            self._unavailable.difference_update(roots)
+
+    def close(self):
+        """Retires every server."""
+        self.invalidate()
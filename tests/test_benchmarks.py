@@ -0,0 +1,37 @@
+import json
+
+from benchmarks.run_benchmarks import compare_to_baseline, main, make_results
+
+
+def stages(**seconds):
+    return {"stages": {name.replace("__", "/"): {"seconds": value} for name, value in seconds.items()}}
+
+
+def test_compare_flags_only_significant_slowdowns():
+    baseline = stages(parse__100=1.0, spawn=0.001, analyze=0.5)
+    results = stages(parse__100=1.5, spawn=0.002, analyze=0.55, new_stage=9.0)
+    regressions = compare_to_baseline(results, baseline, threshold=0.2, min_delta=0.005)
+    # spawn doubled but only by 1ms; analyze is within the threshold; new_stage has no baseline
+    assert [r["stage"] for r in regressions] == ["parse/100"]
+    assert round(regressions[0]["change"], 2) == 0.5
+
+
+def test_synthetic_results_fail_one_test_in_ten():
+    results = make_results(100)
+    assert len(results["tests"]) == 100
+    assert sum(test["outcome"] == "failed" for test in results["tests"]) == 10
+
+
+def test_gate_writes_baseline_then_detects_regression(tmp_path):
+    baseline = tmp_path / "baseline.json"
+    args = ["--sizes", "20", "--repeat", "1", "--stages", "parsing", "analyze_file",
+            "--module-lines", "200", "--baseline", str(baseline)]
+    assert main(args) == 0
+    data = json.loads(baseline.read_text())
+    assert set(data["stages"]) == {"report_parsing/20", "analyze_file/200_lines", "analyze_file/200_lines_cached"}
+
+    for stage in data["stages"].values():
+        stage["seconds"] = 1e-9  # Pretend everything used to be instant
+    baseline.write_text(json.dumps(data))
+    assert main(args + ["--min-delta", "0"]) == 1
+    assert main(args + ["--threshold", "1e12", "--min-delta", "0"]) == 0
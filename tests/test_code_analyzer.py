@@ -0,0 +1,203 @@
+import os
+import time
+
+import pytest
+
+from src.ast_cache import AstCache
+from src.code_analyzer import CodeAnalyzer
+from src.impact_analyzer import ImpactAnalyzer
+
+
+@pytest.fixture
+def project(tmp_path):
+    """Creates a small package with tests importing it directly and transitively."""
+    pkg = tmp_path / "pkg"
+    pkg.mkdir()
+    (pkg / "__init__.py").write_text("")
+    (pkg / "core.py").write_text("def add(a, b):\n    return a + b\n")
+    (pkg / "util.py").write_text("from .core import add\n\ndef twice(x):\n    return add(x, x)\n")
+    (pkg / "other.py").write_text("import os\n")
+    tests = tmp_path / "tests"
+    tests.mkdir()
+    (tests / "test_core.py").write_text("from pkg.core import add\n\ndef test_add():\n    assert add(1, 2) == 3\n")
+    (tests / "test_util.py").write_text("from pkg import util\n\ndef test_twice():\n    assert util.twice(2) == 4\n")
+    (tests / "test_other.py").write_text("import pkg.other\n\ndef test_other():\n    pass\n")
+    return tmp_path
+
+
+def test_find_imports_resolves_relative_imports(project):
+    analyzer = CodeAnalyzer()
+    imports = analyzer.find_imports(str(project / "pkg" / "util.py"), "pkg.util")
+    assert imports == ["pkg.core", "pkg.core.add"]
+
+
+def test_build_import_graph(project):
+    graph = CodeAnalyzer().build_import_graph(str(project))
+    core, util, init = (str(project / "pkg" / name) for name in ("core.py", "util.py", "__init__.py"))
+    assert graph[util] == {init, core}
+    assert graph[str(project / "tests" / "test_util.py")] == {init, util}
+    assert graph[str(project / "pkg" / "other.py")] == set()
+
+
+def test_select_uses_import_graph_without_coverage(project):
+    selection = ImpactAnalyzer().select(["pkg/core.py"], str(project))
+    assert selection == [os.path.join("tests", "test_core.py"), os.path.join("tests", "test_util.py")]
+
+
+def test_select_falls_back_for_unknown_changes(project):
+    impact = ImpactAnalyzer()
+    assert impact.select(["setup.cfg"], str(project)) is None
+    assert impact.select(["tests/conftest.py"], str(project)) is None
+
+
+def test_select_adds_coverage_to_importing_tests(project, tmp_path):
+    impact = ImpactAnalyzer(data_path=str(tmp_path / "impact.json"))
+    impact.update_coverage({"files": {
+        "pkg/core.py": {"contexts": {"1": [""], "2": ["tests/test_core.py::test_add|run"]}},
+        "pkg/other.py": {"contexts": {"1": ["tests/test_util.py::test_twice|run"]}},
+        "pkg/util.py": {"contexts": {"4": ["tests/test_util.py::test_twice|run"]}},
+    }}, str(project), built_at=time.time() + 1)
+    # test_util.py reaches other.py without importing it: only coverage knows
+    assert impact.select(["pkg/other.py"], str(project)) == [
+        os.path.join("tests", "test_other.py"), "tests/test_util.py::test_twice"]
+
+    # The persisted map is reloaded by a fresh analyzer
+    reloaded = ImpactAnalyzer(data_path=str(tmp_path / "impact.json"))
+    assert reloaded.coverage_map == impact.coverage_map
+
+
+def test_select_includes_importers_of_import_time_only_files(tmp_path):
+    (tmp_path / "config.py").write_text("RATE = 0.19\n")
+    (tmp_path / "calc.py").write_text("from config import RATE\n\ndef tax(x):\n    return x * RATE\n")
+    (tmp_path / "test_calc.py").write_text("from calc import tax\n\ndef test_tax():\n    assert tax(100) == 19\n")
+    impact = ImpactAnalyzer()
+    impact.update_coverage({"files": {
+        "config.py": {"contexts": {"1": [""]}},
+        "calc.py": {"contexts": {"1": [""], "3": [""], "4": ["test_calc.py::test_tax|run"]}},
+    }}, str(tmp_path), built_at=time.time() + 1)
+    # Coverage saw config.py run only at import time, i.e. by no test
+    assert impact.select(["config.py"], str(tmp_path)) == ["test_calc.py"]
+
+
+def test_select_runs_everything_when_coverage_is_stale(project):
+    impact = ImpactAnalyzer()
+    impact.update_coverage({"files": {"pkg/core.py": {"contexts": {}}, "pkg/util.py": {"contexts": {}}}},
+                           str(project), built_at=time.time() - 60)
+    # util.py was written after the coverage run but is not reported as changed
+    assert impact.select(["pkg/core.py"], str(project)) is None
+
+
+SAMPLE = """import os
+
+
+class Parser:
+    @staticmethod
+    def parse(text):
+        return text.split()
+
+
+def parse_args(argv):
+    def inner():
+        return argv
+    return inner()
+"""
+
+
+def test_symbol_index_includes_decorators_and_nesting(tmp_path):
+    path = tmp_path / "sample.py"
+    path.write_text(SAMPLE)
+    symbols = CodeAnalyzer().get_symbols(str(path))
+    assert symbols == {
+        "Parser": (4, 7),
+        "Parser.parse": (5, 7),
+        "parse_args": (10, 13),
+        "parse_args.inner": (11, 12),
+    }
+
+
+def test_cache_skips_reparsing_unchanged_and_identical_files(tmp_path):
+    first, second = tmp_path / "a.py", tmp_path / "b.py"
+    first.write_text(SAMPLE)
+    second.write_text(SAMPLE)
+    cache = AstCache()
+    analyzer = CodeAnalyzer(cache)
+    tree = analyzer.analyze_file(str(first))
+    assert analyzer.analyze_file(str(first)) is tree
+    # Same content under another path is served by content hash
+    assert analyzer.analyze_file(str(second)) is tree
+    assert (cache.misses, cache.hits) == (1, 2)
+
+    first.write_text(SAMPLE + "\nx = 1\n")
+    os.utime(first, ns=(time.time_ns() + 10**9, time.time_ns() + 10**9))
+    assert analyzer.analyze_file(str(first)) is not tree
+    assert cache.misses == 2
+
+
+def test_disk_tier_survives_new_cache_instances(tmp_path):
+    path = tmp_path / "sample.py"
+    path.write_text(SAMPLE)
+    CodeAnalyzer(AstCache(cache_dir=str(tmp_path / "cache"))).analyze_file(str(path))
+    cache = AstCache(cache_dir=str(tmp_path / "cache"))
+    assert "parse_args" in CodeAnalyzer(cache).get_symbols(str(path))
+    assert (cache.misses, cache.hits) == (0, 1)
+
+
+def test_disk_tier_requires_a_private_directory(tmp_path):
+    path = tmp_path / "sample.py"
+    path.write_text(SAMPLE)
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+    cache = AstCache(cache_dir=str(shared))
+    assert cache.cache_dir is None
+    CodeAnalyzer(cache).analyze_file(str(path))
+    assert list(shared.iterdir()) == []
+
+
+def test_get_code_context(tmp_path):
+    path = tmp_path / "sample.py"
+    path.write_text(SAMPLE)
+    analyzer = CodeAnalyzer()
+    context = analyzer.get_code_context(str(path), "tests/test_sample.py::test_parse_args[case1]")
+    assert context.startswith("def parse_args(argv):")
+    context = analyzer.get_code_context(str(path), "tests/test_sample.py::TestParser::test_something")
+    assert context.startswith("class Parser:")
+    assert analyzer.get_code_context(str(path), "tests/test_sample.py::test_unrelated") is None
+
+
+def test_cyclomatic_complexity_per_function():
+    import ast
+    from src.project_index import cyclomatic_complexity
+
+    tree = ast.parse(
+        "def simple():\n    return 1\n\n"
+        "def branchy(x):\n"
+        "    if x and x > 1 or x < -1:\n        return [i for i in x if i]\n"
+        "    for i in x:\n        try:\n            pass\n        except ValueError:\n            pass\n"
+        "    def inner():\n        while True:\n            pass\n"
+        "    return x if x else None\n\n"
+        "class A:\n    def m(self):\n        assert self\n"
+    )
+    assert cyclomatic_complexity(tree) == {"simple": 1, "branchy": 9, "branchy.inner": 2, "A.m": 2}
+
+
+def test_analyze_project_in_parallel_and_incrementally(project, tmp_path):
+    for index in range(70):  # Enough changed files to use the process pool
+        (project / "pkg" / f"gen{index}.py").write_text(f"from .util import helper\n\ndef f{index}(x):\n    return x or {index}\n")
+    (project / "broken.py").write_text("def oops(:\n")
+    index_path = str(tmp_path / "index.json")
+
+    index = CodeAnalyzer().analyze_project(str(project), workers=2, index_path=index_path)
+    assert index.stats["parsed"] == index.stats["files"]
+    assert list(index.syntax_errors()) == [str(project / "broken.py")]
+    assert index.files[str(project / "pkg" / "gen3.py")].complexity == {"f3": 2}
+    assert index.import_graph() == CodeAnalyzer().build_import_graph(str(project))
+
+    # A new analyzer picks up the saved index: only changed content is parsed again
+    gen1 = project / "pkg" / "gen1.py"
+    gen1.write_text("def renamed():\n    pass\n")
+    os.utime(project / "pkg" / "gen2.py", ns=(0, 0))  # New mtime, same content
+    again = CodeAnalyzer().analyze_project(str(project), workers=2, index_path=index_path)
+    assert again.stats["parsed"] == 1
+    assert again.stats["reused"] == again.stats["files"] - 1
+    assert again.find_symbol("renamed") == [(str(gen1), "renamed", (1, 2))]
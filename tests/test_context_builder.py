@@ -0,0 +1,92 @@
+import textwrap
+
+from src.code_analyzer import CodeAnalyzer
+from src.context_builder import ContextBuilder, estimate_tokens, trim_to_tokens
+
+FILLER = "".join(
+    f"\ndef unrelated_{i}(values):\n"
+    f'    """Unrelated helper {i}."""\n'
+    + "".join(f"    values = [v * {j} for v in values if v > {j}]\n" for j in range(20))
+    + "    return values\n"
+    for i in range(100)
+)
+
+
+def make_project(tmp_path):
+    pkg = tmp_path / "pkg"
+    pkg.mkdir()
+    (pkg / "__init__.py").write_text("")
+    (pkg / "models.py").write_text(textwrap.dedent('''\
+        class Order:
+            """A customer order."""
+            currency = "EUR"
+
+            def __init__(self, items):
+                self.items = items
+
+            def total(self):
+                """Sums the item prices."""
+                return sum(price for _, price in self.items)
+
+            def _audit(self):
+                pass
+    '''))
+    (pkg / "service.py").write_text(textwrap.dedent('''\
+        import json
+        import os
+        from .models import Order
+
+
+        def tax_rate(country):
+            """Returns the VAT rate of a country."""
+            if country == "DE":
+                return 0.19
+            return 0.2
+
+
+        def invoice(items, country):
+            order = Order(items)
+            amount = order.total() * (1 + tax_rate(country))
+            return json.dumps({"amount": amount})
+    ''') + FILLER)
+    return tmp_path
+
+
+def test_symbol_context_has_target_callee_signatures_and_used_imports(tmp_path):
+    root = make_project(tmp_path)
+    builder = ContextBuilder(CodeAnalyzer(), max_tokens=400, root=str(root))
+    context = builder.for_symbol(str(root / "pkg" / "service.py"), "invoice")
+
+    assert "amount = order.total() * (1 + tax_rate(country))" in context
+    assert '"""Returns the VAT rate of a country."""' in context
+    assert "return 0.19" not in context  # Callee bodies are left out
+    assert "class Order:" in context and "def total(self):" in context
+    assert "_audit" not in context and "self.items = items" not in context
+    assert "import json" in context and "from .models import Order" in context
+    assert "import os" not in context and "unrelated_" not in context
+    assert estimate_tokens(context) <= 400
+    # An order of magnitude smaller than the file
+    assert estimate_tokens(context) * 10 < estimate_tokens((root / "pkg" / "service.py").read_text())
+
+
+def test_module_context_fits_budget_with_public_outlines(tmp_path):
+    root = make_project(tmp_path)
+    builder = ContextBuilder(CodeAnalyzer(), root=str(root))
+    path = str(root / "pkg" / "service.py")
+    context = builder.for_module(path, max_tokens=2500)
+
+    assert estimate_tokens(context) <= 2500
+    assert "amount = order.total()" in context  # Early bodies are expanded
+    assert '"""Unrelated helper 99."""' in context  # Every function is outlined
+    assert context.count("values = [v *") < 20 * 100
+    assert builder.for_module(str(root / "pkg" / "models.py")) == (root / "pkg" / "models.py").read_text()
+
+
+def test_trim_keeps_tail_or_focus():
+    text = "".join(f"line number {i}\n" for i in range(1000))
+    tail = trim_to_tokens(text, 100, keep="tail")
+    assert tail.startswith("# ... ") and tail.endswith("line number 999\n")
+    assert estimate_tokens(tail) <= 100
+    focused = trim_to_tokens(text, 100, focus_line=501)
+    assert "line number 500\n" in focused and focused.count("omitted") == 2
+    assert trim_to_tokens("short\n", 100) == "short\n"
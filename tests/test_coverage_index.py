@@ -0,0 +1,93 @@
+import sqlite3
+import time
+
+from src.coverage_index import CoverageIndex, numbits_from_lines, numbits_to_lines, numbits_union
+from src.executor import Executor
+from src.impact_analyzer import ImpactAnalyzer
+from src.test_runner import TestRunner
+
+
+def write_data_file(path, lines_by_context, arcs_by_context=None):
+    """Writes a minimal coverage.py data file (the tables read by CoverageIndex)."""
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE file (id integer primary key, path text, unique (path));
+        CREATE TABLE context (id integer primary key, context text, unique (context));
+        CREATE TABLE line_bits (file_id integer, context_id integer, numbits blob, unique (file_id, context_id));
+        CREATE TABLE arc (file_id integer, context_id integer, fromno integer, tono integer);
+    """)
+    for (file_path, context), lines in lines_by_context.items():
+        conn.execute("INSERT OR IGNORE INTO file (path) VALUES (?)", (file_path,))
+        conn.execute("INSERT OR IGNORE INTO context (context) VALUES (?)", (context,))
+        conn.execute("INSERT INTO line_bits SELECT file.id, context.id, ? FROM file, context "
+                     "WHERE file.path = ? AND context.context = ?", (numbits_from_lines(lines), file_path, context))
+    for (file_path, context), arcs in (arcs_by_context or {}).items():
+        conn.execute("INSERT OR IGNORE INTO file (path) VALUES (?)", (file_path,))
+        conn.execute("INSERT OR IGNORE INTO context (context) VALUES (?)", (context,))
+        conn.executemany("INSERT INTO arc SELECT file.id, context.id, ?, ? FROM file, context "
+                         "WHERE file.path = ? AND context.context = ?",
+                         [(start, end, file_path, context) for start, end in arcs])
+    conn.commit()
+    conn.close()
+
+
+def test_numbits_round_trip():
+    assert numbits_to_lines(numbits_from_lines([1, 7, 8, 300])) == [1, 7, 8, 300]
+    assert numbits_to_lines(numbits_union(numbits_from_lines([2]), numbits_from_lines([90]))) == [2, 90]
+
+
+def test_index_merges_shards_and_answers_line_queries(tmp_path):
+    core = str(tmp_path / "pkg" / "core.py")
+    write_data_file(tmp_path / "shard0", {
+        (core, ""): [1, 2],
+        (core, "tests/test_core.py::test_add|run"): [3],
+        (core, "tests/test_core.py::test_add|setup"): [5],
+    })
+    write_data_file(tmp_path / "shard1", {
+        (core, "tests/test_core.py::test_sub|run"): [3, 4],
+        ("pkg/relative.py", "tests/test_rel.py::test_r|run"): [1],
+    }, arcs_by_context={(core, "tests/test_core.py::test_add|run"): [(-1, 6), (6, -1)]})
+
+    index = CoverageIndex(str(tmp_path / "index.db"))
+    index.rebuild([str(tmp_path / "shard0"), str(tmp_path / "shard1"), str(tmp_path / "missing")],
+                  built_at=123.0, root=str(tmp_path))
+    assert index.tests_for_line(core, 3) == ["tests/test_core.py::test_add", "tests/test_core.py::test_sub"]
+    assert index.tests_for_line(core, 4) == ["tests/test_core.py::test_sub"]
+    assert index.tests_for_line(core, 1) == []  # Import time belongs to no test
+    assert index.lines_for_test("tests/test_core.py::test_add", core) == [3, 5, 6]
+    assert index.tests_for_file(str(tmp_path / "pkg" / "relative.py")) == {"tests/test_rel.py::test_r"}
+    assert index.tests_for_file(str(tmp_path / "other.py")) is None
+    index.close()
+
+    reopened = CoverageIndex(str(tmp_path / "index.db"))
+    assert reopened.built_at == 123.0 and len(reopened.files()) == 2
+
+
+def test_impact_analyzer_selects_from_coverage_index(tmp_path):
+    (tmp_path / "core.py").write_text("def add(a, b):\n    return a + b\n")
+    (tmp_path / "test_core.py").write_text("import importlib\n\ncore = importlib.import_module('core')\n")
+    write_data_file(tmp_path / "shard0", {(str(tmp_path / "core.py"), "test_core.py::test_add|run"): [2]})
+    impact = ImpactAnalyzer(data_path=str(tmp_path / "coverage_index.db"))
+    impact.update_coverage_files([str(tmp_path / "shard0")], str(tmp_path), built_at=time.time() + 1)
+
+    assert impact.select(["core.py"], str(tmp_path)) == ["test_core.py::test_add"]
+    assert impact.tests_for_line(str(tmp_path / "core.py"), 2) == ["test_core.py::test_add"]
+    assert ImpactAnalyzer(data_path=str(tmp_path / "coverage_index.db")).select(["core.py"], str(tmp_path)) == [
+        "test_core.py::test_add"]
+
+
+def test_sharded_coverage_run_fills_the_index(tmp_path):
+    (tmp_path / "config.py").write_text("RATE = 0.19\n")
+    (tmp_path / "calc.py").write_text("import config\n\ndef add(a, b):\n    return a + b\n\ndef sub(a, b):\n    return a - b\n")
+    (tmp_path / "test_calc.py").write_text(
+        "from calc import add, sub\n\ndef test_add():\n    assert add(1, 2) == 3\n\n"
+        "def test_sub():\n    assert sub(2, 1) == 1\n")
+    impact = ImpactAnalyzer(data_path=str(tmp_path / "index.db"))
+    results = TestRunner(Executor(), impact=impact).run_test_coverage(
+        "test_calc.py", cwd=str(tmp_path), contexts=True, source=".", workers=2)
+
+    assert "error" not in results and len(results["data_files"]) == 2
+    assert impact.tests_for_line(str(tmp_path / "calc.py"), 7) == ["test_calc.py::test_sub"]
+    # config.py only ran at import time: measured by no test, but its importers are affected
+    assert impact.coverage_index.tests_for_file(str(tmp_path / "config.py")) == set()
+    assert impact.select(["config.py"], str(tmp_path)) == ["test_calc.py"]
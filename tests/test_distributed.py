@@ -0,0 +1,81 @@
+import json
+import socket
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from src.distributed import TOKEN_ENV, Coordinator, Shard, is_local_address, parse_address, run_worker
+from src.executor import Executor
+from src.test_runner import TestRunner
+
+
+def make_project(tmp_path):
+    tests = tmp_path / "tests"
+    tests.mkdir()
+    (tests / "test_a.py").write_text("def test_one():\n    pass\n\ndef test_two():\n    assert False\n")
+    (tests / "test_b.py").write_text("def test_three():\n    pass\n")
+    return tmp_path
+
+
+def dead_worker(address, token):
+    """Takes a shard and disconnects without reporting, like a crashed host."""
+    family, target = parse_address(address)
+    with socket.socket(family, socket.SOCK_STREAM) as conn:
+        conn.connect(target)
+        conn.sendall(json.dumps({"type": "hello", "worker": "dead", "token": token}).encode() + b"\n")
+        return conn.makefile("rb").readline()
+
+
+def test_coordinator_requeues_shards_of_dead_workers(tmp_path):
+    project = make_project(tmp_path)
+    shards = [Shard(0, ["tests/test_a.py::test_one", "tests/test_a.py::test_two"], expected_seconds=2.0),
+              Shard(1, ["tests/test_b.py::test_three"], expected_seconds=1.0)]
+    coordinator = Coordinator(str(tmp_path / "coordinator.sock"), shards)
+    coordinator.start()
+    try:
+        assert dead_worker(coordinator.address, "forged") == b""  # Rejected before seeing any shard
+        dead_worker(coordinator.address, coordinator.token)  # Takes the longest shard first
+        runner = TestRunner(Executor())
+        worker = threading.Thread(target=run_worker, args=(coordinator.address, runner),
+                                  kwargs={"cwd": str(project), "name": "good", "token": coordinator.token})
+        worker.start()
+        reports = coordinator.wait(timeout=60)
+        worker.join(timeout=30)
+    finally:
+        coordinator.close()
+
+    assert coordinator.requeued == 1 and coordinator.workers == {"good": 2}
+    merged = runner._merge_reports(reports, 1.0)
+    assert merged["summary"]["passed"] == 2 and merged["summary"]["failed"] == 1
+    assert merged["exitcode"] == 1 and "shard_errors" not in merged
+
+
+def test_distributed_run_with_local_workers(tmp_path):
+    project = make_project(tmp_path)
+    results = TestRunner(Executor()).run_pytest_distributed("tests", cwd=str(project), local_workers=2,
+                                                            shards=3, timeout=120)
+    assert sorted(test["nodeid"] for test in results["tests"]) == [
+        "tests/test_a.py::test_one", "tests/test_a.py::test_two", "tests/test_b.py::test_three"]
+    assert results["summary"]["total"] == 3 and results["root"] == str(project)
+    assert sum(results["workers"].values()) == results["shards"] == 3
+
+
+def test_run_fails_instead_of_hanging_when_workers_exit(tmp_path):
+    shards = [Shard(0, ["tests/test_a.py::test_one"])]
+    coordinator = Coordinator(str(tmp_path / "coordinator.sock"), shards)
+    coordinator.start()
+    try:
+        workers = [subprocess.Popen([sys.executable, "-c", "pass"]) for _ in range(2)]
+        reports = coordinator.wait(timeout=30, local_workers=workers)
+    finally:
+        coordinator.close()
+    assert reports[0]["error"] == "Shard 0 not run: every local worker exited (exit codes: 0, 0)"
+
+
+def test_public_listener_requires_a_configured_token(tmp_path, monkeypatch):
+    monkeypatch.delenv(TOKEN_ENV, raising=False)
+    with pytest.raises(ValueError):
+        Coordinator("0.0.0.0:0", []).start()
+    assert is_local_address("127.0.0.1:7400") and is_local_address(str(tmp_path / "sock"))
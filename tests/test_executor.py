@@ -0,0 +1,77 @@
+import sys
+import time
+
+import pytest
+
+from src.executor import CommandResult, Executor, OutputBuffer, ResourceLimits
+
+
+def test_run_command_captures_everything():
+    code = "import sys\nfor i in range(5000): print(i)\nprint('err', file=sys.stderr)\nsys.exit(3)"
+    return_code, stdout, stderr = Executor().run_command([sys.executable, "-c", code])
+    assert return_code == 3
+    assert stdout.splitlines() == [str(i) for i in range(5000)]
+    assert stderr == "err\n"
+
+
+ALLOCATE = "import time\nx = bytearray(64 * 1024 * 1024)\nt = time.process_time()\nwhile time.process_time() - t < 0.1: pass\n"
+
+
+def test_run_command_reports_resource_usage():
+    result = Executor().run_command([sys.executable, "-c", ALLOCATE])
+    return_code, stdout, stderr = result  # Still a 3-tuple
+    assert isinstance(result, CommandResult) and result.returncode == return_code == 0
+    assert result.usage.max_rss_kb > 64 * 1024
+    assert result.usage.cpu_seconds >= 0.1 and result.usage.wall_seconds >= 0.1
+
+
+def test_memory_limit_stops_large_allocations():
+    executor = Executor(limits=ResourceLimits(memory_mb=48))
+    return_code, _, stderr = executor.run_command([sys.executable, "-c", ALLOCATE])
+    assert return_code == 1 and "MemoryError" in stderr
+
+
+def test_limits_are_set_before_exec_without_preexec_fn():
+    executor = Executor(limits=ResourceLimits(memory_mb=256, cpu_seconds=5))
+    return_code, stdout, _ = executor.run_command(["sh", "-c", "ulimit -v; ulimit -t"])
+    assert return_code == 0 and stdout.split() == [str(256 * 1024), "5"]
+    with pytest.raises(FileNotFoundError):
+        executor.stream_command(["no-such-command-anywhere"])
+
+
+def test_stream_command_keeps_bounded_head_and_tail():
+    executor = Executor(head_lines=3, tail_lines=2)
+    process = executor.stream_command([sys.executable, "-c", "for i in range(100): print(i)"])
+    lines = [line for stream, line in process]
+    assert len(lines) == 100
+    assert process.returncode == 0
+    assert process.stdout_buffer.dropped == 95
+    assert process.stdout == "0\n1\n2\n\n... [95 lines omitted] ...\n98\n99\n"
+
+
+def test_timeout_kills_the_whole_process_group():
+    start = time.monotonic()
+    process = Executor(timeout=0.5).stream_command(["bash", "-c", "sleep 30 & echo started; wait"])
+    assert [line for _, line in process] == ["started\n"]
+    assert process.timed_out
+    assert process.returncode < 0
+    assert "Timed out" in process.stderr
+    assert time.monotonic() - start < 5
+
+
+def test_stopping_iteration_early_kills_the_command():
+    code = "import time\nfor i in range(1000):\n    print(i, flush=True)\n    time.sleep(0.01)"
+    process = Executor().stream_command([sys.executable, "-c", code])
+    for _, line in process:
+        if line == "2\n":
+            break
+    process.wait()
+    assert process.returncode is not None and process.returncode < 0
+
+
+def test_output_buffer_unbounded_mode():
+    buffer = OutputBuffer(head_lines=None, tail_lines=1)
+    for i in range(10):
+        buffer.append(f"{i}\n")
+    assert buffer.dropped == 0
+    assert buffer.text().count("\n") == 10
@@ -0,0 +1,126 @@
+import os
+import shutil
+import threading
+import time
+
+import pytest
+
+from src.agent import Agent
+from src.file_watcher import InotifyWatcher, PollingWatcher, debounced_changes
+from src.impact_analyzer import ImpactAnalyzer
+
+
+def save_burst(root):
+    time.sleep(0.1)
+    (root / "a.py").write_text("x = 1\n")
+    (root / "b.py").write_text("y = 2\n")
+    (root / ".a.py.swp").write_text("")  # Editor files are ignored
+    (root / "pkg").mkdir()
+    (root / "pkg" / "c.py").write_text("")
+
+
+@pytest.mark.parametrize("make_watcher", [InotifyWatcher, lambda root: PollingWatcher(root, interval=0.02)],
+                         ids=["inotify", "polling"])
+def test_watcher_merges_a_burst_of_saves(tmp_path, make_watcher):
+    try:
+        watcher = make_watcher(str(tmp_path))
+    except OSError as e:
+        pytest.skip(f"inotify unavailable: {e}")
+    thread = threading.Thread(target=save_burst, args=(tmp_path,))
+    thread.start()
+    changes = next(debounced_changes(watcher, debounce=0.2))
+    thread.join()
+    watcher.close()
+    assert sorted(os.path.relpath(path, tmp_path) for path in changes) == ["a.py", "b.py", os.path.join("pkg", "c.py")]
+
+
+def test_inotify_survives_directories_removed_right_after_creation(tmp_path):
+    try:
+        watcher = InotifyWatcher(str(tmp_path))
+    except OSError as e:
+        pytest.skip(f"inotify unavailable: {e}")
+    add_watch = watcher._add_watch
+
+    def add_watch_then_remove(path):
+        # The directory disappears between being watched and being listed
+        add_watch(path)
+        shutil.rmtree(path, ignore_errors=True)
+
+    watcher._add_watch = add_watch_then_remove
+    os.makedirs(tmp_path / "build" / "lib")
+    watcher.wait(1)
+    watcher._add_watch = add_watch
+
+    stop = threading.Event()
+
+    def churn():
+        while not stop.is_set():
+            os.makedirs(tmp_path / "tmp" / "a" / "b", exist_ok=True)
+            (tmp_path / "tmp" / "a" / "m.py").write_text("")
+            shutil.rmtree(tmp_path / "tmp", ignore_errors=True)
+
+    thread = threading.Thread(target=churn)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 1
+        while time.monotonic() < deadline:
+            watcher.wait(0.01)
+    finally:
+        stop.set()
+        thread.join()
+    (tmp_path / "still_watched.py").write_text("")
+    assert str(tmp_path / "still_watched.py") in watcher.wait(2)
+    watcher.close()
+
+
+def test_reported_changes_do_not_make_coverage_stale(tmp_path):
+    (tmp_path / "core.py").write_text("X = 1\n")
+    (tmp_path / "script.py").write_text("import core\n")
+    (tmp_path / "test_core.py").write_text("import core\n")
+    impact = ImpactAnalyzer()
+    impact.update_coverage({"files": {"core.py": {"contexts": {"1": ["test_core.py::test_x|run"]}}}},
+                           str(tmp_path), built_at=time.time() - 10)
+    assert impact.select(["core.py"], str(tmp_path)) == ["test_core.py"]
+    assert not impact.is_stale()  # A later watch iteration can still use the coverage map
+    assert impact.affects(["core.py"], "script.py", str(tmp_path))
+    assert not impact.affects(["test_core.py"], "script.py", str(tmp_path))
+
+
+class FakeWatcher:
+    kind = "fake"
+
+    def __init__(self, bursts):
+        self.bursts = list(bursts)
+
+    def wait(self, timeout=None):
+        return set(self.bursts.pop(0)) if timeout is None else set()
+
+    def close(self):
+        pass
+
+
+class RecordingTestRunner:
+    impact = None
+    executor = None
+
+    def __init__(self):
+        self.calls = []
+
+    def run_pytest(self, target, workers=1, fail_fast=False):
+        self.calls.append(None)
+        return {"summary": {}}
+
+    def run_affected_tests(self, changed_files, target=".", workers=1, fail_fast=False):
+        self.calls.append(changed_files)
+        return {"summary": {}}
+
+
+def test_watch_reruns_affected_tests_per_burst(tmp_path):
+    from src.code_analyzer import CodeAnalyzer
+    from src.debugger import Debugger
+
+    runner = RecordingTestRunner()
+    agent = Agent(Debugger(None, CodeAnalyzer()), runner)
+    changed = str(tmp_path / "core.py")
+    agent.watch("tests", root=str(tmp_path), watcher=FakeWatcher([[changed], [str(tmp_path)]]), max_iterations=2)
+    assert runner.calls == [None, [changed], None]  # Initial run, affected tests, full run after lost events
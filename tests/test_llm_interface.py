@@ -0,0 +1,101 @@
+import time
+
+import pytest
+
+from src.code_analyzer import CodeAnalyzer
+from src.executor import Executor
+from src.llm_cache import ResponseCache
+from src.llm_interface import LLMError, LLMInterface
+from src.test_runner import TestRunner, failure_signature
+
+
+def failed_test(nodeid, message, lineno=10):
+    return {"nodeid": nodeid, "outcome": "failed",
+            "call": {"crash": {"path": "/src/app.py", "lineno": lineno, "message": message}}}
+
+
+def test_failure_signature_ignores_volatile_details():
+    first = failed_test("t::a", "ValueError: bad object at 0x7f00aa in /tmp/pytest-1/x after 12 tries")
+    second = failed_test("t::b", "ValueError: bad object at 0x7f99bb in /tmp/pytest-7/y after 3 tries")
+    other_line = failed_test("t::c", first["call"]["crash"]["message"], lineno=11)
+    assert failure_signature(first) == failure_signature(second)
+    assert failure_signature(first) != failure_signature(other_line)
+
+
+def test_analyze_failures_deduplicates_and_runs_concurrently(stub_llm, tmp_path):
+    stub = stub_llm(delay=0.2)
+    llm = LLMInterface(api_key="test", model_name="stub", base_url=stub.url)
+    runner = TestRunner(Executor(), llm=llm)
+    tests = [failed_test(f"t::same{i}", f"KeyError: 'id {i}'") for i in range(50)]
+    tests += [failed_test(f"t::distinct{i}", "TypeError: nope", lineno=100 + i) for i in range(4)]
+    tests.append({"nodeid": "t::ok", "outcome": "passed"})
+
+    start = time.monotonic()
+    result = runner.analyze_failures({"tests": tests})
+    elapsed = time.monotonic() - start
+
+    assert len(stub.requests) == 5
+    assert result["distinct_failures"] == 5
+    assert len(result["analysis"]) == 54
+    assert stub.peak_in_flight > 1
+    assert elapsed < 5 * 0.2
+    same = {entry["analysis"] for entry in result["analysis"] if entry["test_name"].startswith("t::same")}
+    assert len(same) == 1 and same.pop().startswith("fix: ")
+
+
+def test_transient_errors_are_retried_within_budget(stub_llm):
+    stub = stub_llm(fail_first=2, status=503)
+    llm = LLMInterface(api_key="test", base_url=stub.url)
+    runner = TestRunner(Executor(), llm=llm)
+    result = runner.analyze_failures({"tests": [failed_test("t::a", "boom")]}, retry_budget=2)
+    assert result["analysis"][0]["analysis"].startswith("fix: ")
+    assert len(stub.requests) == 3
+
+    stub.requests.clear()
+    stub.fail_first = 5
+    result = runner.analyze_failures({"tests": [failed_test("t::b", "other")]}, retry_budget=1)
+    assert result["analysis"][0]["analysis"] == "LLM analysis failed: LLM API returned HTTP 503"
+    assert len(stub.requests) == 2
+
+
+def test_client_errors_are_not_retried(stub_llm):
+    stub = stub_llm(fail_first=1, status=400)
+    llm = LLMInterface(api_key="test", base_url=stub.url)
+    with pytest.raises(LLMError) as excinfo:
+        llm.analyze_error("app.py", "boom")
+    assert not excinfo.value.transient
+
+
+def test_responses_are_cached_on_disk(stub_llm, tmp_path):
+    stub = stub_llm()
+    first = LLMInterface(api_key="test", model_name="m1", base_url=stub.url,
+                         cache=ResponseCache(str(tmp_path)))
+    answer = first.analyze_error("app.py", "boom", "def f(): pass")
+    # A new interface (e.g. the next run) answers from the cache
+    second = LLMInterface(api_key="test", model_name="m1", base_url=stub.url,
+                          cache=ResponseCache(str(tmp_path)))
+    assert second.analyze_error("app.py", "boom", "def f(): pass") == answer
+    assert len(stub.requests) == 1
+    # Another model or context is a different cache entry
+    LLMInterface(api_key="test", model_name="m2", base_url=stub.url,
+                 cache=ResponseCache(str(tmp_path))).analyze_error("app.py", "boom", "def f(): pass")
+    second.analyze_error("app.py", "boom", "def g(): pass")
+    assert len(stub.requests) == 3
+
+
+def test_failure_prompt_gets_budgeted_context(stub_llm, tmp_path):
+    stub = stub_llm()
+    source = tmp_path / "app.py"
+    filler = "".join(f"def helper_{i}(x):\n    return x + {i}\n\n" for i in range(1000))
+    source.write_text(filler + "def divide(a, b):\n    return helper_1(a) / b\n")
+    llm = LLMInterface(api_key="test", base_url=stub.url, context_tokens=500)
+    runner = TestRunner(Executor(), llm=llm, code_analyzer=CodeAnalyzer())
+    crash_line = 3002
+    test = {"nodeid": "tests/test_app.py::test_divide", "outcome": "failed",
+            "call": {"crash": {"path": str(source), "lineno": crash_line, "message": "ZeroDivisionError"}}}
+    runner.analyze_failures({"tests": [test]}, file_path=str(source))
+
+    prompt = stub.requests[0]["messages"][1]["content"]
+    assert "return helper_1(a) / b" in prompt
+    assert "def helper_1(x):" in prompt and "helper_2" not in prompt
+    assert len(prompt) * 20 < len(filler)
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from src.scheduler import JobScheduler, serve_jsonl, serve_socket
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_jobs_run_by_priority_within_a_type():
+    order = []
+    gate = threading.Event()
+
+    def handler(payload):
+        if payload["name"] == "blocker":
+            gate.wait(5)
+        order.append(payload["name"])
+        return payload["name"].upper()
+
+    async def scenario():
+        async with JobScheduler({"test": handler}) as scheduler:
+            futures = [await scheduler.submit("test", {"name": "blocker"})]
+            await asyncio.sleep(0.05)  # Let the blocker start so the rest queue up
+            futures.append(await scheduler.submit("test", {"name": "low"}, priority=0))
+            futures.append(await scheduler.submit("test", {"name": "high"}, priority=10))
+            gate.set()
+            return await asyncio.gather(*futures)
+
+    results = run(scenario())
+    assert order == ["blocker", "high", "low"]
+    assert [r["result"] for r in results] == ["BLOCKER", "LOW", "HIGH"]
+    assert all(r["status"] == "ok" for r in results)
+
+
+def test_concurrency_is_limited_per_job_type():
+    running = {"debug": 0, "test": 0}
+    peak = {"debug": 0, "test": 0}
+    lock = threading.Lock()
+
+    def make_handler(job_type):
+        def handler(payload):
+            with lock:
+                running[job_type] += 1
+                peak[job_type] = max(peak[job_type], running[job_type])
+            time.sleep(0.05)
+            with lock:
+                running[job_type] -= 1
+        return handler
+
+    async def scenario():
+        scheduler = JobScheduler({"debug": make_handler("debug"), "test": make_handler("test")},
+                                 concurrency={"debug": 3, "test": 1})
+        async with scheduler:
+            futures = [await scheduler.submit(t, {}) for t in ["debug", "test"] * 6]
+            await asyncio.gather(*futures)
+
+    run(scenario())
+    assert peak == {"debug": 3, "test": 1}
+
+
+def test_full_queue_rejects_or_blocks_submitters():
+    gate = threading.Event()
+
+    async def scenario():
+        scheduler = JobScheduler({"test": lambda payload: gate.wait(5)}, max_queued=1)
+        async with scheduler:
+            first = await scheduler.submit("test")
+            await asyncio.sleep(0.05)  # First job is running, the queue is empty
+            second = scheduler.try_submit("test")
+            with pytest.raises(asyncio.QueueFull):
+                scheduler.try_submit("test")
+            blocked = asyncio.ensure_future(scheduler.submit("test"))
+            await asyncio.sleep(0.05)
+            assert not blocked.done()
+            gate.set()
+            third = await blocked
+            await asyncio.gather(first, second, third)
+            return scheduler.stats
+
+    stats = run(scenario())
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 3
+
+
+def test_handler_errors_become_structured_results(tmp_path):
+    def handler(payload):
+        raise RuntimeError("boom")
+
+    jobs = tmp_path / "jobs.jsonl"
+    jobs.write_text('{"type": "test", "id": "a"}\nnot json\n{"type": "unknown"}\n')
+    results = []
+
+    async def collect(result):
+        results.append(result)
+
+    async def scenario():
+        async with JobScheduler({"test": handler}) as scheduler:
+            await serve_jsonl(scheduler, str(jobs), collect)
+
+    run(scenario())
+    by_status = {r["status"]: r for r in results}
+    assert by_status["error"]["id"] == "a"
+    assert by_status["error"]["error"] == "RuntimeError: boom"
+    assert len([r for r in results if r["status"] == "rejected"]) == 2
+
+
+def test_socket_clients_receive_results(tmp_path):
+    address = str(tmp_path / "agent.sock")
+
+    async def scenario():
+        async with JobScheduler({"test": lambda payload: payload["target"]}) as scheduler:
+            server = asyncio.create_task(serve_socket(scheduler, address))
+            for _ in range(50):
+                await asyncio.sleep(0.02)
+                try:
+                    reader, writer = await asyncio.open_unix_connection(address)
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    continue
+            writer.write(b'{"type": "test", "id": "1", "target": "tests"}\n')
+            await writer.drain()
+            result = json.loads(await reader.readline())
+            writer.close()
+            server.cancel()
+            return result
+
+    result = run(scenario())
+    assert result["id"] == "1" and result["result"] == "tests"
+    assert os.stat(address).st_mode & 0o777 == 0o600
+
+
+def test_socket_is_private_from_the_moment_it_exists(tmp_path, monkeypatch):
+    address = str(tmp_path / "agent.sock")
+    modes = []
+    start_unix_server = asyncio.start_unix_server
+
+    async def start_and_check(*args, **kwargs):
+        modes.append(os.stat(address).st_mode & 0o777)  # Bound, not yet listening
+        return await start_unix_server(*args, **kwargs)
+
+    monkeypatch.setattr(asyncio, "start_unix_server", start_and_check)
+    previous = os.umask(0o002)
+
+    async def scenario():
+        async with JobScheduler({"test": lambda payload: None}) as scheduler:
+            server = asyncio.create_task(serve_socket(scheduler, address))
+            while not modes and not server.done():
+                await asyncio.sleep(0.01)
+            server.cancel()
+
+    try:
+        run(scenario())
+    finally:
+        os.umask(previous)
+    assert modes == [0o600]
+
+
+def test_socket_service_refuses_tcp_addresses():
+    async def scenario():
+        async with JobScheduler({"test": lambda payload: None}) as scheduler:
+            await serve_socket(scheduler, "0.0.0.0:7000")
+
+    with pytest.raises(ValueError):
+        run(scenario())
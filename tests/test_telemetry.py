@@ -0,0 +1,96 @@
+import json
+import os
+import re
+import sys
+
+import pytest
+
+from src import telemetry
+from src.executor import Executor
+from src.test_runner import TestRunner
+
+
+@pytest.fixture
+def collector(tmp_path):
+    active = telemetry.enable(metrics_path=str(tmp_path / "metrics.prom"), trace_path=str(tmp_path / "trace.json"))
+    yield active
+    telemetry.disable()
+
+
+def test_disabled_telemetry_is_a_no_op():
+    assert not telemetry.enabled()
+    with telemetry.span("stage", key="value") as stage:
+        stage.set_attribute("other", 1)
+    telemetry.count("ai_agent_tests_total", outcome="passed")
+    assert telemetry.span("a") is telemetry.span("b")  # One shared no-op object, nothing allocated
+
+
+def test_nested_spans_share_a_trace(collector):
+    with telemetry.span("outer", target="tests"):
+        with pytest.raises(ValueError):
+            with telemetry.span("inner"):
+                raise ValueError("boom")
+    inner, outer = collector.spans
+    assert inner.trace_id == outer.trace_id and inner.parent_id == outer.span_id
+    assert outer.parent_id is None
+    assert inner.error == "ValueError: boom"
+
+
+def test_exports_prometheus_and_otlp(collector, tmp_path):
+    telemetry.count("ai_agent_llm_tokens_total", 12, kind="analyze_error", direction="prompt")
+    telemetry.observe("ai_agent_job_duration_seconds", 0.3, type="test", status="ok")
+    with telemetry.span("agent.run_tests", workers=2):
+        pass
+    collector.export()
+
+    metrics = (tmp_path / "metrics.prom").read_text()
+    assert "# TYPE ai_agent_llm_tokens_total counter" in metrics
+    assert 'ai_agent_llm_tokens_total{direction="prompt",kind="analyze_error"} 12' in metrics
+    assert 'ai_agent_job_duration_seconds_bucket{status="ok",type="test",le="0.5"} 1' in metrics
+    assert 'ai_agent_job_duration_seconds_bucket{status="ok",type="test",le="0.25"} 0' in metrics
+    assert 'ai_agent_stage_duration_seconds_count{stage="agent.run_tests"} 1' in metrics
+
+    trace = json.loads((tmp_path / "trace.json").read_text())
+    (span,) = trace["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert span["name"] == "agent.run_tests"
+    assert span["attributes"] == [{"key": "workers", "value": {"intValue": "2"}}]
+    assert int(span["endTimeUnixNano"]) >= int(span["startTimeUnixNano"])
+
+
+def test_test_run_records_stages_and_counters(collector, tmp_path):
+    (tmp_path / "test_sample.py").write_text("def test_ok():\n    print('x')\n\ndef test_bad():\n    assert False\n")
+    runner = TestRunner(Executor())
+    runner.run_pytest("test_sample.py", cwd=str(tmp_path))
+    runner.cleanup()
+    assert collector.counters["ai_agent_tests_total"] == {(("outcome", "passed"),): 1, (("outcome", "failed"),): 1}
+    assert collector.counters["ai_agent_processes_spawned_total"] == {(("mode", "cold"),): 1}
+    assert collector.counters["ai_agent_output_bytes_total"][(("stream", "stdout"),)] > 0
+    stages = {labels[0][1] for labels in collector.histograms["ai_agent_stage_duration_seconds"]}
+    assert {"executor.spawn", "test_runner.execute", "test_runner.parse_results"} <= stages
+
+
+def test_output_is_counted_in_bytes(collector):
+    code = "import sys\nsys.stdout.buffer.write('\u00e9t\u00e9\\n'.encode() + b'\\xff\\n')"
+    Executor().run_command([sys.executable, "-c", code])
+    assert collector.counters["ai_agent_output_bytes_total"][(("stream", "stdout"),)] == 8
+
+
+def test_process_cpu_time_uses_cpu_buckets(collector, tmp_path):
+    Executor().run_command([sys.executable, "-c", "pass"])
+    collector.export()
+    metrics = (tmp_path / "metrics.prom").read_text()
+    assert "# HELP ai_agent_process_cpu_seconds " in metrics
+    assert "# TYPE ai_agent_process_cpu_seconds histogram" in metrics
+    assert 'ai_agent_process_cpu_seconds_bucket{mode="cold",le="3600"}' in metrics
+
+
+def test_every_emitted_metric_is_registered():
+    source_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+    emitted = set()
+    for dirpath, _, filenames in os.walk(source_dir):
+        for filename in filenames:
+            if filename.endswith(".py"):
+                with open(os.path.join(dirpath, filename), encoding="utf-8") as f:
+                    emitted.update(re.findall(r"telemetry\.(?:count|observe)\(\s*\"(\w+)\"", f.read()))
+    assert "ai_agent_watch_latency_seconds" in emitted
+    assert emitted - set(telemetry.METRICS) == set()
@@ -0,0 +1,70 @@
+import time
+
+from src.code_analyzer import CodeAnalyzer
+from src.executor import Executor
+from src.llm_interface import LLMInterface
+from src.test_generation import BatchTestGenerator, extract_code, prune_tests
+from src.test_runner import TestRunner
+
+GOOD_TESTS = '''Here are the tests:
+```python
+from calc import add
+
+def test_add():
+    assert add(1, 2) == 3
+
+def test_add_wrong():
+    assert add(1, 2) == 4
+
+class TestAdd:
+    def test_zero(self):
+        assert add(0, 0) == 0
+
+    def test_negative_wrong(self):
+        assert add(-1, -1) == 0
+```
+'''
+BROKEN_TESTS = "import not_a_module\n\ndef test_x():\n    pass\n"
+
+
+def reply_for(prompt):
+    return GOOD_TESTS if "calc.py" in prompt else BROKEN_TESTS
+
+
+def test_prune_tests_keeps_passing_functions_and_classes():
+    code = extract_code(GOOD_TESTS)
+    pruned = prune_tests(code, {(None, "test_add"), ("TestAdd", "test_zero")})
+    assert "def test_add():" in pruned and "def test_zero(self):" in pruned
+    assert "wrong" not in pruned
+    assert "class TestAdd" not in prune_tests(code, {(None, "test_add")})
+
+
+def test_batch_keeps_passing_tests_and_skips_unchanged_modules(stub_llm, tmp_path):
+    stub = stub_llm(reply=reply_for, delay=0.2)
+    (tmp_path / "calc.py").write_text("def add(a, b):\n    return a + b\n")
+    (tmp_path / "other.py").write_text("VALUE = 1\n")
+    llm = LLMInterface(api_key="test", base_url=stub.url)
+    runner = TestRunner(Executor(), llm=llm, code_analyzer=CodeAnalyzer())
+    generator = BatchTestGenerator(runner, root=str(tmp_path), concurrency=4, validation_workers=2)
+    modules = [str(tmp_path / "calc.py"), str(tmp_path / "other.py")]
+
+    started = time.monotonic()
+    result = generator.generate(modules)
+    assert stub.peak_in_flight == 2 and time.monotonic() - started < 10
+    by_name = {entry["file_path"].rsplit("/", 1)[1]: entry for entry in result["modules"]}
+    assert by_name["calc.py"]["status"] == "accepted"
+    assert (by_name["calc.py"]["tests"], by_name["calc.py"]["kept"]) == (4, 2)
+    assert by_name["other.py"] == {**by_name["other.py"], "status": "rejected", "reason": "tests do not collect"}
+    written = (tmp_path / "tests" / "generated" / "test_calc.py").read_text()
+    assert "def test_zero" in written and "wrong" not in written
+    assert not (tmp_path / "tests" / "generated" / "test_other.py").exists()
+    stats = result["stats"]
+    assert (stats["accepted"], stats["rejected"], stats["acceptance_rate"]) == (1, 1, 0.5)
+    assert (stats["tests_kept"], stats["modules_per_minute"] > 0) == (2, True)
+
+    # A new generator (the next night) only regenerates the module that changed or was rejected
+    (tmp_path / "calc.py").write_text("def add(a, b):\n    return a + b\n")
+    again = BatchTestGenerator(runner, root=str(tmp_path)).generate(modules)
+    assert [entry["status"] for entry in again["modules"]] == ["skipped", "rejected"]
+    assert len(stub.requests) == 3
+    runner.cleanup()
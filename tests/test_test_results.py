@@ -0,0 +1,65 @@
+import json
+
+from src.executor import Executor
+from src.test_results import TestResults, to_dict
+from src.test_runner import TestRunner, heaviest_tests
+
+
+def make_test(nodeid, outcome="passed", stdout="", cpu=0.0):
+    return {"nodeid": nodeid, "outcome": outcome,
+            "setup": {"duration": 0.25, "outcome": "passed"},
+            "call": {"duration": 1.0, "outcome": outcome, "stdout": stdout},
+            "resources": {"user_seconds": cpu, "system_seconds": 0.0, "max_rss_kb": 1, "rss_growth_kb": 0}}
+
+
+def test_counts_and_records_without_loading_output():
+    results = TestResults(created=1.0, exitcode=1, root="/project")
+    results.append(make_test("t.py::test_a", stdout="a" * 1000))
+    results.append(make_test("t.py::test_b", "failed", stdout="boom", cpu=2.0))
+    results.append(make_test("t.py::test_c", "skipped"))
+
+    assert results.summary == {"passed": 1, "failed": 1, "skipped": 1, "total": 3}
+    assert results.count("failed") == 1 and results.failed
+    assert results.indices("failed", "error") == [1]
+    tests = results["tests"]
+    assert [test["nodeid"] for test in tests] == ["t.py::test_a", "t.py::test_b", "t.py::test_c"]
+    assert tests[1].duration == 1.25
+    assert [test["nodeid"] for test in heaviest_tests(results)] == ["t.py::test_b"]
+
+    # Captured output is read back from disk only when a record is inspected
+    assert tests[1]["call"]["stdout"] == "boom"
+    results.close()
+    assert [test.get("outcome") for test in tests] == ["passed", "failed", "skipped"]
+
+
+def test_mapping_facade_and_merging():
+    shard = TestResults(created=1.0)
+    shard.append(make_test("a.py::test_one"))
+    merged = TestResults(created=1.0, exitcode=1)
+    merged.extend(shard)
+    merged.extend({"summary": {"failed": 1, "total": 1, "collected": 1}, "tests": [make_test("b.py::test_two", "failed")]})
+    merged["flaky"] = []
+
+    assert "error" not in merged and merged.get("flaky") == []
+    assert merged["summary"] == {"passed": 1, "failed": 1, "total": 2, "collected": 1}
+    data = json.loads(json.dumps(to_dict(merged)))
+    assert data["tests"] == [make_test("a.py::test_one"), make_test("b.py::test_two", "failed")]
+    assert data["exitcode"] == 1 and data["flaky"] == []
+    assert TestResults.from_report(data).summary == merged.summary
+
+
+def test_run_pytest_spools_captured_output(tmp_path):
+    (tmp_path / "test_out.py").write_text(
+        "def test_prints():\n    print('hello')\n\n"
+        "def test_fails():\n    print('x' * 5000)\n    assert False\n"
+    )
+    runner = TestRunner(Executor())
+    try:
+        results = runner.run_pytest("test_out.py", cwd=str(tmp_path))
+        assert isinstance(results, TestResults)
+        assert results["summary"]["passed"] == 1 and results["summary"]["failed"] == 1
+        failed = results["tests"][results.indices("failed")[0]]
+        assert failed["call"]["stdout"].startswith("x" * 5000)
+        assert runner.analyze_failures(results) == {"error": "LLM not available for analysis"}
+    finally:
+        runner.cleanup()
@@ -0,0 +1,189 @@
+import os
+
+import pytest
+
+from src.executor import Executor
+from src.test_history import TestHistory
+from src.test_runner import TestRunner
+
+
+@pytest.fixture
+def runner():
+    test_runner = TestRunner(Executor())
+    yield test_runner
+    test_runner.cleanup()
+
+
+@pytest.fixture
+def sample_project(tmp_path):
+    """Creates a tiny project with three test modules, one of which fails."""
+    tests_dir = tmp_path / "tests"
+    tests_dir.mkdir()
+    for index in range(3):
+        (tests_dir / f"test_mod{index}.py").write_text(
+            "def test_ok():\n    assert True\n\n"
+            f"def test_maybe():\n    assert {index} != 1\n"
+        )
+    return tmp_path
+
+
+def test_split_shards_is_contiguous_and_balanced(runner):
+    nodeids = [f"t.py::test_{i}" for i in range(10)]
+    shards = runner._split_shards(nodeids, 3)
+    assert [len(shard) for shard in shards] == [4, 3, 3]
+    assert [nodeid for shard in shards for nodeid in shard] == nodeids
+
+
+def test_split_shards_never_creates_empty_shards(runner):
+    assert runner._split_shards(["a::b", "a::c"], 8) == [["a::b"], ["a::c"]]
+
+
+def test_merge_reports_sums_summaries_and_concatenates_tests(runner):
+    reports = [
+        {"exitcode": 0, "summary": {"passed": 2, "total": 2}, "tests": [{"nodeid": "a"}, {"nodeid": "b"}]},
+        {"exitcode": 1, "summary": {"passed": 1, "failed": 1, "total": 2}, "tests": [{"nodeid": "c"}, {"nodeid": "d"}]},
+    ]
+    merged = runner._merge_reports(reports, duration=1.5)
+    assert merged["summary"] == {"passed": 3, "failed": 1, "total": 4}
+    assert [test["nodeid"] for test in merged["tests"]] == ["a", "b", "c", "d"]
+    assert merged["exitcode"] == 1
+    assert merged["duration"] == 1.5
+
+
+def test_merge_reports_all_shards_failed(runner):
+    merged = runner._merge_reports([{"error": "boom", "exit_code": 3}], duration=0.1)
+    assert merged["error"] == "All test shards failed"
+
+
+def test_sharded_run_matches_single_run(runner, sample_project):
+    single = runner.run_pytest("tests", cwd=str(sample_project))
+    sharded = runner.run_pytest("tests", cwd=str(sample_project), workers=3)
+    assert sharded["summary"]["passed"] == single["summary"]["passed"] == 5
+    assert sharded["summary"]["failed"] == single["summary"]["failed"] == 1
+    assert sorted(t["nodeid"] for t in sharded["tests"]) == sorted(t["nodeid"] for t in single["tests"])
+    assert sharded["shards"] == 3
+
+
+def test_balanced_shards_use_history_durations(runner):
+    history = TestHistory(":memory:")
+    history.record({"tests": [
+        {"nodeid": "t.py::slow", "outcome": "passed", "call": {"duration": 10.0}},
+        {"nodeid": "t.py::mid", "outcome": "passed", "call": {"duration": 6.0}},
+        {"nodeid": "t.py::fast1", "outcome": "passed", "call": {"duration": 2.0}},
+        {"nodeid": "t.py::fast2", "outcome": "failed", "call": {"duration": 2.0}},
+    ]})
+    runner.history = history
+    shards = runner._balance_shards(["t.py::fast1", "t.py::fast2", "t.py::mid", "t.py::slow"], 2)
+    totals = sorted(sum(history.durations(shard).values()) for shard in shards)
+    assert totals == [10.0, 10.0]
+    # The recently failed test leads its shard
+    assert any(shard[0] == "t.py::fast2" for shard in shards)
+
+
+def test_history_stats_are_aggregated_once_per_run(runner, monkeypatch):
+    history = TestHistory(":memory:")
+    for run, outcome in enumerate(["failed", "passed", "failed"]):
+        history.record({"tests": [{"nodeid": f"t.py::test_{i}", "outcome": outcome if i == 0 else "passed",
+                                   "duration": float(i + run)} for i in range(6)]}, run_at=float(run))
+    stats = history.stats(["t.py::test_0", "t.py::test_1", "unknown"])
+    assert set(stats) == {"t.py::test_0", "t.py::test_1"}
+    assert (stats["t.py::test_0"].runs, stats["t.py::test_0"].avg_duration) == (3, 1.0)
+    assert (stats["t.py::test_0"].flips, stats["t.py::test_0"].last_failed_at) == (2, 2.0)
+    assert stats["t.py::test_1"].last_outcome == "passed" and stats["t.py::test_1"].last_failed_at is None
+
+    calls = []
+    original = history.stats
+    monkeypatch.setattr(history, "stats", lambda nodeids=None: calls.append(1) or original(nodeids))
+    runner.history = history
+    runner._balance_shards([f"t.py::test_{i}" for i in range(6)], 3)
+    assert len(calls) == 1
+
+
+def test_history_orders_failures_then_new_then_slowest(tmp_path):
+    history = TestHistory(str(tmp_path / "history.db"))
+    history.record({"tests": [
+        {"nodeid": "a", "outcome": "passed", "duration": 1.0},
+        {"nodeid": "b", "outcome": "passed", "duration": 5.0},
+        {"nodeid": "c", "outcome": "failed", "duration": 0.1},
+    ]})
+    assert history.order(["a", "b", "c", "new"]) == ["c", "new", "b", "a"]
+
+
+def test_history_flags_flaky_tests():
+    history = TestHistory(":memory:")
+    for run, outcome in enumerate(["passed", "failed", "passed"]):
+        history.record({"tests": [
+            {"nodeid": "flaky", "outcome": outcome, "duration": 0.1},
+            {"nodeid": "fixed", "outcome": "failed" if run == 0 else "passed", "duration": 0.1},
+        ]}, run_at=float(run))
+    assert history.flaky_tests() == ["flaky"]
+
+
+def test_run_records_history(runner, sample_project, tmp_path):
+    runner.history = TestHistory(str(tmp_path / "history.db"))
+    runner.run_pytest("tests", cwd=str(sample_project))
+    results = runner.run_pytest("tests", cwd=str(sample_project))
+    # The failing test from the previous run is scheduled first
+    assert results["tests"][0]["nodeid"] == "tests/test_mod1.py::test_maybe"
+    assert runner.history.stats()["tests/test_mod1.py::test_maybe"].runs == 2
+    assert results["flaky"] == []
+
+
+def test_node_id_lists_longer_than_arg_max_are_passed_in_a_file(runner, tmp_path):
+    # Ordering by history and sharding pass every node ID to pytest
+    count = os.sysconf("SC_ARG_MAX") // 2000 + 50
+    (tmp_path / "test_many.py").write_text(
+        "import pytest\n\n"
+        f"@pytest.mark.parametrize('case', range({count}), ids=lambda case: str(case).zfill(2000))\n"
+        "def test_case(case):\n    pass\n"
+    )
+    runner.history = TestHistory(":memory:")
+    assert runner.run_pytest("test_many.py", cwd=str(tmp_path)).summary["passed"] == count
+    assert runner.run_pytest("test_many.py", cwd=str(tmp_path), workers=2).summary["passed"] == count
+
+
+def test_stream_yields_each_test_with_stages(runner, sample_project):
+    stream = runner.stream_pytest("tests/test_mod1.py", cwd=str(sample_project))
+    tests = {test["nodeid"]: test for test in stream}
+    assert stream.finished and stream.exitcode == 1
+    assert stream.summary == {"total": 2, "collected": 2, "passed": 1, "failed": 1}
+    failed = tests["tests/test_mod1.py::test_maybe"]
+    assert failed["outcome"] == "failed"
+    assert failed["call"]["crash"]["lineno"] == 5
+    assert set(failed) >= {"setup", "call", "teardown"}
+
+
+def test_fail_fast_stops_at_first_failure(runner, tmp_path):
+    (tmp_path / "test_slow.py").write_text(
+        "import time\n\n"
+        "def test_fails():\n    assert False\n\n"
+        "def test_slow():\n    time.sleep(30)\n"
+    )
+    results = runner.run_pytest("test_slow.py", cwd=str(tmp_path), fail_fast=True)
+    assert results["stopped_early"] is True
+    assert results["exitcode"] == 1
+    assert [t["nodeid"] for t in results["tests"]] == ["test_slow.py::test_fails"]
+    assert results["duration"] < 30
+
+
+def test_crashed_pytest_is_reported_as_an_error(runner, tmp_path):
+    (tmp_path / "test_crash.py").write_text(
+        "import os, signal\n\n"
+        "def test_ok():\n    pass\n\n"
+        "def test_crash():\n    os.kill(os.getpid(), signal.SIGKILL)\n"
+    )
+    results = runner.run_pytest("test_crash.py", cwd=str(tmp_path))
+    assert "SIGKILL" in results["error"]
+    assert "stopped_early" not in results
+    assert [t["nodeid"] for t in results["tests"]] == ["test_crash.py::test_ok"]
+
+
+def test_timed_out_pytest_is_reported_as_an_error(tmp_path):
+    (tmp_path / "test_hang.py").write_text("import time\n\ndef test_hangs():\n    time.sleep(30)\n")
+    runner = TestRunner(Executor(timeout=2))
+    try:
+        results = runner.run_pytest("test_hang.py", cwd=str(tmp_path))
+    finally:
+        runner.cleanup()
+    assert results["error"] == "Pytest timed out after 2s"
+    assert "stopped_early" not in results
@@ -0,0 +1,70 @@
+import subprocess
+import sys
+
+from src.code_analyzer import CodeAnalyzer
+from src.debugger import Debugger
+from src.executor import Executor
+from src.traceback_parser import parse_traceback
+
+CHAINED = """\
+some log line
+Traceback (most recent call last):
+  File "/app/m.py", line 5, in b
+    return {}[x]
+           ~~^^^
+KeyError: 1
+
+The above exception was the direct cause of the following exception:
+
+Traceback (most recent call last):
+  File "/app/m.py", line 8, in <module>
+    a(1)
+  File "/app/m.py", line 7, in b
+    raise ValueError("bad\\nvalue") from e
+  [Previous line repeated 2 more times]
+mod.ValueError: bad
+value
+"""
+
+
+def test_parse_chained_traceback():
+    traceback = parse_traceback(CHAINED)
+    assert (traceback.exc_type, traceback.message) == ("mod.ValueError", "bad\nvalue")
+    assert [(f.lineno, f.function, f.line) for f in traceback.frames] == [
+        (8, "<module>", "a(1)"), (7, "b", 'raise ValueError("bad\\nvalue") from e')]
+    assert traceback.frames[-1].repeated == 2
+    assert [(c.exc_type, c.message, c.frames[0].line) for c in traceback.chain] == [("KeyError", "1", "return {}[x]")]
+    assert parse_traceback("no traceback here\n") is None
+
+
+def test_parse_syntax_error_location(tmp_path):
+    (tmp_path / "broken.py").write_text("x = (1,\n")
+    stderr = subprocess.run([sys.executable, "-c", "import broken"], cwd=tmp_path,
+                            capture_output=True, text=True).stderr
+    traceback = parse_traceback(stderr)
+    assert traceback.exc_type == "SyntaxError"
+    assert traceback.frames[-1].path.endswith("broken.py")
+    assert (traceback.frames[-1].lineno, traceback.frames[-1].function) == (1, None)
+
+
+def test_localize_error_maps_frames_to_smallest_enclosing_code(tmp_path):
+    body = "".join(f"    x{i} = {i}\n" for i in range(200))
+    script = tmp_path / "app.py"
+    script.write_text(
+        "class Runner:\n"
+        "    def run(self):\n"
+        "        return long_function()\n\n"
+        f"def long_function():\n{body}    return 1 / 0\n\n"
+        "Runner().run()\n"
+    )
+    stderr = subprocess.run([sys.executable, str(script)], capture_output=True, text=True).stderr
+    debugger = Debugger(Executor(), CodeAnalyzer())
+    result = debugger.localize_error(stderr, roots=[str(tmp_path)])
+
+    assert result["exception"]["type"] == "ZeroDivisionError"
+    innermost, caller, module = result["locations"]
+    assert innermost["symbol"] == "long_function"
+    assert innermost["end"] - innermost["start"] + 1 == 80  # Cut around the failing line
+    assert "return 1 / 0" in innermost["snippet"]
+    assert (caller["symbol"], caller["start"], caller["end"]) == ("Runner.run", 2, 3)
+    assert (module["symbol"], module["snippet"]) == (None, "Runner().run()\n")
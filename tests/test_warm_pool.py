@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+from src.executor import Executor, ResourceLimits
+from src.test_runner import TestRunner
+from src.warm_pool import WarmPool
+
+
+@pytest.fixture
+def pool():
+    warm_pool = WarmPool(preload=["settings"])
+    yield warm_pool
+    warm_pool.close()
+
+
+@pytest.fixture
+def project(tmp_path):
+    (tmp_path / "settings.py").write_text("VALUE = 1\n")
+    (tmp_path / "show.py").write_text(
+        "import sys, settings\n"
+        "print(sys.argv[1:], settings.VALUE)\n"
+        "print('oops', file=sys.stderr)\n"
+        "sys.exit(3)\n"
+    )
+    return tmp_path
+
+
+def test_script_runs_in_warm_interpreter(pool, project):
+    executor = Executor(warm_pool=pool)
+    for _ in range(2):
+        return_code, stdout, stderr = executor.run_python_script("show.py", ["a"], cwd=str(project))
+        assert (return_code, stdout, stderr) == (3, "['a'] 1\n", "oops\n")
+    assert list(pool._servers) == [str(project)]
+
+
+def test_changed_preloaded_module_restarts_server(pool, project):
+    executor = Executor(warm_pool=pool)
+    executor.run_python_script("show.py", cwd=str(project))
+    settings = project / "settings.py"
+    settings.write_text("VALUE = 2\n")
+    os.utime(settings, ns=(0, 0))  # Same-second writes must not hide the change
+    assert executor.run_python_script("show.py", cwd=str(project))[1] == "[] 2\n"
+    assert pool.restarts == 1
+
+
+def test_warm_run_timeout_kills_child(pool, project):
+    (project / "sleep.py").write_text("import time\ntime.sleep(30)\n")
+    process = Executor(timeout=0.5, warm_pool=pool).stream_python_script("sleep.py", cwd=str(project))
+    process.wait()
+    assert process.timed_out
+    assert process.returncode < 0
+
+
+def test_pytest_results_stream_from_warm_interpreter(pool, project):
+    (project / "test_settings.py").write_text(
+        "import settings\n\n"
+        "def test_value():\n    assert settings.VALUE == 1\n\n"
+        "def test_fails():\n    assert settings.VALUE == 0\n"
+    )
+    runner = TestRunner(Executor(warm_pool=pool))
+    results = runner.run_pytest("test_settings.py", cwd=str(project))
+    runner.cleanup()
+    assert results["summary"]["passed"] == 1
+    assert results["summary"]["failed"] == 1
+    assert pool.server(str(project)) is not None
+
+
+def test_warm_runs_report_usage_and_apply_limits(pool, project):
+    (project / "big.py").write_text("x = bytearray(64 * 1024 * 1024)\n")
+    result = Executor(warm_pool=pool).run_python_script("big.py", cwd=str(project))
+    assert result.returncode == 0 and result.usage.max_rss_kb > 64 * 1024
+    limited = Executor(warm_pool=pool, limits=ResourceLimits(memory_mb=48)).run_python_script("big.py", cwd=str(project))
+    assert limited.returncode == 1 and "MemoryError" in limited.stderr
+    assert list(pool._servers) == [str(project)]  # Both runs were forked from the warm server
+
+
+def test_pytest_results_carry_per_test_resources(pool, project):
+    (project / "test_memory.py").write_text(
+        "def test_big():\n    data = bytearray(64 * 1024 * 1024)\n\n"
+        "def test_small():\n    pass\n"
+    )
+    runner = TestRunner(Executor(warm_pool=pool))
+    results = runner.run_pytest("test_memory.py", cwd=str(project))
+    runner.cleanup()
+    resources = {test["nodeid"]: test["resources"] for test in results["tests"]}
+    assert resources["test_memory.py::test_big"]["rss_growth_kb"] > 32 * 1024
+    assert resources["test_memory.py::test_small"]["rss_growth_kb"] < 1024
+    assert results["resources"]["max_rss_kb"] > 64 * 1024
+
+
+def test_warm_run_shuts_down_like_a_cold_run(pool, project):
+    (project / "shutdown.py").write_text(
+        "import atexit, threading, time\n\n"
+        "def work():\n    time.sleep(0.2)\n    print('thread done', flush=True)\n\n"
+        "atexit.register(lambda: print('atexit ran'))\n"
+        "threading.Thread(target=work).start()\n"
+        "print('main done', flush=True)\n"
+    )
+    cold = Executor().run_python_script("shutdown.py", cwd=str(project))
+    warm = Executor(warm_pool=pool).run_python_script("shutdown.py", cwd=str(project))
+    assert cold.stdout == warm.stdout == "main done\nthread done\natexit ran\n"
+    assert list(pool._servers) == [str(project)]